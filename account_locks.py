@@ -0,0 +1,107 @@
+import contextlib
+import threading
+
+
+class AccountLockRegistry:
+    """
+    This class hands out one re-entrant lock per bank account number, so work on the same account
+    is serialized while work on different accounts can run at the same time. Locks are created
+    the first time an account is used.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._registry_lock = threading.Lock()
+
+    def lock_for(self, bank_account_number: str) -> threading.RLock:
+        """
+        Returns the lock of a bank account.
+        :param bank_account_number: a string
+        :return: an RLock
+        """
+        lock = self._locks.get(bank_account_number)
+        if lock is None:
+            with self._registry_lock:
+                lock = self._locks.setdefault(bank_account_number, threading.RLock())
+        return lock
+
+    def __len__(self):
+        return len(self._locks)
+
+
+class WriterGate:
+    """
+    This class lets any number of writers through at once, or one exclusive holder on its own. A
+    write-ahead log holds one: every change is logged and applied as a writer, and a checkpoint
+    holds the gate exclusively, so it sees no change half done and none slips in between its
+    snapshot and the truncation of the log.
+
+    A thread that is already a writer can enter again without waiting, so nested changes do not
+    deadlock against a checkpoint waiting for them to finish. Writers must enter the gate before
+    taking any catalogue or account lock. The writers held off by an exclusive holder all get in
+    before the gate can be closed again, so back-to-back checkpoints cannot starve them.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._writers = 0
+        self._exclusive = False
+        self._waiting = 0
+        self._admitting = 0
+        self._depth = threading.local()
+
+    @staticmethod
+    def writer_for(write_ahead_log):
+        """
+        Returns the writer side of the gate of a write-ahead log.
+        :param write_ahead_log: a WriteAheadLog, or None
+        :return: a context manager, which does nothing without a log
+        """
+        return contextlib.nullcontext() if write_ahead_log is None else write_ahead_log.gate.writer()
+
+    @contextlib.contextmanager
+    def writer(self):
+        """
+        Holds the gate as one of its writers.
+        """
+        depth = getattr(self._depth, "value", 0)
+        if depth == 0:
+            with self._condition:
+                if self._exclusive:
+                    self._waiting += 1
+                    while self._exclusive:
+                        self._condition.wait()
+                    self._waiting -= 1
+                    self._admitting -= 1
+                    if self._admitting == 0:
+                        self._condition.notify_all()
+                self._writers += 1
+        self._depth.value = depth + 1
+        try:
+            yield
+        finally:
+            self._depth.value = depth
+            if depth == 0:
+                with self._condition:
+                    self._writers -= 1
+                    if self._writers == 0:
+                        self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """
+        Holds the gate on its own, once every writer inside it has left.
+        """
+        with self._condition:
+            while self._exclusive or self._admitting > 0:
+                self._condition.wait()
+            self._exclusive = True
+            while self._writers:
+                self._condition.wait()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._exclusive = False
+                self._admitting = self._waiting
+                self._condition.notify_all()
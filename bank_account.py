@@ -1,21 +1,50 @@
-import operator
 from abc import ABC, abstractmethod
+import sys
 import time
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from money import Money, CentsTable
 
 
 class BankAccount(ABC):
     """
     This class represents a User's bank account. It contains the information necessary
-    for a user to record and view transactions.
+    for a user to record and view transactions. Balances are kept as int64 cents in a
+    class-level typed array, one slot per account, and bank_bal presents them in dollars.
+    Accounts are slotted and share interned copies of their numbers and bank names.
     """
+    __slots__ = ("_bank_acc_num", "_bank_name", "_slot", "_is_locked")
+    _amounts = CentsTable("balance")
+    _balances = _amounts.column("balance")
+    LOW_BALANCE_CENTS = 500
+
     def __init__(self, bank_acc_num: str, bank_name: str, bank_bal: float):
-        self._bank_acc_num = bank_acc_num
-        self._bank_name = bank_name
-        self._bank_bal = bank_bal
+        self._bank_acc_num = sys.intern(bank_acc_num)
+        self._bank_name = sys.intern(bank_name)
+        self._slot = BankAccount._amounts.allocate(balance=Money.to_cents(bank_bal))
         self._is_locked = False
 
+    def __del__(self):
+        # The table can already be gone when the interpreter shuts down.
+        slot = getattr(self, "_slot", None)
+        if slot is not None and BankAccount is not None:
+            BankAccount._amounts.release(slot)
+
+    @classmethod
+    def get_amounts(cls) -> CentsTable:
+        """
+        Returns the table the balances of every bank account are kept in.
+        :return: a CentsTable
+        """
+        return cls._amounts
+
+    @property
+    def slot(self) -> int:
+        """
+        Getter for the slot of the bank account in the table of balances.
+        :return: an int
+        """
+        return self._slot
+
     @property
     def bank_account_number(self):
         """
@@ -38,7 +67,15 @@ class BankAccount(ABC):
         Getter for bank balance.
         :return: bank balance
         """
-        return self._bank_bal
+        return BankAccount._balances[self._slot] / Money.CENTS_PER_DOLLAR
+
+    @property
+    def bank_bal_cents(self) -> int:
+        """
+        Getter for bank balance in cents.
+        :return: an int
+        """
+        return BankAccount._balances[self._slot]
 
     @property
     def is_locked(self):
@@ -54,9 +91,10 @@ class BankAccount(ABC):
         Setter for bank balance.
         :param updated: a float
         """
-        if 0 < updated < 5:
+        cents = Money.to_cents(updated)
+        if 0 < cents < BankAccount.LOW_BALANCE_CENTS:
             print("Notification: Your bank account balance is less than $5.")
-        self._bank_bal = updated
+        BankAccount._balances[self._slot] = cents
 
     @is_locked.setter
     def is_locked(self, updated: bool) -> None:
@@ -69,17 +107,33 @@ class BankAccount(ABC):
     def lock_account(self):
         self._is_locked = True
 
-    def is_balance_negative(self):
+    def withdraw(self, amount: float) -> bool:
+        """
+        Takes an amount out of the bank balance.
+        :param amount: a float
+        :return: True if the balance is left below $5 but above zero, otherwise False
+        """
+        return self.withdraw_cents(Money.to_cents(amount))
+
+    def withdraw_cents(self, cents: int) -> bool:
+        """
+        Takes an amount in cents out of the bank balance.
+        :param cents: an int
+        :return: True if the balance is left below $5 but above zero, otherwise False
+        """
+        BankAccount._balances[self._slot] -= cents
+        return 0 < BankAccount._balances[self._slot] < BankAccount.LOW_BALANCE_CENTS
+
+    def is_balance_negative(self) -> bool:
         """
         Locks the account if the bank balance became negative.
+        :return: True if the account was locked, otherwise False
         """
-        self.is_locked = True if self._bank_bal <= 0 else False
-        if self._bank_bal <= 0:
-            print("Locked: Your account is locked since the bank balance reached zero.")
-            self.is_locked = True
+        self.is_locked = BankAccount._balances[self._slot] <= 0
+        return self.is_locked
 
     @abstractmethod
-    def is_over_limit(self, transaction_catalogue):
+    def is_over_limit(self, transaction_catalogue) -> bool:
         pass
 
     @abstractmethod
@@ -91,6 +145,8 @@ class Chequing(BankAccount):
     """
     Chequing BankAccount Class.
     """
+    __slots__ = ()
+
     def __init__(self, bank_acc_num: str, bank_name: str, bank_bal: float):
         """
         Initialize the Chequing with a bank account number, bank name, and bank balance.
@@ -101,8 +157,12 @@ class Chequing(BankAccount):
         super().__init__(bank_acc_num, bank_name, bank_bal)
         self._is_locked = False
 
-    def is_over_limit(self, transaction_catalogue):
-        pass
+    def is_over_limit(self, transaction_catalogue) -> bool:
+        """
+        Chequing accounts have no transaction limit.
+        :return: False
+        """
+        return False
 
     def __repr__(self):
         print("--------- Bank Account Information ---------")
@@ -117,8 +177,10 @@ class Chequing(BankAccount):
 class Saving(BankAccount):
     """
     Saving BankAccount Class. There are additional restrictions imposed on savings accounts.
-    Users may not make more than 2 transactions per calendar month.
+    Users may not make more than 2 transactions per calendar month. The limit is checked with a
+    time-range count on the transaction catalogue, without going through the whole history.
     """
+    __slots__ = ("_num_of_transaction",)
     MAX_TRANSACTIONS = 2
 
     def __init__(self, bank_acc_num: str, bank_name: str, bank_bal: float):
@@ -154,29 +216,25 @@ class Saving(BankAccount):
         Get datetime one month ago
         :return: a datetime
         """
+        # dateutil is only needed here, so it is not loaded until a Saving account is checked.
+        from dateutil.relativedelta import relativedelta
         current = datetime.now()
         last_month = current - relativedelta(months=1)
         return last_month
 
-    def is_over_limit(self, transaction_catalogue) -> None:
+    def is_over_limit(self, transaction_catalogue) -> bool:
         """
         Lock the account if the latest transaction is occurred within a month and the number of
         transaction gets to the limit.
+        :return: True if the account was locked, otherwise False
         """
-        catalogue = transaction_catalogue
-        transaction_list = catalogue.get_user_transactions(self.bank_account_number)
-        sorted_list = sorted(transaction_list, key=operator.attrgetter("time"))
-
-        transaction_list = [transaction for transaction in sorted_list
-                            if datetime.strptime(transaction.time, '%Y-%m-%d %H:%M:%S') > self.get_one_month_ago()]
-
-        self.num_of_transaction = len(transaction_list)
+        # Timestamps are whole seconds, so this counts the transactions after one month ago.
+        one_month_ago = int(self.get_one_month_ago().timestamp()) + 1
+        self.num_of_transaction = transaction_catalogue.count_user_transactions_between(self.bank_account_number,
+                                                                                        one_month_ago)
 
-        if self.num_of_transaction >= self.MAX_TRANSACTIONS:
-            print("Locked: Your account is locked.")
-            self.is_locked = True
-        else:
-            self.is_locked = False
+        self.is_locked = self.num_of_transaction >= self.MAX_TRANSACTIONS
+        return self.is_locked
 
     def __repr__(self):
         print("======== Bank Account Information ========")
@@ -1,30 +1,42 @@
+import threading
+from account_locks import WriterGate
 from bank_account import BankAccount
 
 
 class BankAccountCatalogue:
     """
-    This class houses a list of all bank accounts.
+    This class houses all bank accounts, indexed by bank account number. When a storage backend
+    is set, accounts live in it and the dict only caches the ones that have been loaded.
     """
-    bank_accounts = []
+    bank_accounts = {}
+    _write_ahead_log = None
+    _storage = None
+    _lock = threading.RLock()
 
     @classmethod
     def get_bank_accounts(cls):
         """
-        Getter for bank accounts
-        :return: a list of bank accounts
+        Getter for bank accounts. Accounts are returned in the order they were added.
+        :return: an iterable of bank accounts
         """
-        return cls.bank_accounts
+        if cls._storage is not None:
+            for bank_account in cls._storage.load_bank_accounts():
+                cls.bank_accounts.setdefault(bank_account.bank_account_number, bank_account)
+        return cls.bank_accounts.values()
 
     @classmethod
     def get_user_bank_account(cls, bank_account_number: str) -> BankAccount:
         """
-        Retrieves all bank accounts for a bank account number and displays them.
+        Retrieves the bank account for a bank account number.
         :param bank_account_number: a string
-        :return: a BankAccount
+        :return: a BankAccount, or None if there is no such account
         """
-        for bank_account in cls.get_bank_accounts():
-            if bank_account.bank_account_number == bank_account_number:
-                return bank_account
+        bank_account = cls.bank_accounts.get(bank_account_number)
+        if bank_account is None and cls._storage is not None:
+            bank_account = cls._storage.load_bank_account(bank_account_number)
+            if bank_account is not None:
+                bank_account = cls.bank_accounts.setdefault(bank_account_number, bank_account)
+        return bank_account
 
     @classmethod
     def is_users_account_locked(cls, bank_account_number: str) -> bool:
@@ -39,10 +51,27 @@ class BankAccountCatalogue:
     @classmethod
     def add_bank_account(cls, bank_account: BankAccount):
         """
-        Adds a new bank account to the list of bank accounts.
+        Adds a new bank account to the catalogue.
         :param bank_account: a BankAccount object.
+        :raise ValueError: if the bank account number is already registered
         """
-        BankAccountCatalogue.bank_accounts.append(bank_account)
+        with WriterGate.writer_for(cls._write_ahead_log), cls._lock:
+            if cls.get_user_bank_account(bank_account.bank_account_number) is not None:
+                raise ValueError(f"Bank account {bank_account.bank_account_number} already exists.")
+            if cls._write_ahead_log is not None:
+                cls._write_ahead_log.log_add_bank_account(bank_account)
+            if cls._storage is not None:
+                cls._storage.save_bank_account(bank_account)
+            cls.bank_accounts[bank_account.bank_account_number] = bank_account
+
+    @classmethod
+    def save_bank_account(cls, bank_account: BankAccount):
+        """
+        Writes the current balance and lock state of a bank account to the storage backend.
+        :param bank_account: a BankAccount object.
+        """
+        if cls._storage is not None:
+            cls._storage.save_bank_account(bank_account)
 
     @classmethod
     def remove_bank_account(cls, bank_acc_num):
@@ -50,7 +79,33 @@ class BankAccountCatalogue:
         Removes a bank account given a bank account number.
         :param bank_acc_num: a string
         """
-        for index, bank_account in enumerate(BankAccountCatalogue.bank_accounts):
-            if bank_account.bank_acc_num == bank_acc_num:
-                del BankAccountCatalogue.bank_accounts[index]
-                break
+        with WriterGate.writer_for(cls._write_ahead_log), cls._lock:
+            if cls._write_ahead_log is not None and bank_acc_num in cls.bank_accounts:
+                cls._write_ahead_log.log_remove_bank_account(bank_acc_num)
+            if cls._storage is not None:
+                cls._storage.delete_bank_account(bank_acc_num)
+            cls.bank_accounts.pop(bank_acc_num, None)
+
+    @classmethod
+    def set_write_ahead_log(cls, write_ahead_log):
+        """
+        Logs every later change to the catalogue to a write-ahead log.
+        :param write_ahead_log: a WriteAheadLog, or None to stop logging
+        """
+        cls._write_ahead_log = write_ahead_log
+
+    @classmethod
+    def set_storage(cls, storage):
+        """
+        Keeps the catalogue in a storage backend instead of memory only.
+        :param storage: an SQLiteStorage, or None for memory only
+        """
+        cls._storage = storage
+        cls.bank_accounts.clear()
+
+    @classmethod
+    def clear(cls):
+        """
+        Removes every bank account from the catalogue.
+        """
+        cls.bank_accounts.clear()
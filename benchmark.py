@@ -0,0 +1,417 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from bank_account import Saving
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+from budget_types import BudgetType
+from ledger_generator import LedgerGenerator
+from transaction import Transaction
+from transaction_catalogue import TransactionCatalogue
+
+# Scales are numbers of transactions; the family has one user per TRANSACTIONS_PER_USER of them.
+SCALES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+DEFAULT_MAX_SCALE = 10 ** 5
+TRANSACTIONS_PER_USER = 10
+MIN_USERS = 30
+LOOKUPS = 10000
+RECORDINGS = 2000
+RECORDING_USERS = 100
+REPEAT = 3
+POLICY_SCALES = [10 ** 4, 10 ** 5, 10 ** 6]
+STARTUP_RUNS = 20
+
+
+def _time_per_operation(function, operations: int, scale: float = 1e9) -> tuple:
+    """
+    Runs a function REPEAT times and works out the cost of each of the operations it performs.
+    :param function: a callable taking no arguments
+    :param operations: an int, the number of operations one call performs
+    :param scale: a float, 1e9 for nanoseconds, 1e6 for microseconds or 1e3 for milliseconds
+    :return: a (best, runs) tuple, the fastest cost per operation and the cost of every run
+    """
+    runs = [seconds / operations * scale for seconds in timeit.repeat(function, number=1, repeat=REPEAT)]
+    return min(runs), runs
+
+
+def _result(name: str, scale: int, unit: str, timing: tuple, **details) -> dict:
+    """
+    Builds one benchmark result.
+    :param name: a string
+    :param scale: an int
+    :param unit: a string
+    :param timing: a (best, runs) tuple
+    :param details: anything else worth recording about the run
+    :return: a dict
+    """
+    best, runs = timing
+    return {"name": name, "scale": scale, "unit": unit, "value": best, "runs": runs, **details}
+
+
+def clear_catalogues() -> None:
+    """
+    Empties every catalogue, so each scale starts from nothing.
+    """
+    BankAccountCatalogue.clear()
+    BudgetCatalogue.clear()
+    TransactionCatalogue().clear()
+
+
+def build_ledger(scale: int, seed: int) -> tuple:
+    """
+    Registers a synthetic family and replays a synthetic history of the given number of
+    transactions into the catalogues.
+    :param scale: an int
+    :param seed: an int
+    :return: a (generator, users, TransactionCatalogue) tuple
+    """
+    clear_catalogues()
+    generator = LedgerGenerator(seed)
+    users = generator.register_users(BankAccountCatalogue, BudgetCatalogue,
+                                     max(MIN_USERS, scale // TRANSACTIONS_PER_USER))
+    transaction_catalogue = TransactionCatalogue()
+    generator.populate(transaction_catalogue, users, scale)
+    return generator, users, transaction_catalogue
+
+
+def bench_catalogues(scale: int, seed: int = 0) -> list:
+    """
+    Measures catalogue lookups, Saving.is_over_limit and full transaction recording over a
+    synthetic ledger. Lookups target accounts drawn uniformly, so most of them hit the long tail
+    of quiet accounts rather than the few busy ones.
+    :param scale: an int, the number of transactions in the ledger
+    :param seed: an int
+    :return: a list of results
+    """
+    generator, users, transaction_catalogue = build_ledger(scale, seed)
+    rng = random.Random(seed)
+    targets = [rng.choice(users).bank_account_number for _ in range(LOOKUPS)]
+    categories = [rng.choice(list(BudgetType)).value for _ in range(LOOKUPS)]
+    saving_accounts = [BankAccountCatalogue.get_user_bank_account(user.bank_account_number) for user in users]
+    saving_accounts = [account for account in saving_accounts if isinstance(account, Saving)]
+    saving_targets = [rng.choice(saving_accounts) for _ in range(LOOKUPS)] if saving_accounts else []
+
+    def bank_account_lookup():
+        for account_number in targets:
+            BankAccountCatalogue.get_user_bank_account(account_number)
+
+    def budget_lookup():
+        for account_number, category in zip(targets, categories):
+            BudgetCatalogue.filter_budget_by_bank_account_and_category(account_number, category)
+
+    def transaction_lookup():
+        for account_number in targets:
+            transaction_catalogue.get_user_transactions(account_number)
+
+    def saving_window():
+        for account in saving_targets:
+            account.is_over_limit(transaction_catalogue)
+
+    results = [
+        _result("BankAccountCatalogue.get_user_bank_account", scale, "ns/op",
+                _time_per_operation(bank_account_lookup, LOOKUPS)),
+        _result("BudgetCatalogue.filter_budget_by_bank_account_and_category", scale, "ns/op",
+                _time_per_operation(budget_lookup, LOOKUPS)),
+        _result("TransactionCatalogue.get_user_transactions", scale, "ns/op",
+                _time_per_operation(transaction_lookup, LOOKUPS)),
+    ]
+    if saving_targets:
+        results.append(_result("Saving.is_over_limit", scale, "ns/op",
+                               _time_per_operation(saving_window, len(saving_targets))))
+
+    # Recording goes through every budget and lockout rule, on fresh accounts so that most of the
+    # transactions are accepted rather than refused by budgets the history has already used up.
+    recording_users = generator.register_users(BankAccountCatalogue, BudgetCatalogue, RECORDING_USERS,
+                                               first_number=len(users))
+    recordings = list(generator.transactions(recording_users, RECORDINGS * REPEAT))
+    users_by_account = {user.bank_account_number: user for user in recording_users}
+    batches = iter([recordings[start:start + RECORDINGS] for start in range(0, len(recordings), RECORDINGS)])
+    accepted = []
+
+    def record():
+        accepted.append(sum(bool(transaction_catalogue.record_transaction(
+            users_by_account[transaction.bank_num], transaction.budget_category, transaction.amount,
+            transaction.merchant, transaction.timestamp).transaction) for transaction in next(batches)))
+
+    timing = _time_per_operation(record, RECORDINGS, 1e6)
+    results.append(_result("TransactionCatalogue.record_transaction", scale, "us/op", timing,
+                           accepted=sum(accepted) / (RECORDINGS * REPEAT)))
+    clear_catalogues()
+    return results
+
+
+def bench_budget_lookup(num_accounts: int) -> dict:
+    """
+    Measures fetching all the budgets of an account from a catalogue of many accounts, four
+    budgets each, to show the cost does not grow with the number of accounts.
+    :param num_accounts: an int
+    :return: a result, in nanoseconds per lookup
+    """
+    clear_catalogues()
+    account_numbers = [f"{number:010d}" for number in range(num_accounts)]
+    for account_number in account_numbers:
+        for budget_class in BudgetCatalogue.budget_type_map.values():
+            BudgetCatalogue.add_budget(budget_class(100.0, account_number))
+    rng = random.Random(num_accounts)
+    targets = [rng.choice(account_numbers) for _ in range(LOOKUPS)]
+
+    def account_lookup():
+        for account_number in targets:
+            BudgetCatalogue.get_budgets_by_account_num(account_number)
+
+    timing = _time_per_operation(account_lookup, LOOKUPS)
+    clear_catalogues()
+    return _result("BudgetCatalogue.get_budgets_by_account_num", num_accounts, "ns/op", timing)
+
+
+def bench_saving_window(history_length: int) -> dict:
+    """
+    Measures Saving.is_over_limit for one account with a long transaction history, most of which
+    falls outside the one month window, to show the check does not grow with the history.
+    :param history_length: an int, the number of transactions of the account
+    :return: a result, in nanoseconds per check
+    """
+    clear_catalogues()
+    transaction_catalogue = TransactionCatalogue()
+    account = Saving("0000000001", "Bench Bank", 1e9)
+    BankAccountCatalogue.add_bank_account(account)
+
+    # Spread the history over the last year so about a twelfth of it is inside the window.
+    now = time.time()
+    for offset in sorted(random.Random(history_length).sample(range(365 * 86400), history_length), reverse=True):
+        transaction_catalogue._store_transaction(
+            Transaction(int(now - offset), 1.0, BudgetType.MISCELLANEOUS.value, "Bench Merchant", "0000000001"))
+
+    def check():
+        for _ in range(LOOKUPS):
+            account.is_over_limit(transaction_catalogue)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        timing = _time_per_operation(check, LOOKUPS)
+    clear_catalogues()
+    return _result("Saving.is_over_limit.history", history_length, "ns/op", timing)
+
+
+def bench_policy_engine(num_budgets: int) -> dict:
+    """
+    Measures one vectorized re-evaluation of the lockout and warning rules over many budgets, four
+    per account, with user types and spending drawn at random.
+    :param num_budgets: an int
+    :return: a result, in milliseconds per pass
+    """
+    import numpy as np
+    from policy_engine import PolicyEngine
+    from register import Register
+    from user_type import UserType
+
+    rng = np.random.default_rng(num_budgets)
+    num_accounts = num_budgets // len(BudgetType)
+    account_ids = np.repeat(np.arange(num_accounts), len(BudgetType))
+    account_types = rng.choice([user_type.value for user_type in UserType], size=num_accounts)
+    thresholds = np.zeros(max(user_type.value for user_type in UserType) + 1)
+    for user_type, (_, threshold) in Register.user_type_map.items():
+        thresholds[user_type.value] = threshold
+    limits = rng.choice([50.0, 100.0, 200.0], size=len(account_ids))
+    spent = -rng.uniform(0, 1.5, size=len(account_ids)) * limits
+    engine = PolicyEngine()
+
+    def evaluate():
+        engine.evaluate(account_types[account_ids], limits, spent, thresholds[account_types[account_ids]],
+                        account_ids, num_accounts)
+
+    return _result("PolicyEngine.evaluate", num_budgets, "ms/pass", _time_per_operation(evaluate, 1, 1e3))
+
+
+def bench_policy_changes(num_budgets: int, seed: int = 0) -> list:
+    """
+    Measures PolicyEngine.find_changes end to end over a registered family with four budgets per
+    user and spending drawn at random: once on a fresh engine, which gathers every user and
+    budget slot, and again on an engine that has seen them all, which only reads the cents
+    arrays and evaluates.
+    :param num_budgets: an int
+    :param seed: an int
+    :return: a list of results, in milliseconds per pass
+    """
+    from fam import Fam
+    from policy_engine import PolicyEngine
+
+    clear_catalogues()
+    generator = LedgerGenerator(seed)
+    users = generator.register_users(BankAccountCatalogue, BudgetCatalogue, num_budgets // len(BudgetType))
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue())
+    rng = random.Random(seed)
+    for user in users:
+        fam.add_user(user)
+        for budget in BudgetCatalogue.get_budgets_by_account_num(user.bank_account_number):
+            budget.add_spent_cents(int(budget.limit_cents * rng.uniform(0, 1.5)))
+
+    engine = PolicyEngine()
+    engine.find_changes(fam)
+    results = [
+        _result("PolicyEngine.find_changes.first", num_budgets, "ms/pass",
+                _time_per_operation(lambda: PolicyEngine().find_changes(fam), 1, 1e3)),
+        _result("PolicyEngine.find_changes", num_budgets, "ms/pass",
+                _time_per_operation(lambda: engine.find_changes(fam), 1, 1e3))
+    ]
+    clear_catalogues()
+    return results
+
+
+def bench_startup(runs: int = STARTUP_RUNS) -> list:
+    """
+    Measures the cold start of short-lived processes: a bare interpreter for reference, importing
+    the driver, and a headless run of a small command file, as a batch job would launch them.
+    :param runs: an int, the number of processes started for each case
+    :return: a list of results, in milliseconds per process
+    """
+    commands = [
+        {"action": "register", "name": "Bench", "dob": "1980-01-01", "user_type": "angel",
+         "bank_account_type": "chequing", "bank_account_number": "1", "bank_name": "Bench Bank",
+         "bank_balance": 1000, "budget_limits": {budget_type.name: 100 for budget_type in BudgetType}},
+        {"action": "record_transaction", "bank_account_number": "1", "budget_category": "EATING_OUT",
+         "amount": 10, "merchant": "Bench Merchant"}
+    ]
+    directory = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as file:
+        file.write("".join(json.dumps(command) + "\n" for command in commands))
+    cases = {
+        "startup.python": [sys.executable, "-c", "pass"],
+        "startup.import_driver": [sys.executable, "-c", "import driver"],
+        "startup.headless_commands": [sys.executable, "driver.py", file.name]
+    }
+    results = []
+    try:
+        for name, command in cases.items():
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                subprocess.run(command, cwd=directory, stdout=subprocess.DEVNULL, check=True)
+                timings.append((time.perf_counter() - start) * 1e3)
+            results.append(_result(name, 1, "ms/process", (min(timings), timings)))
+    finally:
+        os.remove(file.name)
+    return results
+
+
+def run_suite(scales: list, seed: int = 0, policy: bool = True, startup: bool = True, progress=None) -> dict:
+    """
+    Runs every benchmark at every scale.
+    :param scales: a list of ints
+    :param seed: an int
+    :param policy: a boolean, whether to run the policy engine benchmarks, which need NumPy
+    :param startup: a boolean, whether to run the process startup benchmark
+    :param progress: a callable given each result as it is measured, or None
+    :return: a dict with the run's environment and its results
+    """
+    results = []
+
+    def report(result):
+        results.append(result)
+        if progress is not None:
+            progress(result)
+
+    for scale in scales:
+        # Replaying the history may print lockout notices.
+        with contextlib.redirect_stdout(io.StringIO()):
+            scale_results = bench_catalogues(scale, seed)
+        for result in scale_results:
+            report(result)
+        # The ledgers above give each account only a few transactions, so the Saving window is
+        # also measured on one account holding the whole history.
+        report(bench_budget_lookup(max(MIN_USERS, scale // TRANSACTIONS_PER_USER)))
+        report(bench_saving_window(scale))
+    if policy:
+        for scale in POLICY_SCALES:
+            report(bench_policy_engine(scale))
+            with contextlib.redirect_stdout(io.StringIO()):
+                scale_results = bench_policy_changes(scale, seed)
+            for result in scale_results:
+                report(result)
+    if startup:
+        for result in bench_startup():
+            report(result)
+    return {
+        "created": int(time.time()),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "results": results
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    """
+    Compares two runs, result by result.
+    :param baseline: a dict written by an earlier run
+    :param current: a dict
+    :param tolerance: a float, how much slower a result may get before it counts as a regression
+    :return: a list of (name, scale, baseline value, current value, ratio, regressed) tuples
+    """
+    earlier = {(result["name"], result["scale"]): result["value"] for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = earlier.get((result["name"], result["scale"]))
+        if before:
+            ratio = result["value"] / before
+            rows.append((result["name"], result["scale"], before, result["value"], ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def print_result(result: dict) -> None:
+    """
+    Prints one result on a line.
+    :param result: a dict
+    """
+    print(f"{result['name']:<60} scale={result['scale']:<9} {result['value']:10.1f} {result['unit']}")
+
+
+def main(argv=None) -> int:
+    """
+    Runs the benchmark suite, prints each result and optionally writes them as JSON and compares
+    them with an earlier run.
+    :param argv: a list of command line arguments, or None to use sys.argv
+    :return: 1 if a result regressed beyond the tolerance, otherwise 0
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the FAM catalogues on synthetic ledgers.")
+    parser.add_argument("--scales", type=int, nargs="+",
+                        help="numbers of transactions to benchmark at (default: 10^3 up to --max-scale)")
+    parser.add_argument("--max-scale", type=int, default=DEFAULT_MAX_SCALE,
+                        help=f"largest of {SCALES} to run (default: {DEFAULT_MAX_SCALE})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-policy", action="store_true", help="skip the NumPy policy engine benchmarks")
+    parser.add_argument("--no-startup", action="store_true", help="skip the process startup benchmark")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="a JSON file from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="slowdown counted as a regression when comparing (default: 0.1)")
+    arguments = parser.parse_args(argv)
+
+    scales = arguments.scales or [scale for scale in SCALES if scale <= arguments.max_scale]
+    run = run_suite(scales, arguments.seed, not arguments.no_policy, not arguments.no_startup, print_result)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(run, file, indent=2)
+
+    if not arguments.compare:
+        return 0
+    with open(arguments.compare) as file:
+        rows = compare(json.load(file), run, arguments.tolerance)
+    print()
+    for name, scale, before, after, ratio, regressed in rows:
+        print(f"{name:<60} scale={scale:<9} {before:10.1f} -> {after:10.1f} x{ratio:5.2f}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return int(any(row[-1] for row in rows))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,43 @@
+import sys
+from money import Money, CentsTable
+
+
 class Budget:
+    """
+    This class represents a budget. The limit and the amount spent are kept as int64 cents in
+    class-level typed arrays, one slot per budget, and the properties present them in dollars.
+    Budgets are slotted and share an interned copy of their bank account number.
+    """
+    __slots__ = ("_slot", "_bank_account_number")
+    _amounts = CentsTable("limit", "spent")
+    _limits = _amounts.column("limit")
+    _spent = _amounts.column("spent")
+
     def __init__(self, limit: float, bank_account_number: str):
-        self._spent = 0
-        self._limit = limit
-        self._bank_account_number = bank_account_number
+        self._slot = Budget._amounts.allocate(limit=Money.to_cents(limit))
+        self._bank_account_number = sys.intern(bank_account_number)
+
+    def __del__(self):
+        # The table can already be gone when the interpreter shuts down.
+        slot = getattr(self, "_slot", None)
+        if slot is not None and Budget is not None:
+            Budget._amounts.release(slot)
+
+    @classmethod
+    def get_amounts(cls) -> CentsTable:
+        """
+        Returns the table the limits and amounts spent of every budget are kept in.
+        :return: a CentsTable
+        """
+        return cls._amounts
+
+    @property
+    def slot(self) -> int:
+        """
+        Returns the slot of the Budget in the table of amounts.
+        :return: an int
+        """
+        return self._slot
 
     @property
     def spent(self) -> float:
@@ -10,7 +45,15 @@ class Budget:
         Returns the amount of spent from each Budget.
         :return: a float
         """
-        return self._spent
+        return Budget._spent[self._slot] / Money.CENTS_PER_DOLLAR
+
+    @property
+    def spent_cents(self) -> int:
+        """
+        Returns the amount spent from the Budget in cents, as a negative number.
+        :return: an int
+        """
+        return Budget._spent[self._slot]
 
     @property
     def bank_account_number(self):
@@ -22,32 +65,47 @@ class Budget:
         Returns the limit of the Budget.
         :return: a float
         """
-        return self._limit
+        return Budget._limits[self._slot] / Money.CENTS_PER_DOLLAR
+
+    @property
+    def limit_cents(self) -> int:
+        """
+        Returns the limit of the Budget in cents.
+        :return: an int
+        """
+        return Budget._limits[self._slot]
 
     def add_spent(self, amount):
-        self._spent -= amount
+        self.add_spent_cents(Money.to_cents(amount))
+
+    def add_spent_cents(self, cents: int) -> None:
+        """
+        Adds an amount in cents to the amount spent.
+        :param cents: an int
+        """
+        Budget._spent[self._slot] -= cents
 
     def is_budget_exceeded(self):
-        return self.limit + self.spent <= 0
+        return Budget._limits[self._slot] + Budget._spent[self._slot] <= 0
 
     def __str__(self):
         return (f"---- {self.__class__.__name__} ----\n"
                 f"Limit: ${self.limit:.2f}\n"
-                f"The amount spent: ${-self.spent:.2f}"
+                f"The amount spent: ${Money.to_dollars(-self.spent_cents):.2f}"
                 f"  For Bank Account: {self.bank_account_number}\n")
 
 
 class GamesEntertainment(Budget):
-    pass
+    __slots__ = ()
 
 
 class ClothingAccessories(Budget):
-    pass
+    __slots__ = ()
 
 
 class EatingOut(Budget):
-    pass
+    __slots__ = ()
 
 
 class Miscellaneous(Budget):
-    pass
+    __slots__ = ()
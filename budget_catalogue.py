@@ -1,9 +1,19 @@
+import threading
+from account_locks import WriterGate
 from budget import *
+from budget_types import BudgetType
 
 
 class BudgetCatalogue:
     """
-    This class houses a list of all budgets.
+    This class houses all budgets. Budgets are indexed by bank account number and then by
+    BudgetType, so looking up a single budget or all the budgets of an account does not depend
+    on the number of accounts in the catalogue. When a storage backend is set, budgets live in it
+    and the index only caches the accounts that have been loaded.
+
+    For each account the catalogue also keeps how many of its budgets are over the owner's lockout
+    threshold. The count is taken once and then moved only when a budget crosses the threshold,
+    so the account lockout rule does not have to look at every budget after each transaction.
     """
     budget_type_map = {
         1: GamesEntertainment,
@@ -12,7 +22,19 @@ class BudgetCatalogue:
         4: Miscellaneous
     }
 
+    budget_category_map = {
+        GamesEntertainment: BudgetType.GAMES_ENTERTAINMENT,
+        ClothingAccessories: BudgetType.CLOTHING_ACCESSORIES,
+        EatingOut: BudgetType.EATING_OUT,
+        Miscellaneous: BudgetType.MISCELLANEOUS
+    }
+
     _budget_list = []
+    _budget_index = {}
+    _over_threshold_counts = {}
+    _write_ahead_log = None
+    _storage = None
+    _lock = threading.RLock()
 
     @classmethod
     def get_budgets(cls):
@@ -20,31 +42,64 @@ class BudgetCatalogue:
         Getter for budget list.
         :return: budget list
         """
+        if cls._storage is not None:
+            with cls._lock:
+                loaded_accounts = set(cls._budget_index)
+                for budget in cls._storage.load_budgets():
+                    if budget.bank_account_number not in loaded_accounts:
+                        cls._budget_index.setdefault(budget.bank_account_number, {})[
+                            cls.budget_category_map[type(budget)]] = budget
+                        cls._budget_list.append(budget)
         return cls._budget_list
 
+    @classmethod
+    def _load_account_budgets(cls, bank_account_number: str) -> dict:
+        """
+        Returns the budgets of an account keyed by BudgetType, loading them from the storage
+        backend the first time.
+        :param bank_account_number: a string
+        :return: a dict
+        """
+        account_budgets = cls._budget_index.get(bank_account_number)
+        if account_budgets is None:
+            with cls._lock:
+                account_budgets = cls._budget_index.get(bank_account_number)
+                if account_budgets is None:
+                    account_budgets = {}
+                    if cls._storage is not None:
+                        for budget in cls._storage.load_budgets(bank_account_number):
+                            account_budgets[cls.budget_category_map[type(budget)]] = budget
+                            cls._budget_list.append(budget)
+                        cls._budget_index[bank_account_number] = account_budgets
+        return account_budgets
+
     @classmethod
     def get_budgets_by_account_num(cls, bank_account_number: str) -> list[Budget]:
         """
-        Retrieves all budgets for a bank account number and displays them.
+        Retrieves all budgets for a bank account number.
+        :param bank_account_number: a string
+        :return: a list of Budgets in the order they were added
+        """
+        return list(cls._load_account_budgets(bank_account_number).values())
+
+    @classmethod
+    def count_budgets(cls, bank_account_number: str) -> int:
+        """
+        Returns the number of budgets of a bank account.
         :param bank_account_number: a string
+        :return: an int
         """
-        budget_list = []
-        for budget in cls.get_budgets():
-            if budget.bank_account_number == bank_account_number:
-                budget_list.append(budget)
-        return budget_list
+        return len(cls._load_account_budgets(bank_account_number))
 
     @classmethod
     def filter_budget_by_bank_account_and_category(cls, bank_account_number: str, map_key) -> Budget:
         """
         Filter the budget by the given category and returns it.
         :param bank_account_number: a string
-        :param map_key: an int
+        :param map_key: an int or a BudgetType
+        :return: a Budget, or None if the account has no budget in that category
         """
-        for budget in cls.get_budgets():
-            if budget.bank_account_number == bank_account_number \
-                    and type(budget) == BudgetCatalogue.budget_type_map[map_key]:
-                return budget
+        return cls._load_account_budgets(bank_account_number).get(BudgetType(map_key))
 
     @classmethod
     def adjust_budget_details(cls, bank_account_number: str, budget_type: int, amount: float) -> None:
@@ -54,16 +109,100 @@ class BudgetCatalogue:
         :param budget_type: a int
         :param amount: float
         """
-        user_budget_list = cls.get_budgets_by_account_num(bank_account_number)
-
-        for budget in user_budget_list:
-            if type(budget) == BudgetCatalogue.budget_type_map[budget_type]:
-                budget.add_spent(amount)
+        budget = cls.filter_budget_by_bank_account_and_category(bank_account_number, budget_type)
+        if budget is not None:
+            budget.add_spent(amount)
+            cls._over_threshold_counts.pop(bank_account_number, None)
+            cls.save_budget(budget)
 
     @classmethod
     def add_budget(cls, budget):
         """
         Adds a budget to the budget list.
         :param budget: a Budget object
+        :raise ValueError: if the account already has a budget in that category
+        """
+        category = cls.budget_category_map[type(budget)]
+        with WriterGate.writer_for(cls._write_ahead_log), cls._lock:
+            account_budgets = cls._load_account_budgets(budget.bank_account_number)
+            cls._budget_index[budget.bank_account_number] = account_budgets
+            if category in account_budgets:
+                raise ValueError(f"Bank account {budget.bank_account_number} already has a {category.name} budget.")
+            if cls._write_ahead_log is not None:
+                cls._write_ahead_log.log_add_budget(budget)
+            if cls._storage is not None:
+                cls._storage.save_budget(budget)
+            account_budgets[category] = budget
+            cls._budget_list.append(budget)
+            cls._over_threshold_counts.pop(budget.bank_account_number, None)
+
+    @classmethod
+    def count_budgets_over_threshold(cls, user) -> int:
+        """
+        Returns how many budgets of a user's account are over the user's lockout threshold,
+        counting them only the first time.
+        :param user: a User
+        :return: an int
+        """
+        count = cls._over_threshold_counts.get(user.bank_account_number)
+        if count is None:
+            count = cls.recount_budgets_over_threshold(user)
+            cls._over_threshold_counts[user.bank_account_number] = count
+        return count
+
+    @classmethod
+    def recount_budgets_over_threshold(cls, user) -> int:
+        """
+        Counts the budgets of a user's account that are over the user's lockout threshold by
+        checking every one of them.
+        :param user: a User
+        :return: an int
+        """
+        return sum(user.is_over_lockout_threshold(budget.limit_cents, budget.spent_cents)
+                   for budget in cls.get_budgets_by_account_num(user.bank_account_number))
+
+    @classmethod
+    def update_budget_over_threshold(cls, user, was_over: bool, is_over: bool) -> None:
+        """
+        Moves the count of budgets over the lockout threshold when a budget of the user crosses it.
+        :param user: a User
+        :param was_over: a boolean, whether the budget was over the threshold before it changed
+        :param is_over: a boolean, whether the budget is over the threshold now
+        """
+        if was_over != is_over and user.bank_account_number in cls._over_threshold_counts:
+            cls._over_threshold_counts[user.bank_account_number] += 1 if is_over else -1
+
+    @classmethod
+    def save_budget(cls, budget):
+        """
+        Writes the current spent amount of a budget to the storage backend.
+        :param budget: a Budget object
+        """
+        if cls._storage is not None:
+            cls._storage.save_budget(budget)
+
+    @classmethod
+    def set_storage(cls, storage):
+        """
+        Keeps the catalogue in a storage backend instead of memory only.
+        :param storage: an SQLiteStorage, or None for memory only
+        """
+        cls._storage = storage
+        cls.clear()
+
+    @classmethod
+    def set_write_ahead_log(cls, write_ahead_log):
+        """
+        Logs every later change to the catalogue to a write-ahead log.
+        :param write_ahead_log: a WriteAheadLog, or None to stop logging
+        """
+        cls._write_ahead_log = write_ahead_log
+
+    @classmethod
+    def clear(cls):
+        """
+        Removes every budget from the catalogue.
         """
-        cls._budget_list.append(budget)
+        cls._budget_list.clear()
+        cls._budget_index.clear()
+        cls._over_threshold_counts.clear()
@@ -0,0 +1,175 @@
+import threading
+import time
+import numpy as np
+from budget_types import BudgetType
+from money import Money
+from transaction import Transaction
+
+
+class ColumnarTransactionStore:
+    """
+    This class keeps transactions column by column in contiguous NumPy arrays so reports over the
+    whole ledger can be computed with vectorized group-bys instead of walking Transaction objects.
+    Bank account numbers and merchants are dictionary-encoded into integer ids. Appends and reports
+    are guarded by a lock so the store can be fed from many threads.
+    """
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        """
+        Initialize an empty store.
+        :param capacity: an int, the number of rows to allocate up front
+        """
+        self._lock = threading.RLock()
+        self._size = 0
+        self._timestamps = np.empty(capacity, dtype=np.int64)
+        self._amounts = np.empty(capacity, dtype=np.float64)
+        self._categories = np.empty(capacity, dtype=np.int8)
+        self._account_ids = np.empty(capacity, dtype=np.int32)
+        self._merchant_ids = np.empty(capacity, dtype=np.int32)
+        self._account_numbers = []
+        self._account_codes = {}
+        self._merchants = []
+        self._merchant_codes = {}
+
+    @staticmethod
+    def _encode(value: str, values: list, codes: dict) -> int:
+        """
+        Returns the id of a string in a dictionary encoding, adding it if it is new.
+        :param value: a string
+        :param values: a list mapping ids to strings
+        :param codes: a dict mapping strings to ids
+        :return: an int
+        """
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def _reserve(self, capacity: int) -> None:
+        """
+        Grows every column so it holds at least the given number of rows.
+        :param capacity: an int
+        """
+        current = len(self._timestamps)
+        if capacity <= current:
+            return
+        new_capacity = max(capacity, current * 2)
+        for name in ("_timestamps", "_amounts", "_categories", "_account_ids", "_merchant_ids"):
+            column = getattr(self, name)
+            grown = np.empty(new_capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    def append(self, transaction: Transaction) -> None:
+        """
+        Adds a transaction as a new row.
+        :param transaction: a Transaction
+        """
+        with self._lock:
+            self._reserve(self._size + 1)
+            row = self._size
+            self._timestamps[row] = transaction.timestamp
+            self._amounts[row] = transaction.amount
+            self._categories[row] = transaction.budget_category
+            self._account_ids[row] = self._encode(transaction.bank_num, self._account_numbers, self._account_codes)
+            self._merchant_ids[row] = self._encode(transaction.merchant, self._merchants, self._merchant_codes)
+            self._size += 1
+
+    def extend(self, transactions) -> None:
+        """
+        Adds many transactions, growing the columns at most once when the length is known.
+        :param transactions: an iterable of Transactions
+        """
+        with self._lock:
+            if hasattr(transactions, "__len__"):
+                self._reserve(self._size + len(transactions))
+            for transaction in transactions:
+                self.append(transaction)
+
+    def __len__(self):
+        return self._size
+
+    def transaction(self, row: int) -> Transaction:
+        """
+        Returns a Transaction view of a row, suitable for the existing printing code.
+        :param row: an int
+        :return: a Transaction
+        """
+        if not 0 <= row < self._size:
+            raise IndexError(f"Row {row} is out of range.")
+        return Transaction(int(self._timestamps[row]), float(self._amounts[row]), int(self._categories[row]),
+                           self._merchants[self._merchant_ids[row]],
+                           self._account_numbers[self._account_ids[row]])
+
+    def iter_transactions(self, bank_account_number: str = None):
+        """
+        Iterates over Transaction views in the order they were added, optionally for one account.
+        :param bank_account_number: a string, or None for every account
+        :return: an iterator of Transactions
+        """
+        if bank_account_number is None:
+            rows = range(self._size)
+        elif bank_account_number in self._account_codes:
+            rows = np.flatnonzero(self._account_ids[:self._size] == self._account_codes[bank_account_number])
+        else:
+            rows = ()
+        for row in rows:
+            yield self.transaction(int(row))
+
+    def spend_by_category_per_month(self, bank_account_numbers=None) -> dict:
+        """
+        Totals the amount spent per calendar month (local time) and budget category. Amounts are
+        summed in whole cents.
+        :param bank_account_numbers: an iterable of strings to restrict the report to, or None for
+                                     every account
+        :return: a dict mapping ("YYYY-MM", BudgetType) to the total amount
+        """
+        with self._lock:
+            size = self._size
+            timestamps = self._timestamps[:size].copy()
+            categories = self._categories[:size].astype(np.int64)
+            amounts = self._amounts[:size].copy()
+            account_ids = self._account_ids[:size].copy()
+            account_codes = dict(self._account_codes)
+
+        months = self._local_months(timestamps)
+        if bank_account_numbers is not None:
+            codes = [account_codes[number] for number in bank_account_numbers if number in account_codes]
+            selected = np.isin(account_ids, codes)
+            months, categories, amounts = months[selected], categories[selected], amounts[selected]
+        if len(months) == 0:
+            return {}
+
+        # Dense group key: one slot per (month, category) pair between the first and last month.
+        num_categories = len(BudgetType) + 1
+        first_month = months.min()
+        keys = (months - first_month) * num_categories + categories
+        totals = np.bincount(keys, weights=np.rint(amounts * Money.CENTS_PER_DOLLAR))
+        counts = np.bincount(keys)
+
+        report = {}
+        for key in np.flatnonzero(counts):
+            month_offset, category = divmod(int(key), num_categories)
+            month = np.datetime64(int(first_month + month_offset), "M")
+            report[(str(month), BudgetType(category))] = Money.to_dollars(int(totals[key]))
+        return report
+
+    @staticmethod
+    def _local_months(timestamps):
+        """
+        Returns the calendar month (local time) of every timestamp, counted from 1970-01 as
+        datetime64[M] counts them. The local start of each month in range is found with
+        time.mktime, so daylight saving time is honoured, and timestamps are bisected into them.
+        :param timestamps: an int64 ndarray of seconds since the epoch
+        :return: an int64 ndarray
+        """
+        if len(timestamps) == 0:
+            return np.empty(0, dtype=np.int64)
+        first, last = time.localtime(int(timestamps.min())), time.localtime(int(timestamps.max()))
+        first_month = first.tm_year * 12 + first.tm_mon - 1
+        last_month = last.tm_year * 12 + last.tm_mon - 1
+        starts = np.array([time.mktime((month // 12, month % 12 + 1, 1, 0, 0, 0, 0, 0, -1))
+                           for month in range(first_month, last_month + 2)])
+        return np.searchsorted(starts, timestamps, side="right") - 1 + first_month - 1970 * 12
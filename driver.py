@@ -1,3 +1,4 @@
+import sys
 from fam import Fam
 from budget_catalogue import BudgetCatalogue
 from bank_account_catalogue import BankAccountCatalogue
@@ -6,18 +7,137 @@ from transaction_catalogue import TransactionCatalogue
 
 class Driver:
     """
-    Driver class drives
+    Driver class drives the FAM, either through the interactive menus or headless from a command
+    file or Python script. Nothing is built until a Driver is created, so importing this module
+    has no side effects.
+
+    A command file can also be sent to a running FamService instead, making the driver a thin
+    client of the service. The interactive menus still run against a Fam in this process.
     """
-    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue())
-    fam.display_main_menu()
 
+    def __init__(self, write_ahead_log_path: str = None, snapshot_path: str = None):
+        """
+        Builds the Fam, restoring it from a snapshot and a write-ahead log when they are given.
+        :param write_ahead_log_path: a string, or None to keep everything in memory only
+        :param snapshot_path: a string, or None
+        """
+        write_ahead_log = None
+        if write_ahead_log_path is not None:
+            from write_ahead_log import WriteAheadLog
+            write_ahead_log = WriteAheadLog(write_ahead_log_path)
+        self._write_ahead_log = write_ahead_log
+        self.fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue(), write_ahead_log,
+                       snapshot_path)
+
+    def run(self) -> None:
+        """
+        Runs the interactive menus until the user exits.
+        """
+        self.fam.display_main_menu()
+
+    def run_commands(self, lines, output=None) -> int:
+        """
+        Runs a command file: one JSON request per line, with the same actions as FamService, each
+        answered by one JSON response line.
+        :param lines: an iterable of strings
+        :param output: a text stream, sys.stdout by default
+        :return: the number of requests that failed
+        """
+        from fam_commands import FamCommands
+        return FamCommands(self.fam).run_lines(lines, output or sys.stdout)
+
+    @staticmethod
+    def run_remote_commands(host: str, port: int, lines, output=None) -> int:
+        """
+        Runs a command file against a running FamService rather than a Fam of this process.
+        :param host: a string
+        :param port: an int
+        :param lines: an iterable of strings
+        :param output: a text stream, sys.stdout by default
+        :return: the number of requests that failed
+        """
+        import asyncio
+        from fam_service import FamClient
+
+        async def run() -> int:
+            client = await FamClient.connect(host, port)
+            try:
+                return await client.run_lines(lines, output or sys.stdout)
+            finally:
+                await client.close()
+
+        return asyncio.run(run())
 
-def main():
+    def run_script(self, path: str) -> None:
+        """
+        Runs a Python script with the Fam available to it as the global fam.
+        :param path: a string
+        """
+        import runpy
+        runpy.run_path(path, init_globals={"fam": self.fam}, run_name="__main__")
+
+    def close(self) -> None:
+        """
+        Closes the write-ahead log, if there is one.
+        """
+        if self._write_ahead_log is not None:
+            self._write_ahead_log.close()
+
+
+def main(argv=None) -> int:
     """
-    Driver of the FAM.
+    Driver of the FAM. With no file it runs the interactive menus; given a command file (or - for
+    standard input) or a .py script, it runs that headless and exits. With --connect, a command
+    file is sent to a running FamService instead.
+    :param argv: a list of command line arguments, or None to use sys.argv
+    :return: the exit status, 1 if any command failed
     """
-    Driver()
+    # argparse is only loaded to run the driver, not to import it.
+    import argparse
+    parser = argparse.ArgumentParser(description="Family Appointed Moderator")
+    parser.add_argument("file", nargs="?",
+                        help="a JSON-lines command file, - for standard input, or a .py script to run headless")
+    parser.add_argument("--wal", help="write-ahead log to recover from and log changes to")
+    parser.add_argument("--snapshot", help="snapshot to start from")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="write the snapshot (and empty the write-ahead log) before exiting")
+    parser.add_argument("--connect", metavar="HOST:PORT",
+                        help="send the command file to a running FAM service instead")
+    arguments = parser.parse_args(argv)
+    if arguments.checkpoint and not arguments.snapshot:
+        parser.error("--checkpoint needs --snapshot")
+
+    if arguments.connect:
+        if arguments.file is None or arguments.file.endswith(".py"):
+            parser.error("--connect needs a command file")
+        if arguments.wal or arguments.snapshot or arguments.checkpoint:
+            parser.error("--connect cannot be used with --wal, --snapshot or --checkpoint")
+        host, _, port = arguments.connect.rpartition(":")
+        if arguments.file == "-":
+            failures = Driver.run_remote_commands(host or "127.0.0.1", int(port), sys.stdin)
+        else:
+            with open(arguments.file) as file:
+                failures = Driver.run_remote_commands(host or "127.0.0.1", int(port), file)
+        return int(failures > 0)
+
+    driver = Driver(arguments.wal, arguments.snapshot)
+    try:
+        failures = 0
+        if arguments.file is None:
+            driver.run()
+        elif arguments.file.endswith(".py"):
+            driver.run_script(arguments.file)
+        elif arguments.file == "-":
+            failures = driver.run_commands(sys.stdin)
+        else:
+            with open(arguments.file) as file:
+                failures = driver.run_commands(file)
+        if arguments.checkpoint:
+            driver.fam.checkpoint()
+    finally:
+        driver.close()
+    return int(failures > 0)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -3,7 +3,14 @@ from bank_account_catalogue import BankAccountCatalogue
 from transaction_catalogue import TransactionCatalogue
 from register import Register
 from user import User
+from account_locks import WriterGate
 from budget_types import BudgetType
+from snapshot import Snapshot
+from statement_renderer import StatementRenderer
+from monthly_rollups import MonthlyRollups
+from metrics import SessionCapture
+import os
+import time
 
 
 class Fam:
@@ -16,16 +23,45 @@ class Fam:
                     'View Bank Account Details', 'Go back to previous menu']
 
     def __init__(self, bank_account_catalogue: BankAccountCatalogue, budget_catalogue: BudgetCatalogue,
-                 transaction_catalogue: TransactionCatalogue):
+                 transaction_catalogue: TransactionCatalogue, write_ahead_log=None, snapshot_path: str = None,
+                 storage=None):
         """
-        Initialize the Fam class with bank_account_catalogue and budget_catalogue.
+        Initialize the Fam class with bank_account_catalogue and budget_catalogue. When a snapshot
+        exists at snapshot_path it is loaded first. When a write-ahead log is given, the part of it
+        not covered by the snapshot is replayed and every later change is logged to it. When a storage
+        backend is given, the catalogues and users are kept in it instead of in memory.
         :param bank_account_catalogue: a BankAccountCatalogue object
         :param budget_catalogue: a BudgetCatalogue object
+        :param transaction_catalogue: a TransactionCatalogue object
+        :param write_ahead_log: a WriteAheadLog object, or None to keep everything in memory only
+        :param snapshot_path: a string, the path of a snapshot written by Snapshot.write, or None
+        :param storage: an SQLiteStorage object, or None to keep the catalogues in memory
         """
         self._user_list = []
+        self._users_by_account = {}
         self._bank_account_Catalogue = bank_account_catalogue
         self._budget_catalogue = budget_catalogue
         self._transaction_catalogue = transaction_catalogue
+        self._write_ahead_log = write_ahead_log
+        self._snapshot_path = snapshot_path
+        self._storage = storage
+        self._statement_renderer = StatementRenderer(transaction_catalogue)
+
+        if storage is not None:
+            bank_account_catalogue.set_storage(storage)
+            budget_catalogue.set_storage(storage)
+            transaction_catalogue.set_storage(storage)
+            self._user_list.extend(storage.load_users())
+
+        snapshot_lsn = 0
+        if snapshot_path is not None and os.path.exists(snapshot_path):
+            snapshot_lsn = Snapshot.load(snapshot_path, self)
+
+        if write_ahead_log is not None:
+            write_ahead_log.recover(self, snapshot_lsn)
+            bank_account_catalogue.set_write_ahead_log(write_ahead_log)
+            budget_catalogue.set_write_ahead_log(write_ahead_log)
+            transaction_catalogue.set_write_ahead_log(write_ahead_log)
 
     @property
     def user_list(self) -> list:
@@ -59,9 +95,38 @@ class Fam:
         """
         return self._transaction_catalogue
 
+    def wait_durable(self) -> None:
+        """
+        Blocks until everything logged so far is synced to disk. Does nothing without a
+        write-ahead log.
+        """
+        if self._write_ahead_log is not None:
+            self._write_ahead_log.wait_durable(self._write_ahead_log.last_lsn)
+
+    def checkpoint(self) -> None:
+        """
+        Writes a snapshot to snapshot_path and, when there is a write-ahead log, empties the log.
+        :raise ValueError: if the Fam was created without a snapshot path
+        """
+        if self._snapshot_path is None:
+            raise ValueError("Cannot checkpoint without a snapshot path.")
+        if self._write_ahead_log is not None:
+            Snapshot.checkpoint(self._snapshot_path, self, self._write_ahead_log)
+        else:
+            Snapshot.write(self._snapshot_path, self)
+
     def display_main_menu(self) -> None:
         """
         Display the user menu allowing the user to register a new user and select the user from the user list.
+        A profile, the memory allocations or the metrics of the session are captured when
+        FAM_PROFILE, FAM_TRACEMALLOC or FAM_METRICS name a file to write them to.
+        """
+        with SessionCapture.from_environment():
+            self._run_main_menu()
+
+    def _run_main_menu(self) -> None:
+        """
+        Runs the main menu until the user exits.
         """
         user_input = None
         while user_input != len(Fam.MAIN_MENU):
@@ -73,7 +138,7 @@ class Fam:
             try:
                 user_input = int(input(f"Please enter a number (1 - {len(Fam.MAIN_MENU)}): "))
                 if user_input == Fam.MAIN_MENU.index('Register a user') + 1:
-                    self._add_user(Register.register_user(self.bank_account_catalogue, self.budget_catalogue))
+                    self.add_user(Register.register_user(self.bank_account_catalogue, self.budget_catalogue))
                 elif user_input == Fam.MAIN_MENU.index('Select a user') + 1:
                     if len(self.user_list) == 0:
                         print('\nError: There is no available user account')
@@ -86,12 +151,31 @@ class Fam:
             except ValueError or TypeError:
                 print(f'Error: Could not process the input.')
 
-    def _add_user(self, user: User) -> None:
+    def add_user(self, user: User) -> None:
         """
         Add user to the user list.
         :param user: a User object
         """
-        self.user_list.append(user)
+        with WriterGate.writer_for(self._write_ahead_log):
+            if self._write_ahead_log is not None:
+                self._write_ahead_log.log_add_user(user)
+            if self._storage is not None:
+                self._storage.save_user(user)
+            self.user_list.append(user)
+            self._users_by_account[user.bank_account_number] = user
+
+    def get_user(self, bank_account_number: str) -> User or None:
+        """
+        Return the user that owns a bank account.
+        :param bank_account_number: a string
+        :return: a User object, or None if no user owns the account
+        """
+        user = self._users_by_account.get(bank_account_number)
+        if user is None:
+            # Users restored from a log, snapshot or storage backend are indexed on first use.
+            self._users_by_account.update((user.bank_account_number, user) for user in self.user_list)
+            user = self._users_by_account.get(bank_account_number)
+        return user
 
     def _select_user(self) -> User or None:
         """
@@ -155,8 +239,13 @@ class Fam:
         amount left, and the total amount allocated to the budget.
         """
         user_budget_list = self.budget_catalogue.get_budgets_by_account_num(user.bank_account_number)
+        month = MonthlyRollups.month_of(time.time())
+        this_month = self.transaction_catalogue.get_rollups().month_summary(user.bank_account_number, month)
         for budget in user_budget_list:
             print(budget)
+            rollup = this_month.get(self.budget_catalogue.budget_category_map[type(budget)])
+            if rollup is not None:
+                print(f"This month ({month}): {rollup}\n")
 
     def _record_transaction_option(self, user: User) -> None:
         """
@@ -176,20 +265,12 @@ class Fam:
         Allows the user to select the budget category and view all the transactions to date in that category.
         :param user: a User
         """
-        # Get user transactions
-        user_transactions = self.transaction_catalogue.get_user_transactions(user.bank_account_number)
-        return_list = []
-
         # Let user select the budget category
         for budget_type in list(BudgetType):
             print(budget_type.value, "\b.", budget_type.name)
         selected = int(input("Select the budget category you'd like to explore: "))
-        for transaction in user_transactions:
-            if transaction.budget_category == selected:
-                return_list.append(transaction)
         print(f"======== Transactions Under {BudgetType(selected).name} ========")
-        for transaction in return_list:
-            print(transaction)
+        self._page_statement(self._statement_renderer.open(user.bank_account_number, selected), numbered=False)
 
     def _view_bank_account_detail_option(self, user: User) -> None:
         """
@@ -202,4 +283,15 @@ class Fam:
         print("\n======== Budget Status ========")
         self._view_budget_option(user)
         print("======== All Transactions ========")
-        self.transaction_catalogue.print_user_transactions(user.bank_account_number)
+        self._page_statement(self._statement_renderer.open(user.bank_account_number))
+
+    def _page_statement(self, cursor, numbered: bool = True) -> None:
+        """
+        Prints a statement one page at a time, asking before each further page.
+        :param cursor: a StatementCursor
+        :param numbered: a boolean, whether to number the transactions
+        """
+        while self._statement_renderer.write_page(cursor, numbered):
+            if input("Press Enter for the next page, or q to stop: ").strip().lower() == 'q':
+                cursor.close()
+                break
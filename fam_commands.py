@@ -0,0 +1,275 @@
+import json
+from datetime import datetime
+from bank_account_type import BankAccountType
+from budget_types import BudgetType
+from fam import Fam
+from metrics import Instrumentation
+from record_codec import RecordCodec
+from register import Register
+from user_type import UserType
+
+
+class FamCommands:
+    """
+    This class runs requests against a Fam. Each request is a dict with an "action" and its
+    parameters, and each response is a dict of the form {"ok": true, "result": ...} or
+    {"ok": false, "error": "..."}. An optional "id" in a request is echoed back in its response.
+
+    FamService serves these requests over TCP and each shard of a ShardedLedger answers them over
+    a pipe. The headless driver reads them from a command file. This module loads nothing beyond
+    the catalogues, so a short-lived process can use it without paying for asyncio.
+    """
+
+    def __init__(self, fam: Fam, wait_durable: bool = True):
+        """
+        Initialize the commands with the Fam they run against. With a write-ahead log, a request
+        that changes anything is only answered once its records are on disk, unless wait_durable
+        is False; the caller must then sync the log before passing the responses on.
+        :param fam: a Fam
+        :param wait_durable: a boolean
+        """
+        self._fam = fam
+        self._wait_durable = wait_durable
+        self._actions = {
+            "register": self._register,
+            "list_users": self._list_users,
+            "record_transaction": self._record_transaction,
+            "view_budgets": self._view_budgets,
+            "view_transactions_by_budget": self._view_transactions_by_budget,
+            "account_details": self._account_details,
+            "spend_by_category_per_month": self._spend_by_category_per_month,
+            "top_merchants": self._top_merchants,
+            "metrics": self._metrics
+        }
+
+    def dispatch(self, request: dict) -> dict:
+        """
+        Runs one request in the calling thread and returns its response.
+        :param request: a dict with an "action" and its parameters
+        :return: a dict
+        """
+        response = {}
+        try:
+            if not isinstance(request, dict):
+                raise TypeError("Request must be a JSON object.")
+            if "id" in request:
+                response["id"] = request["id"]
+            result = self._actions[request["action"]](request)
+            response.update(ok=True, result=result)
+        except KeyError as error:
+            response.update(ok=False, error=f"Missing or unknown field: {error}")
+        except (ValueError, TypeError) as error:
+            response.update(ok=False, error=str(error))
+        return response
+
+    def run_lines(self, lines, output) -> int:
+        """
+        Runs one JSON request per line and writes one JSON response per line. Blank lines and
+        lines starting with # are skipped.
+        :param lines: an iterable of strings
+        :param output: a text stream
+        :return: the number of requests that failed
+        """
+        failures = 0
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {"ok": False, "error": "Request is not valid JSON."}
+            else:
+                try:
+                    response = self.dispatch(request)
+                except Exception as error:
+                    # As in FamService, one failing request must not stop the rest of the file.
+                    response = {"ok": False, "error": f"{type(error).__name__}: {error}"}
+            failures += not response["ok"]
+            output.write(json.dumps(response) + "\n")
+        return failures
+
+    def _get_user(self, request: dict):
+        """
+        Returns the user that owns the bank account named in a request.
+        :param request: a dict
+        :return: a User
+        :raise ValueError: if no user owns the account
+        """
+        user = self._fam.get_user(str(request["bank_account_number"]))
+        if user is None:
+            raise ValueError(f"No user owns bank account {request['bank_account_number']}.")
+        return user
+
+    @staticmethod
+    def _get_enum(enum_type, value):
+        """
+        Returns the member of an enum named or numbered by a request field.
+        :param enum_type: an Enum class
+        :param value: a string, the member's name in any case, or an int, its value
+        :return: a member of enum_type
+        :raise KeyError: if no member has that name
+        :raise ValueError: if no member has that value, or the field is neither a string nor an int
+        """
+        if isinstance(value, str):
+            return enum_type[value.upper()]
+        if isinstance(value, int) and not isinstance(value, bool):
+            return enum_type(value)
+        raise ValueError(f"Expected the name or number of a {enum_type.__name__}, not {value!r}.")
+
+    @staticmethod
+    def _encode_user(user) -> dict:
+        """
+        Returns the response form of a user.
+        :param user: a User
+        :return: a dict
+        """
+        return RecordCodec.encode_user(user)
+
+    @staticmethod
+    def _encode_budget(budget, user) -> dict:
+        """
+        Returns the response form of a budget, including whether it is locked for its user.
+        :param budget: a Budget
+        :param user: a User
+        :return: a dict
+        """
+        record = RecordCodec.encode_budget(budget)
+        record["name"] = BudgetType(record["budget_category"]).name
+        record["is_locked"] = user.is_over_lockout_threshold(budget.limit_cents, budget.spent_cents) \
+            and user.is_lockout_action_required()
+        return record
+
+    @staticmethod
+    def _encode_transaction(transaction) -> dict:
+        """
+        Returns the response form of a transaction.
+        :param transaction: a Transaction
+        :return: a dict
+        """
+        record = RecordCodec.encode_transaction(transaction)
+        record["time"] = transaction.time
+        return record
+
+    def _register(self, request: dict) -> dict:
+        """
+        Registers a user with a bank account and a limit for every budget.
+        :param request: a dict with name, dob (YYYY-MM-DD), user_type and bank_account_type (number
+                        or name), bank_account_number, bank_name, bank_balance and budget_limits
+        :return: the registered user
+        """
+        if not isinstance(request["budget_limits"], dict):
+            raise ValueError("budget_limits must be an object of limits by budget category.")
+        limits = {self._get_enum(BudgetType, name): limit for name, limit in request["budget_limits"].items()}
+        user = Register.create_user(
+            self._fam.bank_account_catalogue, self._fam.budget_catalogue, request["name"],
+            datetime.fromisoformat(request["dob"]), self._get_enum(UserType, request["user_type"]),
+            self._get_enum(BankAccountType, request["bank_account_type"]), str(request["bank_account_number"]),
+            request["bank_name"], request["bank_balance"], limits)
+        self._fam.add_user(user)
+        if self._wait_durable:
+            self._fam.wait_durable()
+        return self._encode_user(user)
+
+    def _list_users(self, request: dict) -> list:
+        """
+        Lists every registered user.
+        :param request: a dict
+        :return: a list of users
+        """
+        return [self._encode_user(user) for user in self._fam.user_list]
+
+    def _record_transaction(self, request: dict) -> dict:
+        """
+        Records a transaction on the bank account of a user.
+        :param request: a dict with bank_account_number, budget_category (number or name), amount,
+                        merchant and an optional timestamp in epoch seconds
+        :return: the status, warnings and recorded transaction
+        """
+        category = request["budget_category"]
+        category = self._get_enum(BudgetType, category)
+        result = self._fam.transaction_catalogue.record_transaction(
+            self._get_user(request), category, float(request["amount"]), request["merchant"],
+            request.get("timestamp"), self._wait_durable)
+        return {
+            "status": result.status.name,
+            "warnings": [warning.name for warning in result.warnings],
+            "transaction": self._encode_transaction(result.transaction) if result.transaction else None
+        }
+
+    def _view_budgets(self, request: dict) -> list:
+        """
+        Lists the budgets of a user.
+        :param request: a dict with bank_account_number
+        :return: a list of budgets
+        """
+        user = self._get_user(request)
+        return [self._encode_budget(budget, user)
+                for budget in self._fam.budget_catalogue.get_budgets_by_account_num(user.bank_account_number)]
+
+    def _view_transactions_by_budget(self, request: dict) -> list:
+        """
+        Lists the transactions of a user in one budget category.
+        :param request: a dict with bank_account_number and budget_category (number or name)
+        :return: a list of transactions
+        """
+        user = self._get_user(request)
+        category = request["budget_category"]
+        category = self._get_enum(BudgetType, category)
+        return [self._encode_transaction(transaction) for transaction in
+                self._fam.transaction_catalogue.get_user_transactions_by_category(user.bank_account_number,
+                                                                                  category.value)]
+
+    def _account_details(self, request: dict) -> dict:
+        """
+        Returns the bank account, budgets and transactions of a user.
+        :param request: a dict with bank_account_number
+        :return: a dict
+        """
+        user = self._get_user(request)
+        bank_account = self._fam.bank_account_catalogue.get_user_bank_account(user.bank_account_number)
+        return {
+            "bank_account": RecordCodec.encode_bank_account(bank_account),
+            "budgets": self._view_budgets(request),
+            "transactions": [self._encode_transaction(transaction) for transaction in
+                             self._fam.transaction_catalogue.iter_user_transactions(user.bank_account_number)]
+        }
+
+    def _spend_by_category_per_month(self, request: dict) -> list:
+        """
+        Totals the amount spent per calendar month (local time) and budget category.
+        :param request: a dict with an optional list of bank_account_numbers
+        :return: a list of dicts with month, budget_category and total
+        """
+        report = self._fam.transaction_catalogue.spend_by_category_per_month(request.get("bank_account_numbers"))
+        return [{"month": month, "budget_category": category.name, "total": total}
+                for (month, category), total in sorted(report.items(), key=lambda item: (item[0][0], item[0][1].value))]
+
+    def _top_merchants(self, request: dict) -> list:
+        """
+        Returns the estimated top merchants of a user.
+        :param request: a dict with bank_account_number, and optionally budget_category (number or
+                        name), k and by ("count" or "amount")
+        :return: a list of dicts with merchant, estimate and error
+        """
+        user = self._get_user(request)
+        category = request.get("budget_category")
+        if category is not None:
+            category = self._get_enum(BudgetType, category)
+        top = self._fam.transaction_catalogue.top_merchants(user.bank_account_number, category,
+                                                            int(request.get("k", 10)), request.get("by", "count"))
+        return [{"merchant": merchant, "estimate": estimate, "error": error} for merchant, estimate, error in top]
+
+    @staticmethod
+    def _metrics(request: dict) -> dict:
+        """
+        Returns the metrics recorded by the service process, switching the instrumentation on or
+        off first when asked to.
+        :param request: a dict with an optional boolean enable
+        :return: a dict with enabled and the metrics
+        """
+        if request.get("enable") is True:
+            Instrumentation.enable()
+        elif request.get("enable") is False:
+            Instrumentation.disable()
+        return {"enabled": Instrumentation.is_enabled(), "metrics": Instrumentation.registry.to_dict()}
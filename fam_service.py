@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import json
+from fam import Fam
+from fam_commands import FamCommands
+from transaction_catalogue import TransactionCatalogue
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+
+
+class FamService(FamCommands):
+    """
+    This class exposes a Fam as a line-delimited JSON service over TCP. Each request is one JSON
+    object on its own line with an "action" and its parameters, and each response is one line of
+    the form {"ok": true, "result": ...} or {"ok": false, "error": "..."}. An optional "id" in a
+    request is echoed back in its response.
+
+    Every connection is served by the same asyncio event loop. Every action runs in a worker
+    thread, since writes may wait on a write-ahead log or storage backend and reads walk a
+    user's transactions; the catalogues are safe to use from many threads.
+    """
+
+    def __init__(self, fam: Fam, executor=None):
+        """
+        Initialize the service with the Fam it serves.
+        :param fam: a Fam
+        :param executor: a concurrent.futures.Executor to run actions on, or None for the event
+                         loop's default executor
+        """
+        super().__init__(fam)
+        self._executor = executor
+
+    async def handle_request(self, request) -> dict:
+        """
+        Runs one request in a worker thread and returns its response. Tests and in-process
+        callers can use this directly without a socket.
+        :param request: a dict with an "action" and its parameters; anything else is answered
+                        with an error
+        :return: a dict
+        """
+        if not isinstance(request, dict):
+            return self.dispatch(request)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.dispatch, request)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.AbstractServer:
+        """
+        Starts listening for clients.
+        :param host: a string
+        :param port: an int, 0 picks a free port
+        :return: the asyncio Server
+        """
+        return await asyncio.start_server(self._handle_client, host, port)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Answers the requests of one client until it disconnects.
+        :param reader: a StreamReader
+        :param writer: a StreamWriter
+        """
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {"ok": False, "error": "Request is not valid JSON."}
+                else:
+                    try:
+                        response = await self.handle_request(request)
+                    except Exception as error:
+                        # One failing request must not cost the client its connection.
+                        response = {"ok": False, "error": f"{type(error).__name__}: {error}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+class FamClient:
+    """
+    This class is a small asyncio client for a FamService.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    async def connect(host: str = "127.0.0.1", port: int = 8765):
+        """
+        Opens a connection to a service.
+        :param host: a string
+        :param port: an int
+        :return: a FamClient
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        return FamClient(reader, writer)
+
+    async def send(self, request) -> dict:
+        """
+        Sends one request as it is and waits for its response.
+        :param request: a dict, or any other JSON value
+        :return: the response dict
+        :raise ConnectionError: if the service closes the connection
+        """
+        async with self._lock:
+            self._writer.write(json.dumps(request).encode() + b"\n")
+            await self._writer.drain()
+            line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("The service closed the connection.")
+        return json.loads(line)
+
+    async def request(self, action: str, **parameters):
+        """
+        Sends one request and waits for its response.
+        :param action: a string
+        :param parameters: the parameters of the action
+        :return: the result of the action
+        :raise RuntimeError: if the service reports an error
+        """
+        response = await self.send({"action": action, **parameters})
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    async def run_lines(self, lines, output) -> int:
+        """
+        Sends one JSON request per line and writes one JSON response per line, like
+        FamCommands.run_lines but against the service. Blank lines and lines starting with # are
+        skipped.
+        :param lines: an iterable of strings
+        :param output: a text stream
+        :return: the number of requests that failed
+        """
+        failures = 0
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {"ok": False, "error": "Request is not valid JSON."}
+            else:
+                response = await self.send(request)
+            failures += not response["ok"]
+            output.write(json.dumps(response) + "\n")
+        return failures
+
+    async def close(self) -> None:
+        """
+        Closes the connection.
+        """
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+async def run_service(host: str, port: int) -> None:
+    """
+    Serves an in-memory Fam until the process is stopped.
+    :param host: a string
+    :param port: an int
+    """
+    service = FamService(Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue()))
+    server = await service.serve(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    """
+    Runs the FAM service.
+    """
+    parser = argparse.ArgumentParser(description="Family Appointed Moderator JSON service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    arguments = parser.parse_args()
+    asyncio.run(run_service(arguments.host, arguments.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import datetime
+import random
+import time
+from itertools import accumulate
+from bank_account_type import BankAccountType
+from budget_types import BudgetType
+from register import Register
+from transaction import Transaction
+from user_type import UserType
+
+
+class LedgerGenerator:
+    """
+    This class generates a synthetic family and ledger for benchmarks and load tests. Everything
+    is drawn from one seeded random generator, so the same seed always gives the same data.
+
+    Users cycle through every UserType, about a third of them with a Saving account, and each
+    gets a budget for every BudgetType. Transaction histories are skewed the way real ones are:
+    a few accounts and merchants see most of the activity, some categories are busier than
+    others, and amounts follow a long-tailed distribution.
+    """
+    SAVING_SHARE = 0.3
+    BUDGET_LIMITS = (100.0, 250.0, 500.0, 1000.0, 2500.0)
+    CATEGORY_WEIGHTS = {
+        BudgetType.GAMES_ENTERTAINMENT: 2,
+        BudgetType.CLOTHING_ACCESSORIES: 1,
+        BudgetType.EATING_OUT: 5,
+        BudgetType.MISCELLANEOUS: 2
+    }
+    NUM_MERCHANTS = 5000
+    ACCOUNT_SKEW = 1.0
+    MERCHANT_SKEW = 1.1
+    BATCH_SIZE = 10000
+    HISTORY_SECONDS = 365 * 86400
+
+    def __init__(self, seed: int = 0):
+        """
+        Initialize a generator.
+        :param seed: an int
+        """
+        self._seed = seed
+        self._random = random.Random(seed)
+
+    @property
+    def seed(self) -> int:
+        """
+        Returns the seed of the generator.
+        :return: an int
+        """
+        return self._seed
+
+    def register_users(self, bank_account_catalogue, budget_catalogue, num_users: int, first_number: int = 0,
+                       bank_balance: float = 1e9) -> list:
+        """
+        Registers synthetic users with their bank accounts and budgets.
+        :param bank_account_catalogue: a BankAccountCatalogue
+        :param budget_catalogue: a BudgetCatalogue
+        :param num_users: an int
+        :param first_number: an int, the number of the first bank account
+        :param bank_balance: a float, the opening balance of every account
+        :return: a list of Users
+        """
+        rng = self._random
+        user_types = list(UserType)
+        users = []
+        for number in range(first_number, first_number + num_users):
+            user_type = user_types[number % len(user_types)]
+            bank_account_type = BankAccountType.SAVING if rng.random() < LedgerGenerator.SAVING_SHARE \
+                else BankAccountType.CHEQUING
+            limits = {budget_type: rng.choice(LedgerGenerator.BUDGET_LIMITS) for budget_type in BudgetType}
+            dob = datetime.datetime(rng.randrange(1950, 2000), rng.randrange(1, 13), rng.randrange(1, 29))
+            users.append(Register.create_user(bank_account_catalogue, budget_catalogue, f"User {number}", dob,
+                                              user_type, bank_account_type, f"{number:010d}", "Synthetic Bank",
+                                              bank_balance, limits))
+        return users
+
+    @staticmethod
+    def _zipf_weights(size: int, skew: float) -> list:
+        """
+        Returns the cumulative weights of a Zipf distribution over [0, size), where index i is
+        drawn in proportion to 1 / (i + 1) ** skew.
+        :param size: an int
+        :param skew: a float, larger is more skewed
+        :return: a list of floats
+        """
+        return list(accumulate(1 / rank ** skew for rank in range(1, size + 1)))
+
+    def transactions(self, users: list, num_transactions: int, end: float = None):
+        """
+        Generates a skewed transaction history for some users, in timestamp order, ending at end
+        and spread over the year before it.
+        :param users: a list of Users
+        :param num_transactions: an int
+        :param end: seconds since the epoch, or None for now
+        :return: an iterator of Transactions
+        """
+        if not users:
+            return
+        rng = self._random
+        end = time.time() if end is None else end
+        start = end - LedgerGenerator.HISTORY_SECONDS
+        step = LedgerGenerator.HISTORY_SECONDS / num_transactions
+        # Shuffle the accounts so the busiest ones are not always the first registered.
+        accounts = [user.bank_account_number for user in users]
+        rng.shuffle(accounts)
+        merchants = [f"Merchant {number}" for number in range(LedgerGenerator.NUM_MERCHANTS)]
+        account_weights = self._zipf_weights(len(accounts), LedgerGenerator.ACCOUNT_SKEW)
+        merchant_weights = self._zipf_weights(len(merchants), LedgerGenerator.MERCHANT_SKEW)
+        categories = [budget_type.value for budget_type in LedgerGenerator.CATEGORY_WEIGHTS]
+        category_weights = list(accumulate(LedgerGenerator.CATEGORY_WEIGHTS.values()))
+
+        for batch_start in range(0, num_transactions, LedgerGenerator.BATCH_SIZE):
+            size = min(LedgerGenerator.BATCH_SIZE, num_transactions - batch_start)
+            batch = zip(rng.choices(accounts, cum_weights=account_weights, k=size),
+                        rng.choices(merchants, cum_weights=merchant_weights, k=size),
+                        rng.choices(categories, cum_weights=category_weights, k=size))
+            for number, (account, merchant, category) in enumerate(batch, batch_start):
+                amount = round(rng.lognormvariate(3.0, 1.0), 2) + 0.01
+                yield Transaction(int(start + number * step), amount, category, merchant, account)
+
+    def populate(self, transaction_catalogue, users: list, num_transactions: int, end: float = None) -> int:
+        """
+        Loads a generated history into a transaction catalogue. Transactions are replayed, so the
+        budgets and balances reflect them, but the lockout rules do not reject any.
+        :param transaction_catalogue: a TransactionCatalogue
+        :param users: a list of Users
+        :param num_transactions: an int
+        :param end: seconds since the epoch, or None for now
+        :return: the number of transactions loaded
+        """
+        users_by_account = {user.bank_account_number: user for user in users}
+        count = 0
+        for transaction in self.transactions(users, num_transactions, end):
+            transaction_catalogue.replay_transaction(users_by_account[transaction.bank_num], transaction)
+            count += 1
+        return count
@@ -0,0 +1,161 @@
+import argparse
+import datetime
+import gc
+import json
+import sys
+import tracemalloc
+from bank_account import BankAccount, Chequing, Saving
+from bank_account_catalogue import BankAccountCatalogue
+from bank_account_type import BankAccountType
+from benchmark import MIN_USERS, TRANSACTIONS_PER_USER, clear_catalogues
+from budget import Budget
+from budget_catalogue import BudgetCatalogue
+from budget_types import BudgetType
+from ledger_generator import LedgerGenerator
+from register import Register
+from transaction import Transaction
+from transaction_catalogue import TransactionCatalogue
+from user_type import UserType
+
+DEFAULT_SCALE = 10 ** 5
+BY_FILE_LIMIT = 8
+
+
+def _traced(build) -> tuple:
+    """
+    Runs a build step and measures the memory it leaves allocated.
+    :param build: a function taking no arguments
+    :return: a (result of build, bytes, tracemalloc StatisticDiffs by file) tuple
+    """
+    gc.collect()
+    before = tracemalloc.take_snapshot()
+    result = build()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    by_file = after.compare_to(before, "filename")
+    return result, sum(diff.size_diff for diff in by_file), by_file
+
+
+def _instance_sizes() -> list:
+    """
+    Returns the shallow size of one instance of each domain class and whether it has a __dict__.
+    :return: a list of (class name, bytes, slotted) tuples
+    """
+    instances = [Transaction(0, 1.0, BudgetType.EATING_OUT.value, "Merchant", "0"),
+                 Register.budget_class_map[BudgetType.EATING_OUT](100.0, "0"),
+                 Chequing("0", "Bank", 100.0), Saving("0", "Bank", 100.0),
+                 Register.user_type_map[UserType.REBEL][0]("Name", datetime.datetime(2000, 1, 1), "0", 0.5)]
+    return [(type(instance).__name__, sys.getsizeof(instance), not hasattr(instance, "__dict__"))
+            for instance in instances]
+
+
+def measure(scale: int, seed: int = 0) -> dict:
+    """
+    Builds a synthetic ledger one kind of object at a time and measures the memory each kind
+    leaves allocated, catalogue indexes included, with tracemalloc. Account numbers are created
+    up front, since accounts, budgets, users and transactions all share them.
+    :param scale: an int, the number of transactions
+    :param seed: an int
+    :return: a dict with the counts, the bytes of each kind and its largest allocation sites
+    """
+    clear_catalogues()
+    num_users = max(MIN_USERS, scale // TRANSACTIONS_PER_USER)
+    numbers = [f"{number:010d}" for number in range(num_users)]
+    user_types = list(UserType)
+    account_types = [BankAccountType.SAVING if number % 3 == 0 else BankAccountType.CHEQUING
+                     for number in range(num_users)]
+    dob = datetime.datetime(2000, 1, 1)
+
+    def add_accounts():
+        for number, account_type in zip(numbers, account_types):
+            BankAccountCatalogue.add_bank_account(
+                Register.bank_account_type_map[account_type](number, "Synthetic Bank", 1e9))
+        return num_users
+
+    def add_budgets():
+        for number in numbers:
+            for budget_type in BudgetType:
+                BudgetCatalogue.add_budget(Register.budget_class_map[budget_type](500.0, number))
+        return num_users * len(BudgetType)
+
+    def add_users():
+        users = []
+        for index, number in enumerate(numbers):
+            user_class, warning_threshold = Register.user_type_map[user_types[index % len(user_types)]]
+            users.append(user_class(f"User {index}", dob, number, warning_threshold))
+        return users
+
+    tracemalloc.start()
+    try:
+        kinds = {}
+        count, size, by_file = _traced(add_accounts)
+        kinds["account"] = (count, size, by_file)
+        count, size, by_file = _traced(add_budgets)
+        kinds["budget"] = (count, size, by_file)
+        users, size, by_file = _traced(add_users)
+        kinds["user"] = (len(users), size, by_file)
+        count, size, by_file = _traced(
+            lambda: LedgerGenerator(seed).populate(TransactionCatalogue(), users, scale))
+        kinds["transaction"] = (count, size, by_file)
+    finally:
+        tracemalloc.stop()
+
+    report = {"scale": scale, "seed": seed, "kinds": {}, "instances": _instance_sizes(),
+              "tables": {"account": BankAccount.get_amounts().nbytes(),
+                         "budget": Budget.get_amounts().nbytes()}}
+    for kind, (count, size, by_file) in kinds.items():
+        report["kinds"][kind] = {
+            "count": count,
+            "bytes": size,
+            "bytes_per_object": size / count if count else 0.0,
+            "by_file": [(diff.traceback[0].filename, diff.size_diff)
+                        for diff in by_file[:BY_FILE_LIMIT] if diff.size_diff > 0]
+        }
+    clear_catalogues()
+    return report
+
+
+def print_report(report: dict, by_file: bool = False) -> None:
+    """
+    Prints a memory report.
+    :param report: a dict returned by measure
+    :param by_file: a bool, whether to print the largest allocation sites of each kind
+    """
+    print(f"Ledger of {report['scale']} transactions (seed {report['seed']})")
+    for kind, measured in report["kinds"].items():
+        print(f"{'per ' + kind:<18} {measured['bytes_per_object']:10.1f} B"
+              f"   {measured['count']:>10} objects {measured['bytes'] / 2 ** 20:10.1f} MiB")
+        if by_file:
+            for filename, size in measured["by_file"]:
+                print(f"{'':<18} {size / measured['count']:10.1f} B   {filename}")
+    print(f"{'amount tables':<18} {report['tables']['account']:>10} B accounts"
+          f" {report['tables']['budget']:>10} B budgets")
+    for name, size, slotted in report["instances"]:
+        print(f"{name:<18} {size:10} B   {'slotted' if slotted else 'has __dict__'}")
+
+
+def main(argv=None) -> int:
+    """
+    Prints the bytes held per transaction, per budget, per account and per user of a synthetic
+    ledger, and optionally writes them as JSON.
+    :param argv: a list of command line arguments, or None to use sys.argv
+    :return: 0
+    """
+    parser = argparse.ArgumentParser(description="Report the memory held by the FAM domain objects.")
+    parser.add_argument("--scale", type=int, default=DEFAULT_SCALE,
+                        help=f"number of transactions in the ledger (default: {DEFAULT_SCALE})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--by-file", action="store_true", help="break each kind down by allocation site")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    arguments = parser.parse_args(argv)
+
+    report = measure(arguments.scale, arguments.seed)
+    print_report(report, arguments.by_file)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,362 @@
+import heapq
+import threading
+from account_locks import AccountLockRegistry
+from budget_types import BudgetType
+from money import Money
+
+
+class MerchantTable:
+    """
+    This class gives each distinct merchant name an integer id. The table holds the name it was
+    given, which Transaction has already interned with sys.intern, so it adds no copy of its own.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def get_id(self, merchant: str) -> int:
+        """
+        Returns the id of a merchant, adding it to the table if it is new.
+        :param merchant: a string
+        :return: an int
+        """
+        merchant_id = self._ids.get(merchant)
+        if merchant_id is None:
+            with self._lock:
+                merchant_id = self._ids.get(merchant)
+                if merchant_id is None:
+                    self._names.append(merchant)
+                    merchant_id = self._ids[merchant] = len(self._names) - 1
+        return merchant_id
+
+    def find(self, merchant: str) -> int or None:
+        """
+        Returns the id of a merchant without adding it.
+        :param merchant: a string
+        :return: an int, or None if the merchant has never been seen
+        """
+        return self._ids.get(merchant)
+
+    def name(self, merchant_id: int) -> str:
+        """
+        Returns the name of a merchant id.
+        :param merchant_id: an int
+        :return: a string
+        """
+        return self._names[merchant_id]
+
+
+class SpaceSaving:
+    """
+    This class estimates the heaviest keys of a stream in a fixed number of counters, using the
+    Space-Saving algorithm. A key that is not counted replaces the smallest counter and inherits
+    its weight as error, so any key whose true weight exceeds total / capacity is always counted
+    and no estimate is ever too small.
+
+    Each counted key has one entry in a min-heap, holding its count when it was last placed
+    there. Counts only grow, so an entry is never above the key's count; updating a key is a dict
+    write, and an entry found to be out of date while looking for the smallest counter is pushed
+    back with the current count.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Initialize an empty sketch.
+        :param capacity: an int, the number of keys counted at once
+        """
+        if capacity < 1:
+            raise ValueError("A sketch holds at least one counter.")
+        self._capacity = capacity
+        self._counts = {}
+        self._errors = {}
+        self._heap = []
+        self.total = 0
+
+    def __len__(self):
+        return len(self._counts)
+
+    def offer(self, key, weight=1) -> None:
+        """
+        Adds weight to a key.
+        :param key: a hashable
+        :param weight: a positive number
+        """
+        if weight <= 0:
+            return
+        self.total += weight
+        counts = self._counts
+        count = counts.get(key)
+        if count is not None:
+            counts[key] = count + weight
+            return
+        if len(counts) < self._capacity:
+            self._errors[key] = 0
+            counts[key] = weight
+            heapq.heappush(self._heap, (weight, key))
+            return
+        error = self._evict_smallest()
+        self._errors[key] = error
+        counts[key] = error + weight
+        heapq.heappush(self._heap, (error + weight, key))
+
+    def _evict_smallest(self):
+        """
+        Removes the smallest counter.
+        :return: the weight of the removed counter
+        """
+        counts = self._counts
+        heap = self._heap
+        while True:
+            count, key = heap[0]
+            current = counts[key]
+            if current == count:
+                heapq.heappop(heap)
+                del counts[key]
+                del self._errors[key]
+                return count
+            heapq.heapreplace(heap, (current, key))
+
+    def estimate(self, key) -> tuple:
+        """
+        Returns the estimated weight of a key and how much of it may be overcounted.
+        :param key: a hashable
+        :return: an (estimate, error) tuple, (0, 0) for keys not currently counted
+        """
+        return self._counts.get(key, 0), self._errors.get(key, 0)
+
+    def top(self, k: int) -> list:
+        """
+        Returns the k heaviest counted keys.
+        :param k: an int
+        :return: a list of (key, estimate, error) tuples, heaviest first
+        """
+        heaviest = heapq.nlargest(k, self._counts.items(), key=lambda item: item[1])
+        return [(key, count, self._errors[key]) for key, count in heaviest]
+
+
+class MerchantIndex:
+    """
+    This class indexes transactions by merchant. Merchant names are given ids by a MerchantTable,
+    each account has an inverted index from merchant id to its transactions, and Space-Saving
+    sketches track the top merchants by count and by amount (in cents) per account and per budget
+    category, both within each account and across the ledger. The sketches keep a fixed number of
+    counters, so their memory does not grow with the number of distinct merchants.
+
+    The inverted index holds a reference per transaction, so it grows with the ledger. It can be
+    turned off with set_keep_postings to keep only the sketches in memory, and lookups by merchant
+    then scan the account's transactions; turning it back on rebuilds it on the next read.
+
+    Each account's postings and sketches have their own lock, so adds on different accounts only
+    meet briefly on the lock of the ledger-wide sketches.
+
+    Like MonthlyRollups, the index is updated as transactions are recorded, and is marked stale
+    and rebuilt from the ledger when transactions arrive some other way.
+    """
+    ACCOUNT_CAPACITY = 32
+    LEDGER_CAPACITY = 1024
+    METRICS = ("count", "amount")
+
+    def __init__(self, account_capacity: int = ACCOUNT_CAPACITY, ledger_capacity: int = LEDGER_CAPACITY,
+                 keep_postings: bool = True):
+        """
+        Initialize an empty index.
+        :param account_capacity: an int, the number of counters in each account's sketches
+        :param ledger_capacity: an int, the number of counters in the ledger-wide sketches
+        :param keep_postings: a boolean, whether to index every transaction by merchant
+        """
+        self._account_capacity = account_capacity
+        self._ledger_capacity = ledger_capacity
+        self._merchants = MerchantTable()
+        self._postings = {}
+        self._account_sketches = {}
+        self._ledger_sketches = {}
+        self._account_locks = AccountLockRegistry()
+        self._ledger_lock = threading.RLock()
+        self._stale = False
+        self._keep_postings = keep_postings
+
+    @property
+    def merchants(self) -> MerchantTable:
+        """
+        Returns the table of merchant ids.
+        :return: a MerchantTable
+        """
+        return self._merchants
+
+    @property
+    def is_stale(self) -> bool:
+        """
+        Returns whether the index needs to be rebuilt before it is read.
+        :return: a boolean
+        """
+        return self._stale
+
+    @property
+    def keep_postings(self) -> bool:
+        """
+        Returns whether each account's transactions are indexed by merchant.
+        :return: a boolean
+        """
+        return self._keep_postings
+
+    def set_keep_postings(self, keep_postings: bool) -> None:
+        """
+        Turns the inverted index on or off. Turning it on marks the index stale, so the postings
+        of transactions already recorded are rebuilt on the next read.
+        :param keep_postings: a boolean
+        """
+        with self._ledger_lock:
+            if keep_postings and not self._keep_postings:
+                self._keep_postings = True
+                self.mark_stale()
+            elif not keep_postings:
+                self._keep_postings = False
+                self._postings = {}
+
+    @staticmethod
+    def _get_sketches(sketches: dict, budget_category, capacity: int) -> tuple:
+        """
+        Returns the count and amount sketches of a category, creating them if needed.
+        :param sketches: a dict mapping BudgetType or None to sketches
+        :param budget_category: a BudgetType, or None for every category
+        :param capacity: an int
+        :return: a (count sketch, amount sketch) tuple
+        """
+        pair = sketches.get(budget_category)
+        if pair is None:
+            pair = sketches[budget_category] = (SpaceSaving(capacity), SpaceSaving(capacity))
+        return pair
+
+    @staticmethod
+    def _offer(pair: tuple, merchant_id: int, amount_cents: int) -> None:
+        """
+        Counts a transaction in a pair of sketches.
+        :param pair: a (count sketch, amount sketch) tuple
+        :param merchant_id: an int
+        :param amount_cents: an int
+        """
+        by_count, by_amount = pair
+        by_count.offer(merchant_id)
+        by_amount.offer(merchant_id, amount_cents)
+
+    def add(self, transaction) -> None:
+        """
+        Adds a transaction to the inverted index and the sketches of its account and category.
+        :param transaction: a Transaction
+        """
+        if self._stale:
+            return
+        category = BudgetType(transaction.budget_category)
+        merchant_id = self._merchants.get_id(transaction.merchant)
+        amount_cents = transaction.amount_cents
+        with self._account_locks.lock_for(transaction.bank_num):
+            sketches = self._account_sketches.setdefault(transaction.bank_num, {})
+            self._offer(self._get_sketches(sketches, None, self._account_capacity), merchant_id, amount_cents)
+            self._offer(self._get_sketches(sketches, category, self._account_capacity), merchant_id, amount_cents)
+            if self._keep_postings:
+                self._postings.setdefault(transaction.bank_num, {}).setdefault(merchant_id, []).append(transaction)
+        with self._ledger_lock:
+            self._offer(self._get_sketches(self._ledger_sketches, None, self._ledger_capacity), merchant_id,
+                        amount_cents)
+            self._offer(self._get_sketches(self._ledger_sketches, category, self._ledger_capacity), merchant_id,
+                        amount_cents)
+
+    def _reset(self) -> None:
+        """
+        Starts the postings and sketches afresh. New dicts are swapped in rather than the old ones
+        cleared, so an add still running on another account cannot corrupt them.
+        """
+        self._postings = {}
+        self._account_sketches = {}
+        self._ledger_sketches = {}
+
+    def mark_stale(self) -> None:
+        """
+        Marks the index as out of date with the ledger, so the next query rebuilds it.
+        """
+        with self._ledger_lock:
+            self._stale = True
+            self._reset()
+
+    def rebuild(self, transactions) -> None:
+        """
+        Replaces the index with one built from the given transactions.
+        :param transactions: an iterable of every Transaction in the ledger
+        """
+        # Built aside and swapped in, since adds take an account lock before the ledger lock. The
+        # merchant table only grows, so the rebuilt index shares it.
+        rebuilt = MerchantIndex(self._account_capacity, self._ledger_capacity, self._keep_postings)
+        rebuilt._merchants = self._merchants
+        for transaction in transactions:
+            rebuilt.add(transaction)
+        with self._ledger_lock:
+            self._postings = rebuilt._postings
+            self._account_sketches = rebuilt._account_sketches
+            self._ledger_sketches = rebuilt._ledger_sketches
+            self._stale = False
+
+    def clear(self) -> None:
+        """
+        Removes every merchant and transaction from the index.
+        """
+        with self._ledger_lock:
+            self._merchants = MerchantTable()
+            self._reset()
+            self._stale = False
+
+    def get_transactions(self, bank_account_number: str, merchant: str) -> list:
+        """
+        Returns the transactions of an account at one merchant, in the order they were added.
+        :param bank_account_number: a string
+        :param merchant: a string
+        :return: a list of Transactions
+        :raise ValueError: if postings are not kept
+        """
+        if not self._keep_postings:
+            raise ValueError("The merchant index does not keep postings.")
+        merchant_id = self._merchants.find(merchant)
+        with self._account_locks.lock_for(bank_account_number):
+            return list(self._postings.get(bank_account_number, {}).get(merchant_id, ()))
+
+    def account_merchants(self, bank_account_number: str) -> list:
+        """
+        Returns every merchant an account has transactions with.
+        :param bank_account_number: a string
+        :return: a list of strings
+        :raise ValueError: if postings are not kept
+        """
+        if not self._keep_postings:
+            raise ValueError("The merchant index does not keep postings.")
+        with self._account_locks.lock_for(bank_account_number):
+            return [self._merchants.name(merchant_id) for merchant_id in self._postings.get(bank_account_number, {})]
+
+    def top_merchants(self, bank_account_number: str = None, budget_category: BudgetType = None, k: int = 10,
+                      by: str = "count") -> list:
+        """
+        Returns the estimated top merchants of an account or of the whole ledger.
+        :param bank_account_number: a string, or None for the whole ledger
+        :param budget_category: a BudgetType, or None for every category
+        :param k: an int
+        :param by: "count" for the number of transactions, or "amount" for the amount spent in dollars
+        :return: a list of (merchant, estimate, error) tuples, heaviest first; the true value lies
+                 between estimate - error and estimate
+        """
+        if by not in MerchantIndex.METRICS:
+            raise ValueError(f"Unknown ranking: {by}")
+        if bank_account_number is None:
+            lock, sketches = self._ledger_lock, self._ledger_sketches
+        else:
+            lock = self._account_locks.lock_for(bank_account_number)
+            sketches = self._account_sketches.get(bank_account_number, {})
+        with lock:
+            pair = sketches.get(budget_category)
+            top = [] if pair is None else pair[MerchantIndex.METRICS.index(by)].top(k)
+        if by == "count":
+            return [(self._merchants.name(merchant_id), estimate, error) for merchant_id, estimate, error in top]
+        return [(self._merchants.name(merchant_id), Money.to_dollars(estimate), Money.to_dollars(error))
+                for merchant_id, estimate, error in top]
@@ -0,0 +1,459 @@
+import functools
+import os
+import sys
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+
+class Histogram:
+    """
+    This class counts observed durations into fixed buckets, the way a Prometheus histogram does,
+    and keeps their count and sum.
+    """
+    # Upper bounds in seconds, from a microsecond to ten seconds.
+    BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2,
+               5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        """
+        Initialize an empty histogram.
+        :param buckets: a sorted tuple of bucket upper bounds
+        """
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """
+        Adds one observation.
+        :param value: a float
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, fraction: float) -> float or None:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in.
+        :param fraction: a float between 0 and 1
+        :return: a float, infinity if it falls past the last bucket, or None if nothing was observed
+        """
+        if self.count == 0:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Counter:
+    """
+    This class counts events.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        """
+        Adds to the count.
+        :param amount: an int
+        """
+        with self._lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    """
+    This class holds named histograms and counters, each told apart by a set of labels, and
+    writes them out in the Prometheus text format or as JSON.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name: str, labels: dict, help_text: str):
+        """
+        Returns a metric, creating it the first time it is asked for.
+        :param kind: Histogram or Counter
+        :param name: a string
+        :param labels: a dict of strings
+        :param help_text: a string
+        :return: a Histogram or Counter
+        """
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = kind()
+                    self._help.setdefault(name, help_text)
+        if not isinstance(metric, kind):
+            raise ValueError(f"Metric {name} is not a {kind.__name__}.")
+        return metric
+
+    def histogram(self, name: str, labels: dict = None, help_text: str = "") -> Histogram:
+        """
+        Returns a histogram.
+        :param name: a string
+        :param labels: a dict of strings, or None
+        :param help_text: a string describing the metric
+        :return: a Histogram
+        """
+        return self._get(Histogram, name, labels or {}, help_text)
+
+    def counter(self, name: str, labels: dict = None, help_text: str = "") -> Counter:
+        """
+        Returns a counter.
+        :param name: a string
+        :param labels: a dict of strings, or None
+        :param help_text: a string describing the metric
+        :return: a Counter
+        """
+        return self._get(Counter, name, labels or {}, help_text)
+
+    def reset(self) -> None:
+        """
+        Removes every metric.
+        """
+        with self._lock:
+            self._metrics.clear()
+            self._help.clear()
+
+    def _families(self) -> dict:
+        """
+        Groups the metrics by name.
+        :return: a dict mapping each name to a list of (labels, metric) pairs
+        """
+        families = {}
+        with self._lock:
+            for (name, labels), metric in sorted(self._metrics.items(), key=lambda item: item[0]):
+                families.setdefault(name, []).append((dict(labels), metric))
+        return families
+
+    def to_prometheus(self) -> str:
+        """
+        Writes every metric in the Prometheus text exposition format.
+        :return: a string
+        """
+        def label_text(labels: dict, **extra) -> str:
+            pairs = [f'{key}="{value}"' for key, value in {**labels, **extra}.items()]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+
+        lines = []
+        for name, metrics in self._families().items():
+            kind = "histogram" if isinstance(metrics[0][1], Histogram) else "counter"
+            lines.append(f"# HELP {name} {self._help.get(name, '')}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in metrics:
+                if kind == "counter":
+                    lines.append(f"{name}{label_text(labels)} {metric.value}")
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(metric.buckets, metric.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{label_text(labels, le=repr(bound))} {cumulative}")
+                lines.append(f"{name}_bucket{label_text(labels, le='+Inf')} {metric.count}")
+                lines.append(f"{name}_sum{label_text(labels)} {metric.sum!r}")
+                lines.append(f"{name}_count{label_text(labels)} {metric.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        """
+        Returns every metric as plain data, with a median and 99th percentile estimated for each
+        histogram.
+        :return: a dict mapping each metric name to a list of dicts
+        """
+        report = {}
+        for name, metrics in self._families().items():
+            entries = report[name] = []
+            for labels, metric in metrics:
+                if isinstance(metric, Counter):
+                    entries.append({"labels": labels, "value": metric.value})
+                else:
+                    entries.append({"labels": labels, "count": metric.count, "sum": metric.sum,
+                                    "p50": metric.quantile(0.5), "p99": metric.quantile(0.99),
+                                    "buckets": dict(zip([repr(bound) for bound in metric.buckets] + ["+Inf"],
+                                                        metric.bucket_counts))})
+        return report
+
+    def write(self, path: str) -> None:
+        """
+        Writes every metric to a file, as JSON when the path ends in .json and in the Prometheus
+        text format otherwise.
+        :param path: a string
+        """
+        with open(path, "w") as file:
+            if path.lower().endswith(".json"):
+                import json
+                json.dump(self.to_dict(), file, indent=2)
+            else:
+                file.write(self.to_prometheus())
+
+
+class _TimedLock:
+    """
+    This class wraps an account lock and records how long each acquire waited.
+    """
+
+    def __init__(self, lock, histogram: Histogram):
+        self._lock = lock
+        self._histogram = histogram
+
+    def __enter__(self):
+        start = perf_counter()
+        self._lock.acquire()
+        self._histogram.observe(perf_counter() - start)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._lock.release()
+
+
+class Instrumentation:
+    """
+    This class switches the hot-path instrumentation on and off. While enabled, the catalogue
+    operations, the lockout and warning rules of the User subclasses, and the statement and menu
+    rendering are wrapped to record their latency into the registry; lookups are counted as hits
+    or misses, recorded transactions by status, and account lock acquires by how long they waited.
+
+    The wrappers are installed on the classes when instrumentation is enabled and the original
+    methods are put back when it is disabled, so there is no overhead at all while it is off.
+    """
+    registry = MetricsRegistry()
+    _originals = []
+    _switch_lock = threading.Lock()
+
+    OPERATION_SECONDS = "fam_operation_seconds"
+    RULE_SECONDS = "fam_rule_evaluation_seconds"
+    RENDER_SECONDS = "fam_render_seconds"
+    LOCK_WAIT_SECONDS = "fam_account_lock_wait_seconds"
+    LOOKUPS = "fam_lookups_total"
+    TRANSACTIONS = "fam_transactions_total"
+
+    HELP = {
+        OPERATION_SECONDS: "Latency of catalogue operations in seconds.",
+        RULE_SECONDS: "Time spent evaluating lockout, warning and saving rules in seconds.",
+        RENDER_SECONDS: "Time spent printing and rendering in seconds.",
+        LOCK_WAIT_SECONDS: "Time spent waiting for an account lock in seconds.",
+        LOOKUPS: "Catalogue lookups by whether they found what they looked for.",
+        TRANSACTIONS: "Recorded transactions by status."
+    }
+
+    RULES = ("is_over_account_lockout_threshold", "is_over_lockout_threshold", "is_lockout_action_required",
+             "is_exceed_warning_threshold")
+
+    @staticmethod
+    def _probes() -> list:
+        """
+        Lists the methods to instrument. The classes are imported here rather than at the top, so
+        importing this module stays cheap and cannot form an import cycle.
+        :return: a list of (class, method name, metric name, outcome) tuples, where outcome is None
+                 or a (counter name, label name, function) tuple counting each result under the label
+                 the function gives it
+        """
+        from bank_account import Saving
+        from bank_account_catalogue import BankAccountCatalogue
+        from budget_catalogue import BudgetCatalogue
+        from fam import Fam
+        from statement_renderer import StatementRenderer
+        from transaction_catalogue import TransactionCatalogue
+        from user import Angel, Rebel, TroubleMaker
+
+        lookup = (Instrumentation.LOOKUPS, "result", lambda result: "miss" if result is None else "hit")
+        transaction_status = (Instrumentation.TRANSACTIONS, "status", lambda result: result.status.name)
+
+        probes = [
+            (BankAccountCatalogue, "get_user_bank_account", Instrumentation.OPERATION_SECONDS, lookup),
+            (BudgetCatalogue, "filter_budget_by_bank_account_and_category", Instrumentation.OPERATION_SECONDS,
+             lookup),
+            (BudgetCatalogue, "get_budgets_by_account_num", Instrumentation.OPERATION_SECONDS, None),
+            (TransactionCatalogue, "record_transaction", Instrumentation.OPERATION_SECONDS, transaction_status),
+            (TransactionCatalogue, "replay_transaction", Instrumentation.OPERATION_SECONDS, None),
+            (TransactionCatalogue, "get_user_transactions", Instrumentation.OPERATION_SECONDS, None),
+            (TransactionCatalogue, "get_user_transactions_by_category", Instrumentation.OPERATION_SECONDS, None),
+            (TransactionCatalogue, "count_user_transactions_between", Instrumentation.OPERATION_SECONDS, None),
+            (TransactionCatalogue, "spend_by_category_per_month", Instrumentation.OPERATION_SECONDS, None),
+            (TransactionCatalogue, "top_merchants", Instrumentation.OPERATION_SECONDS, None),
+            (Saving, "is_over_limit", Instrumentation.RULE_SECONDS, None),
+            (StatementRenderer, "write_page", Instrumentation.RENDER_SECONDS, None),
+            (TransactionCatalogue, "_print_warnings", Instrumentation.RENDER_SECONDS, None),
+            (Fam, "_view_budget_option", Instrumentation.RENDER_SECONDS, None),
+        ]
+        for user_class in (Angel, Rebel, TroubleMaker):
+            probes.extend((user_class, rule, Instrumentation.RULE_SECONDS, None) for rule in Instrumentation.RULES)
+        return probes
+
+    @staticmethod
+    def _timed(function, histogram: Histogram, outcome, operation: str):
+        """
+        Wraps a function to record its latency, and to count its results when an outcome is given.
+        :param function: a function
+        :param histogram: a Histogram
+        :param outcome: a (counter name, label name, function) tuple, or None
+        :param operation: a string, the operation label of the counter
+        :return: a function
+        """
+        if outcome is None:
+            @functools.wraps(function)
+            def timed(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    histogram.observe(perf_counter() - start)
+            return timed
+
+        counter_name, label, classify = outcome
+        counters = {}
+
+        @functools.wraps(function)
+        def timed_and_counted(*args, **kwargs):
+            start = perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                histogram.observe(perf_counter() - start)
+            value = classify(result)
+            counter = counters.get(value)
+            if counter is None:
+                counter = counters[value] = Instrumentation.registry.counter(
+                    counter_name, {"operation": operation, label: value}, Instrumentation.HELP[counter_name])
+            counter.inc()
+            return result
+        return timed_and_counted
+
+    @classmethod
+    def _instrument(cls, owner, attribute: str, metric: str, outcome) -> None:
+        """
+        Replaces a method of a class with a timed wrapper, keeping the original to restore.
+        :param owner: a class
+        :param attribute: a string
+        :param metric: a string, the name of the histogram
+        :param outcome: a callable or None
+        """
+        original = owner.__dict__[attribute]
+        operation = f"{owner.__name__}.{attribute}"
+        histogram = cls.registry.histogram(metric, {"operation": operation}, cls.HELP[metric])
+        if isinstance(original, (classmethod, staticmethod)):
+            replacement = type(original)(cls._timed(original.__func__, histogram, outcome, operation))
+        else:
+            replacement = cls._timed(original, histogram, outcome, operation)
+        setattr(owner, attribute, replacement)
+        cls._originals.append((owner, attribute, original))
+
+    @classmethod
+    def enable(cls) -> None:
+        """
+        Starts recording metrics. Enabling twice has no further effect.
+        """
+        with cls._switch_lock:
+            if cls._originals:
+                return
+            for owner, attribute, metric, outcome in cls._probes():
+                cls._instrument(owner, attribute, metric, outcome)
+
+            from transaction_catalogue import TransactionCatalogue
+            original = TransactionCatalogue.__dict__["account_lock"]
+            wait = cls.registry.histogram(cls.LOCK_WAIT_SECONDS, help_text=cls.HELP[cls.LOCK_WAIT_SECONDS])
+
+            def account_lock(self, bank_account_number: str):
+                return _TimedLock(original(self, bank_account_number), wait)
+
+            TransactionCatalogue.account_lock = functools.wraps(original)(account_lock)
+            cls._originals.append((TransactionCatalogue, "account_lock", original))
+
+    @classmethod
+    def disable(cls) -> None:
+        """
+        Stops recording metrics and puts the original methods back. What was recorded is kept.
+        """
+        with cls._switch_lock:
+            while cls._originals:
+                owner, attribute, original = cls._originals.pop()
+                setattr(owner, attribute, original)
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        """
+        Returns whether metrics are being recorded.
+        :return: a boolean
+        """
+        return bool(cls._originals)
+
+
+class SessionCapture:
+    """
+    This class captures a profile, the memory allocations and the metrics of one Fam session. It
+    is a context manager; each capture is only taken when its output path is set, and
+    from_environment reads the paths from FAM_PROFILE, FAM_TRACEMALLOC and FAM_METRICS.
+    """
+    MEMORY_TOP = 25
+
+    def __init__(self, profile_path: str = None, memory_path: str = None, metrics_path: str = None):
+        """
+        Initialize a capture.
+        :param profile_path: a string, where to write cProfile stats, or None
+        :param memory_path: a string, where to write the top allocation sites, or None
+        :param metrics_path: a string, where to write the metrics, or None
+        """
+        self._profile_path = profile_path
+        self._memory_path = memory_path
+        self._metrics_path = metrics_path
+        self._profile = None
+        self._enabled_metrics = False
+
+    @staticmethod
+    def from_environment():
+        """
+        Creates a capture from the FAM_PROFILE, FAM_TRACEMALLOC and FAM_METRICS variables.
+        :return: a SessionCapture
+        """
+        return SessionCapture(os.environ.get("FAM_PROFILE"), os.environ.get("FAM_TRACEMALLOC"),
+                              os.environ.get("FAM_METRICS"))
+
+    def __enter__(self):
+        if self._metrics_path and not Instrumentation.is_enabled():
+            Instrumentation.enable()
+            self._enabled_metrics = True
+        if self._memory_path:
+            import tracemalloc
+            tracemalloc.start()
+        if self._profile_path:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self._profile_path)
+            self._profile = None
+        if self._memory_path:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            with open(self._memory_path, "w") as file:
+                for statistic in snapshot.statistics("lineno")[:SessionCapture.MEMORY_TOP]:
+                    file.write(f"{statistic}\n")
+        if self._metrics_path:
+            Instrumentation.registry.write(self._metrics_path)
+            if self._enabled_metrics:
+                Instrumentation.disable()
+                self._enabled_metrics = False
+        for path in (self._profile_path, self._memory_path, self._metrics_path):
+            if path:
+                print(f"Wrote {path}", file=sys.stderr)
@@ -0,0 +1,121 @@
+import math
+import sys
+import threading
+from array import array
+
+
+class Money:
+    """
+    This class converts between dollar amounts and the whole cents money is kept in. Cents are
+    exact integers, so budget and balance comparisons never pick up rounding error.
+    """
+    CENTS_PER_DOLLAR = 100
+    MAX_CENTS = 2 ** 63 - 1
+
+    @staticmethod
+    def to_cents(amount) -> int:
+        """
+        Converts a dollar amount to whole cents, rounding to the nearest cent.
+        :param amount: an int, a float or a numeric string
+        :return: an int
+        :raise ValueError: if the amount is not a finite number or does not fit in int64 cents
+        """
+        if isinstance(amount, int):
+            cents = amount * Money.CENTS_PER_DOLLAR
+        else:
+            dollars = float(amount)
+            if not math.isfinite(dollars):
+                raise ValueError(f"Amount must be a finite number, not {amount!r}.")
+            cents = round(dollars * Money.CENTS_PER_DOLLAR)
+        if not -Money.MAX_CENTS <= cents <= Money.MAX_CENTS:
+            raise ValueError(f"Amount {amount!r} is too large.")
+        return cents
+
+    @staticmethod
+    def to_dollars(cents: int) -> float:
+        """
+        Converts whole cents to dollars.
+        :param cents: an int
+        :return: a float
+        """
+        return cents / Money.CENTS_PER_DOLLAR
+
+
+class CentsTable:
+    """
+    This class keeps amounts of money as int64 cents in typed arrays, one array per column, with
+    one slot per object. Objects hold only their slot and read and write their amounts through
+    it, so the amounts are stored unboxed and a whole column can be swept at once.
+
+    Slots are handed back when their object is released and reused by the next allocation.
+    """
+
+    def __init__(self, *columns: str):
+        """
+        Initialize an empty table.
+        :param columns: the names of the columns
+        """
+        self._columns = {name: array("q") for name in columns}
+        self._free = []
+        self._lock = threading.Lock()
+
+    def column(self, name: str) -> array:
+        """
+        Returns a column. The array grows in place, so it can be held on to and indexed by slot.
+        :param name: a string
+        :return: an array of int64 cents
+        """
+        return self._columns[name]
+
+    def allocate(self, **values) -> int:
+        """
+        Reserves a slot and sets its amounts; columns not given start at zero.
+        :param values: cents by column name
+        :return: an int, the slot
+        """
+        with self._lock:
+            if self._free:
+                slot = self._free.pop()
+                for name, column in self._columns.items():
+                    column[slot] = values.get(name, 0)
+            else:
+                slot = len(next(iter(self._columns.values())))
+                for name, column in self._columns.items():
+                    column.append(values.get(name, 0))
+        return slot
+
+    def release(self, slot: int) -> None:
+        """
+        Hands a slot back for reuse.
+        :param slot: an int
+        """
+        with self._lock:
+            for column in self._columns.values():
+                column[slot] = 0
+            self._free.append(slot)
+
+    def __len__(self):
+        """
+        Returns the number of slots in use.
+        """
+        return len(next(iter(self._columns.values()))) - len(self._free)
+
+    def nbytes(self) -> int:
+        """
+        Returns the bytes held by the columns, spare capacity included.
+        :return: an int
+        """
+        return sum(sys.getsizeof(column) for column in self._columns.values())
+
+    def to_numpy(self, name: str, slots=None):
+        """
+        Copies a column, or the given slots of it, into a NumPy array for vectorized sweeps.
+        NumPy is only imported when this is called.
+        :param name: a string
+        :param slots: a sequence of ints, or None for every slot including released ones
+        :return: an int64 ndarray of cents
+        """
+        import numpy as np
+        with self._lock:
+            values = np.frombuffer(self._columns[name], dtype=np.int64)
+            return values.copy() if slots is None else values[np.asarray(slots, dtype=np.intp)]
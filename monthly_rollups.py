@@ -0,0 +1,228 @@
+import threading
+import time
+from budget_types import BudgetType
+from money import Money
+
+
+class MonthlyRollup:
+    """
+    This class holds the running totals of one account's spending in one budget category over
+    one calendar month. Amounts are kept in whole cents, so totals never pick up rounding error.
+    """
+    __slots__ = ("total_cents", "count", "smallest_cents", "largest_cents")
+
+    def __init__(self, total_cents: int = 0, count: int = 0, smallest_cents: int = None, largest_cents: int = None):
+        self.total_cents = total_cents
+        self.count = count
+        self.smallest_cents = smallest_cents
+        self.largest_cents = largest_cents
+
+    @property
+    def total(self) -> float:
+        """
+        Returns the total in dollars.
+        :return: a float
+        """
+        return Money.to_dollars(self.total_cents)
+
+    @property
+    def smallest(self) -> float or None:
+        """
+        Returns the smallest amount in dollars, or None without transactions.
+        :return: a float or None
+        """
+        return None if self.smallest_cents is None else Money.to_dollars(self.smallest_cents)
+
+    @property
+    def largest(self) -> float or None:
+        """
+        Returns the largest amount in dollars, or None without transactions.
+        :return: a float or None
+        """
+        return None if self.largest_cents is None else Money.to_dollars(self.largest_cents)
+
+    def add(self, amount_cents: int) -> None:
+        """
+        Adds a transaction amount to the totals.
+        :param amount_cents: an int
+        """
+        self.total_cents += amount_cents
+        self.count += 1
+        if self.smallest_cents is None or amount_cents < self.smallest_cents:
+            self.smallest_cents = amount_cents
+        if self.largest_cents is None or amount_cents > self.largest_cents:
+            self.largest_cents = amount_cents
+
+    def merge(self, other) -> None:
+        """
+        Adds the totals of another rollup to this one.
+        :param other: a MonthlyRollup
+        """
+        if other.count == 0:
+            return
+        self.total_cents += other.total_cents
+        self.count += other.count
+        self.smallest_cents = other.smallest_cents if self.smallest_cents is None else \
+            min(self.smallest_cents, other.smallest_cents)
+        self.largest_cents = other.largest_cents if self.largest_cents is None else \
+            max(self.largest_cents, other.largest_cents)
+
+    def __str__(self):
+        if self.count == 0:
+            return "No transactions"
+        return (f"Spent: ${self.total:.2f} over {self.count} transaction(s), "
+                f"smallest ${self.smallest:.2f}, largest ${self.largest:.2f}")
+
+
+class MonthlyRollups:
+    """
+    This class keeps a MonthlyRollup for every (bank account, BudgetType, "YYYY-MM") seen in the
+    ledger, indexed by account and then by month, so month and year summaries never touch the
+    raw transactions. Months are calendar months in local time, as in every other monthly
+    report of the ledger.
+
+    Rollups are updated in O(1) as transactions are recorded. A snapshot stores them and loads
+    them back; when transactions reach the ledger some other way, such as from a storage backend,
+    the rollups are marked stale and rebuilt on the next query.
+    """
+
+    def __init__(self):
+        self._rollups = {}
+        self._lock = threading.RLock()
+        self._stale = False
+
+    @staticmethod
+    def month_of(timestamp: int) -> str:
+        """
+        Returns the calendar month (local time) of a timestamp.
+        :param timestamp: seconds since the epoch
+        :return: a string in the form "YYYY-MM"
+        """
+        moment = time.localtime(timestamp)
+        return f"{moment.tm_year:04d}-{moment.tm_mon:02d}"
+
+    def add(self, transaction) -> None:
+        """
+        Adds a transaction to the rollup of its account, category and month.
+        :param transaction: a Transaction
+        """
+        category = BudgetType(transaction.budget_category)
+        month = self.month_of(transaction.timestamp)
+        with self._lock:
+            if self._stale:
+                return
+            month_rollups = self._rollups.setdefault(transaction.bank_num, {}).setdefault(month, {})
+            rollup = month_rollups.get(category)
+            if rollup is None:
+                rollup = month_rollups[category] = MonthlyRollup()
+            rollup.add(transaction.amount_cents)
+
+    def mark_stale(self) -> None:
+        """
+        Marks the rollups as out of date with the ledger, so the next query rebuilds them.
+        """
+        with self._lock:
+            self._stale = True
+            self._rollups.clear()
+
+    def rebuild(self, transactions) -> None:
+        """
+        Replaces every rollup with totals computed from the given transactions.
+        :param transactions: an iterable of every Transaction in the ledger
+        """
+        with self._lock:
+            self._rollups.clear()
+            self._stale = False
+            for transaction in transactions:
+                self.add(transaction)
+
+    def load(self, rows) -> None:
+        """
+        Replaces every rollup with rollups computed elsewhere, such as by a snapshot or an SQL query.
+        :param rows: an iterable of (bank account number, BudgetType, "YYYY-MM", MonthlyRollup) tuples
+        """
+        with self._lock:
+            self._rollups.clear()
+            self._stale = False
+            for bank_account_number, category, month, rollup in rows:
+                self._rollups.setdefault(bank_account_number, {}).setdefault(month, {})[category] = rollup
+
+    def rows(self) -> list:
+        """
+        Returns every rollup, in the form load takes.
+        :return: a list of (bank account number, BudgetType, "YYYY-MM", MonthlyRollup) tuples
+        """
+        with self._lock:
+            return [(number, category, month, rollup)
+                    for number, months in self._rollups.items()
+                    for month, month_rollups in months.items()
+                    for category, rollup in month_rollups.items()]
+
+    def clear(self) -> None:
+        """
+        Removes every rollup.
+        """
+        with self._lock:
+            self._rollups.clear()
+            self._stale = False
+
+    @property
+    def is_stale(self) -> bool:
+        """
+        Returns whether the rollups need to be rebuilt before they are read.
+        :return: a boolean
+        """
+        return self._stale
+
+    def month_summary(self, bank_account_number: str, month: str) -> dict:
+        """
+        Returns the rollups of an account for one month.
+        :param bank_account_number: a string
+        :param month: a string in the form "YYYY-MM"
+        :return: a dict mapping BudgetType to MonthlyRollup, for the categories with spending
+        """
+        with self._lock:
+            return dict(self._rollups.get(bank_account_number, {}).get(month, {}))
+
+    def year_summary(self, bank_account_number: str, year: int) -> dict:
+        """
+        Returns the rollups of an account for one year, merged across its months.
+        :param bank_account_number: a string
+        :param year: an int
+        :return: a dict mapping BudgetType to MonthlyRollup, for the categories with spending
+        """
+        prefix = f"{year:04d}-"
+        summary = {}
+        with self._lock:
+            for month, month_rollups in self._rollups.get(bank_account_number, {}).items():
+                if month.startswith(prefix):
+                    for category, rollup in month_rollups.items():
+                        summary.setdefault(category, MonthlyRollup()).merge(rollup)
+        return summary
+
+    def account_rollups(self, bank_account_number: str) -> dict:
+        """
+        Returns every rollup of an account.
+        :param bank_account_number: a string
+        :return: a dict mapping (BudgetType, "YYYY-MM") to MonthlyRollup
+        """
+        with self._lock:
+            return {(category, month): rollup
+                    for month, month_rollups in self._rollups.get(bank_account_number, {}).items()
+                    for category, rollup in month_rollups.items()}
+
+    def spend_by_category_per_month(self, bank_account_numbers=None) -> dict:
+        """
+        Totals the amount spent per month and budget category across accounts.
+        :param bank_account_numbers: an iterable of strings, or None for every account
+        :return: a dict mapping ("YYYY-MM", BudgetType) to the total amount
+        """
+        report = {}
+        with self._lock:
+            if bank_account_numbers is None:
+                bank_account_numbers = list(self._rollups)
+            for number in bank_account_numbers:
+                for month, month_rollups in self._rollups.get(number, {}).items():
+                    for category, rollup in month_rollups.items():
+                        report[(month, category)] = report.get((month, category), 0) + rollup.total_cents
+        return {key: Money.to_dollars(total_cents) for key, total_cents in report.items()}
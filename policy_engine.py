@@ -0,0 +1,218 @@
+import numpy as np
+from budget import Budget
+from budget_catalogue import BudgetCatalogue
+from register import Register
+from user_type import UserType
+
+
+class PolicyEvaluation:
+    """
+    This class holds the outcome of one batch evaluation. Budget arrays are in the order the
+    budgets were collected; account arrays are indexed by account id.
+    """
+
+    def __init__(self, warned, budget_locked, spending_blocked, account_locked):
+        """
+        Initialize the outcome of an evaluation.
+        :param warned: a bool array, budgets over their warning threshold
+        :param budget_locked: a bool array, budgets over their lockout threshold
+        :param spending_blocked: a bool array, locked budgets that refuse further transactions
+        :param account_locked: a bool array, accounts whose user type's account lockout rule is met
+        """
+        self.warned = warned
+        self.budget_locked = budget_locked
+        self.spending_blocked = spending_blocked
+        self.account_locked = account_locked
+
+
+class PolicyChanges:
+    """
+    This class lists the state changes found by re-evaluating the policies of every user, against
+    the previous evaluation by the same engine.
+    """
+
+    def __init__(self, accounts_to_lock: list, locked_budgets: list, warned_budgets: list,
+                 unlocked_budgets: list = None, unwarned_budgets: list = None):
+        """
+        Initialize the changes. Budgets are listed as (bank account number, BudgetType).
+        :param accounts_to_lock: a list of bank account numbers that are not locked yet but should be
+        :param locked_budgets: a list of budgets that went over the lockout threshold
+        :param warned_budgets: a list of budgets that went over the warning threshold
+        :param unlocked_budgets: a list of budgets that went back under the lockout threshold
+        :param unwarned_budgets: a list of budgets that went back under the warning threshold
+        """
+        self.accounts_to_lock = accounts_to_lock
+        self.locked_budgets = locked_budgets
+        self.warned_budgets = warned_budgets
+        self.unlocked_budgets = unlocked_budgets or []
+        self.unwarned_budgets = unwarned_budgets or []
+
+
+class PolicyEngine:
+    """
+    This class evaluates the warning, budget lockout and account lockout rules of every user in
+    one vectorized pass. The rules of each user type are the same as those of Angel, Rebel and
+    TroubleMaker, written as parameters of a few array expressions, so limits can be changed or a
+    period rolled over without calling the rule methods once per budget.
+
+    The engine keeps the owner, user type and slot of every budget it has seen in arrays. The
+    user list of a Fam only grows, so each evaluation gathers just the users added since the one
+    before, and the budgets' flags are kept to report what changed since then.
+    """
+    # Per user type: the fraction of the limit at which a budget locks (NaN never locks), whether
+    # a locked budget refuses transactions, and the number of locked budgets that lock the account
+    # (infinity never locks it).
+    user_type_rules = {
+        UserType.ANGEL: (np.nan, False, np.inf),
+        UserType.REBEL: (1.0, True, 2),
+        UserType.TROUBLEMAKER: (1.2, True, np.inf)
+    }
+
+    user_class_map = {user_class: user_type for user_type, (user_class, _) in Register.user_type_map.items()}
+
+    def __init__(self):
+        size = max(user_type.value for user_type in UserType) + 1
+        self._lockout_factors = np.full(size, np.nan)
+        self._lockout_action_required = np.zeros(size, dtype=bool)
+        self._account_lockout_counts = np.full(size, np.inf)
+        for user_type, (factor, action_required, account_count) in PolicyEngine.user_type_rules.items():
+            self._lockout_factors[user_type.value] = factor
+            self._lockout_action_required[user_type.value] = action_required
+            self._account_lockout_counts[user_type.value] = account_count
+        self._reset()
+
+    def _reset(self) -> None:
+        """
+        Forgets every gathered user and budget, and the flags of the previous evaluation.
+        """
+        self._user_list = None
+        self._num_users = 0
+        self._account_numbers, self._account_types = [], []
+        self._budgets, self._budget_account_ids = [], []
+        self._user_types, self._slots, self._warning_thresholds = [], [], []
+        self._batch = None
+        self._warned = np.zeros(0, dtype=bool)
+        self._budget_locked = np.zeros(0, dtype=bool)
+
+    def evaluate(self, user_types, limits, spent, warning_thresholds, account_ids, num_accounts: int = None,
+                 account_types=None):
+        """
+        Evaluates every rule for a batch of budgets. Budgets of the same account must share the
+        account id and user type.
+        :param user_types: an int array of UserType values, one per budget
+        :param limits: a float array of budget limits
+        :param spent: a float array of amounts spent, negative as kept by Budget
+        :param warning_thresholds: a float array of the owners' warning thresholds
+        :param account_ids: an int array mapping each budget to an account id
+        :param num_accounts: an int, the number of account ids, or None to infer it
+        :param account_types: an int array of UserType values, one per account id, or None to take
+                              them from the budgets, in which case accounts without budgets never lock
+        :return: a PolicyEvaluation
+        """
+        user_types = np.asarray(user_types, dtype=np.int64)
+        limits = np.asarray(limits, dtype=np.float64)
+        spent = np.asarray(spent, dtype=np.float64)
+        account_ids = np.asarray(account_ids, dtype=np.int64)
+        if num_accounts is None:
+            num_accounts = int(account_ids.max()) + 1 if len(account_ids) else 0
+
+        warned = np.asarray(warning_thresholds, dtype=np.float64) * limits + spent <= 0
+        # NaN factors compare False, so Angel budgets never lock.
+        budget_locked = self._lockout_factors[user_types] * limits + spent <= 0
+        spending_blocked = budget_locked & self._lockout_action_required[user_types]
+
+        locked_counts = np.bincount(account_ids, weights=budget_locked, minlength=num_accounts)
+        budget_counts = np.bincount(account_ids, minlength=num_accounts)
+        if account_types is None:
+            account_lockout_counts = np.full(num_accounts, np.inf)
+            account_lockout_counts[account_ids] = self._account_lockout_counts[user_types]
+        else:
+            account_lockout_counts = self._account_lockout_counts[np.asarray(account_types, dtype=np.int64)]
+        # As in Rebel, an account with no budgets has all of them locked.
+        account_locked = np.isfinite(account_lockout_counts) & \
+            ((locked_counts >= budget_counts) | (locked_counts >= account_lockout_counts))
+        return PolicyEvaluation(warned, budget_locked, spending_blocked, account_locked)
+
+    def _gather(self, fam) -> None:
+        """
+        Adds the users of a Fam registered since the last evaluation, and their budgets, to the
+        gathered arrays. A different or shorter user list is gathered again from the start.
+        :param fam: a Fam
+        """
+        user_list = fam.user_list
+        if user_list is not self._user_list or len(user_list) < self._num_users:
+            self._reset()
+            self._user_list = user_list
+        new_users = user_list[self._num_users:]
+        if not new_users:
+            return
+        for user in new_users:
+            account_id = len(self._account_numbers)
+            user_type = PolicyEngine.user_class_map[type(user)].value
+            self._account_numbers.append(user.bank_account_number)
+            self._account_types.append(user_type)
+            for budget in fam.budget_catalogue.get_budgets_by_account_num(user.bank_account_number):
+                self._budgets.append(budget)
+                self._budget_account_ids.append(account_id)
+                self._user_types.append(user_type)
+                self._slots.append(budget.slot)
+                self._warning_thresholds.append(user.warning_threshold)
+        self._num_users = len(user_list)
+        self._batch = (np.asarray(self._user_types, dtype=np.int64), np.asarray(self._slots, dtype=np.int64),
+                       np.asarray(self._warning_thresholds, dtype=np.float64),
+                       np.asarray(self._budget_account_ids, dtype=np.int64),
+                       np.asarray(self._account_types, dtype=np.int64))
+        # New budgets start out as neither warned nor locked, so they are reported if they are.
+        grown = len(self._budgets) - len(self._warned)
+        self._warned = np.concatenate((self._warned, np.zeros(grown, dtype=bool)))
+        self._budget_locked = np.concatenate((self._budget_locked, np.zeros(grown, dtype=bool)))
+
+    def find_changes(self, fam) -> PolicyChanges:
+        """
+        Re-evaluates the policies of every user of a Fam, and returns what changed since this
+        engine last evaluated them.
+        :param fam: a Fam
+        :return: a PolicyChanges
+        """
+        self._gather(fam)
+        if self._batch is None:
+            return PolicyChanges([], [], [])
+        user_types, slots, warning_thresholds, account_ids, account_types = self._batch
+
+        # The limits and amounts spent are gathered straight from the arrays of cents they live in.
+        amounts = Budget.get_amounts()
+        limits, spent = amounts.to_numpy("limit", slots), amounts.to_numpy("spent", slots)
+        evaluation = self.evaluate(user_types, limits, spent, warning_thresholds, account_ids,
+                                   len(self._account_numbers), account_types)
+
+        def categories(flags):
+            return [(self._budgets[index].bank_account_number,
+                     BudgetCatalogue.budget_category_map[type(self._budgets[index])])
+                    for index in np.flatnonzero(flags)]
+
+        accounts_to_lock = []
+        for account_id in np.flatnonzero(evaluation.account_locked):
+            bank_account = fam.bank_account_catalogue.get_user_bank_account(self._account_numbers[account_id])
+            if bank_account is not None and not bank_account.is_locked:
+                accounts_to_lock.append(bank_account.bank_account_number)
+        changes = PolicyChanges(accounts_to_lock,
+                                categories(evaluation.budget_locked & ~self._budget_locked),
+                                categories(evaluation.warned & ~self._warned),
+                                categories(self._budget_locked & ~evaluation.budget_locked),
+                                categories(self._warned & ~evaluation.warned))
+        self._warned, self._budget_locked = evaluation.warned, evaluation.budget_locked
+        return changes
+
+    @staticmethod
+    def apply_changes(fam, changes: PolicyChanges) -> None:
+        """
+        Locks the accounts a re-evaluation found over their account lockout rule. Locks are not
+        written to the write-ahead log, so after a recovery the evaluation should be run again.
+        :param fam: a Fam
+        :param changes: a PolicyChanges
+        """
+        for bank_account_number in changes.accounts_to_lock:
+            with fam.transaction_catalogue.account_lock(bank_account_number):
+                bank_account = fam.bank_account_catalogue.get_user_bank_account(bank_account_number)
+                bank_account.lock_account()
+                fam.bank_account_catalogue.save_bank_account(bank_account)
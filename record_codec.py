@@ -0,0 +1,127 @@
+from datetime import datetime
+from bank_account import BankAccount, Chequing, Saving
+from budget import Budget
+from budget_catalogue import BudgetCatalogue
+from transaction import Transaction
+from user import User, Rebel, Angel, TroubleMaker
+
+
+class RecordCodec:
+    """
+    This class converts the domain objects held by the catalogues to plain dicts of strings and
+    numbers and back, so they can be written to logs, snapshots and other storage.
+    """
+    bank_account_types = {
+        "Chequing": Chequing,
+        "Saving": Saving
+    }
+
+    user_types = {
+        "Rebel": Rebel,
+        "Angel": Angel,
+        "TroubleMaker": TroubleMaker
+    }
+
+    @staticmethod
+    def encode_bank_account(bank_account: BankAccount) -> dict:
+        """
+        Returns the record of a bank account.
+        :param bank_account: a BankAccount
+        :return: a dict
+        """
+        return {
+            "type": type(bank_account).__name__,
+            "bank_acc_num": bank_account.bank_account_number,
+            "bank_name": bank_account.bank_name,
+            "bank_bal": bank_account.bank_bal,
+            "is_locked": bank_account.is_locked
+        }
+
+    @staticmethod
+    def decode_bank_account(record: dict) -> BankAccount:
+        """
+        Builds a bank account from its record.
+        :param record: a dict
+        :return: a BankAccount
+        """
+        bank_account = RecordCodec.bank_account_types[record["type"]](
+            record["bank_acc_num"], record["bank_name"], record["bank_bal"])
+        bank_account.is_locked = bool(record.get("is_locked", False))
+        return bank_account
+
+    @staticmethod
+    def encode_budget(budget: Budget) -> dict:
+        """
+        Returns the record of a budget.
+        :param budget: a Budget
+        :return: a dict
+        """
+        return {
+            "budget_category": BudgetCatalogue.budget_category_map[type(budget)].value,
+            "bank_account_number": budget.bank_account_number,
+            "limit": budget.limit,
+            "spent": budget.spent
+        }
+
+    @staticmethod
+    def decode_budget(record: dict) -> Budget:
+        """
+        Builds a budget from its record.
+        :param record: a dict
+        :return: a Budget
+        """
+        budget = BudgetCatalogue.budget_type_map[record["budget_category"]](
+            record["limit"], record["bank_account_number"])
+        budget.add_spent(-record.get("spent", 0))
+        return budget
+
+    @staticmethod
+    def encode_transaction(transaction: Transaction) -> dict:
+        """
+        Returns the record of a transaction.
+        :param transaction: a Transaction
+        :return: a dict
+        """
+        return {
+            "timestamp": transaction.timestamp,
+            "amount": transaction.amount,
+            "budget_category": transaction.budget_category,
+            "merchant": transaction.merchant,
+            "bank_num": transaction.bank_num
+        }
+
+    @staticmethod
+    def decode_transaction(record: dict) -> Transaction:
+        """
+        Builds a transaction from its record.
+        :param record: a dict
+        :return: a Transaction
+        """
+        return Transaction(record["timestamp"], record["amount"], record["budget_category"],
+                           record["merchant"], record["bank_num"])
+
+    @staticmethod
+    def encode_user(user: User) -> dict:
+        """
+        Returns the record of a user.
+        :param user: a User
+        :return: a dict
+        """
+        return {
+            "type": type(user).__name__,
+            "name": user.name,
+            "dob": user.dob.isoformat(),
+            "bank_account_number": user.bank_account_number,
+            "warning_threshold": user.warning_threshold
+        }
+
+    @staticmethod
+    def decode_user(record: dict) -> User:
+        """
+        Builds a user from its record.
+        :param record: a dict
+        :return: a User
+        """
+        return RecordCodec.user_types[record["type"]](
+            record["name"], datetime.fromisoformat(record["dob"]), record["bank_account_number"],
+            record["warning_threshold"])
@@ -11,6 +11,24 @@ class Register:
     """
     This class is responsible for guiding a user through the registration process.
     """
+    user_type_map = {
+        UserType.REBEL: (Rebel, 0.5),
+        UserType.ANGEL: (Angel, 0.9),
+        UserType.TROUBLEMAKER: (TroubleMaker, 0.75)
+    }
+
+    bank_account_type_map = {
+        BankAccountType.CHEQUING: Chequing,
+        BankAccountType.SAVING: Saving
+    }
+
+    budget_class_map = {
+        BudgetType.GAMES_ENTERTAINMENT: GamesEntertainment,
+        BudgetType.CLOTHING_ACCESSORIES: ClothingAccessories,
+        BudgetType.EATING_OUT: EatingOut,
+        BudgetType.MISCELLANEOUS: Miscellaneous
+    }
+
     @staticmethod
     def register_user(bank_account_catalogue, budget_catalogue):
         """
@@ -59,13 +77,8 @@ class Register:
                 user_type_accepted = True
 
         # Return User according to the given user type
-        user_type_map = {
-            1: Rebel(name, dob, bank_account_number, 0.5),
-            2: Angel(name, dob, bank_account_number, 0.9),
-            3: TroubleMaker(name, dob, bank_account_number, 0.75)
-        }
-        user_register_operation = user_type_map[user_type]
-        return user_register_operation
+        user_class, warning_threshold = Register.user_type_map[UserType(user_type)]
+        return user_class(name, dob, bank_account_number, warning_threshold)
 
     @staticmethod
     def set_user_bank_account(bank_account_catalogue):
@@ -79,11 +92,7 @@ class Register:
             "bank_bal": float(input("Enter bank balance: $"))
         }
         # Create a bank account under in the bank_account_catalogue
-        bank_account_type_map = {
-            1: Chequing(**bank_attributes),
-            2: Saving(**bank_attributes)
-        }
-        bank_account_operation = bank_account_type_map[bank_account_type]
+        bank_account_operation = Register.bank_account_type_map[BankAccountType(bank_account_type)](**bank_attributes)
         bank_account_catalogue.add_bank_account(bank_account_operation)
         return bank_attributes["bank_acc_num"]
 
@@ -106,6 +115,45 @@ class Register:
                 miscellaneous = Miscellaneous(limit, user_bank_account)
                 budget_catalogue.add_budget(miscellaneous)
 
+    @staticmethod
+    def create_user(bank_account_catalogue, budget_catalogue, name: str, dob: datetime.datetime,
+                    user_type: UserType, bank_account_type: BankAccountType, bank_acc_num: str, bank_name: str,
+                    bank_bal: float, budget_limits: dict) -> User:
+        """
+        Registers a user without any prompts. Every input is checked before anything is added to
+        the catalogues.
+        :param bank_account_catalogue: a BankAccountCatalogue
+        :param budget_catalogue: a BudgetCatalogue
+        :param name: a string
+        :param dob: a datetime
+        :param user_type: a UserType
+        :param bank_account_type: a BankAccountType
+        :param bank_acc_num: a string
+        :param bank_name: a string
+        :param bank_bal: a float
+        :param budget_limits: a dict mapping every BudgetType to its limit
+        :return: a User
+        :raise ValueError: if the user is too young to be an Angel, a budget limit is missing or
+                           the bank account number is already registered
+        """
+        user_type = UserType(user_type)
+        if user_type == UserType.ANGEL and not Register.eligible_for_angel(dob):
+            raise ValueError("You are too young to be an Angel.")
+        limits = {BudgetType(budget_type): float(limit) for budget_type, limit in budget_limits.items()}
+        missing = [budget_type.name for budget_type in BudgetType if budget_type not in limits]
+        if missing:
+            raise ValueError(f"Missing budget limits for {', '.join(missing)}.")
+
+        bank_account = Register.bank_account_type_map[BankAccountType(bank_account_type)](
+            bank_acc_num, bank_name, float(bank_bal))
+        bank_account_catalogue.add_bank_account(bank_account)
+
+        for budget_type in BudgetType:
+            budget_catalogue.add_budget(Register.budget_class_map[budget_type](limits[budget_type], bank_acc_num))
+
+        user_class, warning_threshold = Register.user_type_map[user_type]
+        return user_class(name, dob, bank_acc_num, warning_threshold)
+
     @staticmethod
     def eligible_for_angel(dob: datetime) -> bool:
         """
@@ -0,0 +1,280 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import zlib
+from concurrent.futures import Future
+from budget_types import BudgetType
+from money import Money
+
+
+def _dispatch(commands, request) -> dict:
+    """
+    Runs one request in a shard. Any error is answered rather than raised, so one bad request
+    cannot take down the shard and every other request routed to it.
+    :param commands: a FamCommands
+    :param request: a dict
+    :return: a response dict
+    """
+    try:
+        return commands.dispatch(request)
+    except Exception as error:
+        response = {"id": request["id"]} if isinstance(request, dict) and "id" in request else {}
+        response.update(ok=False, error=f"{type(error).__name__}: {error}")
+        return response
+
+
+def _run_shard(connection, write_ahead_log_path: str = None, snapshot_path: str = None) -> None:
+    """
+    Serves one shard until the router sends None. The shard owns a Fam with its own catalogues;
+    since the catalogues keep their state on the class, each shard must live in its own process.
+    :param connection: the worker end of a Pipe
+    :param write_ahead_log_path: a string, or None to keep the shard in memory only
+    :param snapshot_path: a string, or None
+    """
+    from bank_account_catalogue import BankAccountCatalogue
+    from budget_catalogue import BudgetCatalogue
+    from fam import Fam
+    from fam_commands import FamCommands
+    from transaction_catalogue import TransactionCatalogue
+    from write_ahead_log import WriteAheadLog
+
+    write_ahead_log = WriteAheadLog(write_ahead_log_path) if write_ahead_log_path is not None else None
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue(), write_ahead_log, snapshot_path)
+    # The log is synced once per batch, before any of its responses are sent.
+    commands = FamCommands(fam, wait_durable=False)
+    try:
+        while (message := connection.recv()) is not None:
+            batch_id, requests = message
+            responses = [_dispatch(commands, request) for request in requests]
+            fam.wait_durable()
+            connection.send((batch_id, responses))
+    finally:
+        if write_ahead_log is not None:
+            write_ahead_log.close()
+        connection.close()
+
+
+class ShardedLedger:
+    """
+    This class hash-partitions bank accounts across a pool of worker processes. Every shard owns
+    its own catalogues and answers the same requests as a FamService, through FamCommands, so
+    throughput grows with the number of cores instead of being bound to one interpreter.
+
+    Requests naming a bank_account_number are routed to the shard that owns the account. Requests
+    spanning every account, such as listing users or the monthly spend report, are scattered to
+    all shards and their results gathered into one.
+
+    If a shard process exits, every request waiting on it and every later request routed to it
+    fails with a ConnectionError instead of waiting forever.
+    """
+    SCATTER_ACTIONS = {"list_users", "spend_by_category_per_month", "metrics"}
+
+    def __init__(self, num_shards: int = None, data_directory: str = None):
+        """
+        Starts the shard processes.
+        :param num_shards: an int, defaults to the number of CPUs
+        :param data_directory: a string, the directory for each shard's write-ahead log and
+                               snapshot, or None to keep every shard in memory only
+        """
+        self._num_shards = num_shards or os.cpu_count() or 1
+        self._batch_ids = itertools.count()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._lost_shards = set()
+        self._connections = []
+        self._send_locks = []
+        self._processes = []
+        self._readers = []
+        if data_directory is not None:
+            os.makedirs(data_directory, exist_ok=True)
+
+        # Every process is started before any reader thread, so no shard forks a threaded parent.
+        for shard in range(self._num_shards):
+            paths = (None, None) if data_directory is None else \
+                (os.path.join(data_directory, f"shard-{shard}.wal"), os.path.join(data_directory, f"shard-{shard}.snapshot"))
+            router_end, worker_end = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_run_shard, args=(worker_end, *paths), daemon=True)
+            process.start()
+            worker_end.close()
+            self._connections.append(router_end)
+            self._send_locks.append(threading.Lock())
+            self._processes.append(process)
+        for shard, connection in enumerate(self._connections):
+            reader = threading.Thread(target=self._read_responses, args=(shard, connection), daemon=True)
+            reader.start()
+            self._readers.append(reader)
+
+    @property
+    def num_shards(self) -> int:
+        """
+        Returns the number of shards.
+        :return: an int
+        """
+        return self._num_shards
+
+    def shard_for(self, bank_account_number: str) -> int:
+        """
+        Returns the shard that owns a bank account. A CRC is used rather than hash() so the mapping
+        is the same in every process and across restarts.
+        :param bank_account_number: a string
+        :return: an int
+        """
+        return zlib.crc32(str(bank_account_number).encode()) % self._num_shards
+
+    def _read_responses(self, shard: int, connection) -> None:
+        """
+        Resolves the futures of the batches a shard answers, until the shard goes away. The
+        batches still waiting on it then fail, and later sends to it are refused.
+        :param shard: an int
+        :param connection: the router end of a Pipe
+        """
+        while True:
+            try:
+                batch_id, responses = connection.recv()
+            except (EOFError, OSError):
+                break
+            with self._pending_lock:
+                _, future = self._pending.pop(batch_id)
+            future.set_result(responses)
+
+        with self._pending_lock:
+            self._lost_shards.add(shard)
+            lost = [batch_id for batch_id, (owner, _) in self._pending.items() if owner == shard]
+            futures = [self._pending.pop(batch_id)[1] for batch_id in lost]
+        for future in futures:
+            future.set_exception(ConnectionError(f"Shard {shard} exited."))
+
+    def _send_batch(self, shard: int, requests: list) -> Future:
+        """
+        Sends a batch of requests to one shard.
+        :param shard: an int
+        :param requests: a list of dicts
+        :return: a Future resolving to the list of responses
+        """
+        future = Future()
+        batch_id = next(self._batch_ids)
+        with self._pending_lock:
+            if shard in self._lost_shards:
+                future.set_exception(ConnectionError(f"Shard {shard} exited."))
+                return future
+            self._pending[batch_id] = (shard, future)
+        try:
+            with self._send_locks[shard]:
+                self._connections[shard].send((batch_id, requests))
+        except OSError as error:
+            with self._pending_lock:
+                pending = self._pending.pop(batch_id, None)
+            if pending is not None:
+                future.set_exception(ConnectionError(f"Shard {shard} exited: {error}"))
+        return future
+
+    def submit(self, request: dict) -> Future:
+        """
+        Routes a request to the shard owning its bank account without waiting for the answer.
+        :param request: a dict naming a bank_account_number
+        :return: a Future resolving to the response
+        """
+        if "bank_account_number" not in request:
+            raise ValueError(f"Request has no bank_account_number to route on: {request.get('action')}")
+        future = Future()
+
+        def resolve(done):
+            if done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                future.set_result(done.result()[0])
+
+        self._send_batch(self.shard_for(request["bank_account_number"]), [request]).add_done_callback(resolve)
+        return future
+
+    def request(self, request: dict) -> dict:
+        """
+        Runs one request, routed to its shard or scattered to every shard.
+        :param request: a dict
+        :return: a response dict, as returned by FamCommands.dispatch
+        """
+        if request.get("action") in ShardedLedger.SCATTER_ACTIONS:
+            return self._gather(request, self.scatter(request))
+        return self.submit(request).result()
+
+    def request_many(self, requests: list) -> list:
+        """
+        Runs many account requests, sending each shard its share as one batch so the cost of
+        crossing processes is paid once per shard. Requests for the same account keep their order.
+        :param requests: a list of dicts naming a bank_account_number
+        :return: the responses, in the order of the requests
+        """
+        batches = {}
+        for position, request in enumerate(requests):
+            batches.setdefault(self.shard_for(request["bank_account_number"]), []).append((position, request))
+        futures = {shard: self._send_batch(shard, [request for _, request in batch])
+                   for shard, batch in batches.items()}
+        responses = [None] * len(requests)
+        for shard, batch in batches.items():
+            for (position, _), response in zip(batch, futures[shard].result()):
+                responses[position] = response
+        return responses
+
+    def scatter(self, request: dict) -> list:
+        """
+        Sends a request to every shard.
+        :param request: a dict
+        :return: a list of responses, one per shard
+        """
+        futures = [self._send_batch(shard, [request]) for shard in range(self._num_shards)]
+        return [future.result()[0] for future in futures]
+
+    @staticmethod
+    def _gather(request: dict, responses: list) -> dict:
+        """
+        Merges the responses of every shard to a scattered request.
+        :param request: a dict
+        :param responses: a list of response dicts
+        :return: a response dict
+        """
+        merged = {"id": request["id"]} if "id" in request else {}
+        failed = [response for response in responses if not response["ok"]]
+        if failed:
+            merged.update(ok=False, error=failed[0]["error"])
+            return merged
+
+        if request["action"] == "spend_by_category_per_month":
+            totals = {}
+            for response in responses:
+                for row in response["result"]:
+                    key = (row["month"], row["budget_category"])
+                    totals[key] = totals.get(key, 0) + Money.to_cents(row["total"])
+            result = [{"month": month, "budget_category": category, "total": Money.to_dollars(total)}
+                      for (month, category), total in sorted(totals.items(),
+                                                          key=lambda item: (item[0][0], BudgetType[item[0][1]].value))]
+        elif request["action"] == "metrics":
+            # Every shard is its own process with its own registry, so each is reported on its own.
+            result = [{"shard": shard, **response["result"]} for shard, response in enumerate(responses)]
+        else:
+            result = [item for response in responses for item in response["result"]]
+        merged.update(ok=True, result=result)
+        return merged
+
+    def close(self) -> None:
+        """
+        Stops every shard and waits for it to exit.
+        """
+        for lock, connection in zip(self._send_locks, self._connections):
+            with lock:
+                try:
+                    connection.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+        for process in self._processes:
+            process.join()
+        for connection in self._connections:
+            connection.close()
+        for reader in self._readers:
+            reader.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
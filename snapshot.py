@@ -0,0 +1,333 @@
+import heapq
+from bisect import bisect_left
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+from bank_account import Saving, Chequing
+from bank_account_type import BankAccountType
+from budget_catalogue import BudgetCatalogue
+from budget_types import BudgetType
+from monthly_rollups import MonthlyRollup
+from transaction import Transaction
+from user import Rebel, Angel, TroubleMaker
+from user_type import UserType
+
+
+class SnapshotTransactionSection:
+    """
+    This class gives lazy access to the transaction section of a memory-mapped snapshot. Rows are
+    grouped by bank account and are only decoded into Transactions when they are read. Range
+    queries bisect an account's rows in place, reading only their timestamps.
+    """
+    RECORD = struct.Struct("<qdBII")
+
+    def __init__(self, buffer, offset: int, count: int, strings, account_ranges: dict):
+        """
+        Initialize the section.
+        :param buffer: the mmap of the snapshot file
+        :param offset: an int, where the first transaction record starts
+        :param count: an int, the number of transaction records
+        :param strings: a callable returning the string with a given id
+        :param account_ranges: a dict mapping bank account numbers to (first row, row count)
+        """
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+        self._strings = strings
+        self._account_ranges = account_ranges
+        self._time_ordered = {}
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, bank_account_number):
+        return bank_account_number in self._account_ranges
+
+    def timestamp(self, row: int) -> int:
+        """
+        Reads only the timestamp of a row.
+        :param row: an int
+        :return: seconds since the epoch
+        """
+        return struct.unpack_from("<q", self._buffer, self._offset + row * self.RECORD.size)[0]
+
+    def transaction(self, row: int) -> Transaction:
+        """
+        Decodes one row.
+        :param row: an int
+        :return: a Transaction
+        """
+        timestamp, amount, category, merchant_id, account_id = \
+            self.RECORD.unpack_from(self._buffer, self._offset + row * self.RECORD.size)
+        return Transaction(timestamp, amount, category, self._strings(merchant_id), self._strings(account_id))
+
+    def account_rows(self, bank_account_number: str) -> range:
+        """
+        Returns the rows that belong to a bank account.
+        :param bank_account_number: a string
+        :return: a range
+        """
+        first, count = self._account_ranges.get(bank_account_number, (0, 0))
+        return range(first, first + count)
+
+    def is_time_ordered(self, bank_account_number: str) -> bool:
+        """
+        Returns whether the rows of a bank account are in timestamp order, as Snapshot.write lays
+        them out. The answer is worked out once per account, in one pass that reads each of its
+        rows once.
+        :param bank_account_number: a string
+        :return: a boolean
+        """
+        ordered = self._time_ordered.get(bank_account_number)
+        if ordered is None:
+            rows = self.account_rows(bank_account_number)
+            start = self._offset + rows.start * self.RECORD.size
+            records = self.RECORD.iter_unpack(memoryview(self._buffer)[start:start + len(rows) * self.RECORD.size])
+            ordered = True
+            previous = None
+            for timestamp, *_ in records:
+                if previous is not None and timestamp < previous:
+                    ordered = False
+                    break
+                previous = timestamp
+            self._time_ordered[bank_account_number] = ordered
+        return ordered
+
+    def account_rows_between(self, bank_account_number: str, start=None, end=None) -> range:
+        """
+        Returns the rows of a bank account with start <= timestamp < end, found by bisection. The
+        account's rows must be in timestamp order.
+        :param bank_account_number: a string
+        :param start: a number, or None for no lower bound
+        :param end: a number, or None for no upper bound
+        :return: a range
+        """
+        rows = self.account_rows(bank_account_number)
+        first = 0 if start is None else bisect_left(rows, start, key=self.timestamp)
+        stop = len(rows) if end is None else bisect_left(rows, end, key=self.timestamp)
+        return rows[first:max(first, stop)]
+
+    def iter_account_transactions(self, bank_account_number: str):
+        """
+        Iterates over the transactions of a bank account in the order they were recorded.
+        :param bank_account_number: a string
+        :return: an iterator of Transactions
+        """
+        for row in self.account_rows(bank_account_number):
+            yield self.transaction(row)
+
+    def iter_transactions(self):
+        """
+        Iterates over every transaction in timestamp order.
+        :return: an iterator of Transactions
+        """
+        return heapq.merge(*(self.iter_account_transactions(number) for number in self._account_ranges),
+                           key=lambda transaction: transaction.timestamp)
+
+
+class Snapshot:
+    """
+    This class writes and loads compact binary snapshots of the catalogues and the user list.
+
+    A snapshot is a header followed by six sections: a string table holding every name, account
+    number, date of birth, merchant and month, then fixed-width records for bank accounts,
+    budgets, users, transactions and monthly rollups that refer to strings by id. Transactions are grouped by bank account
+    in timestamp order, and every account record holds the range of its rows. On load, accounts, budgets and users
+    are built straight away while the transaction section stays memory-mapped and is decoded per
+    account on first use. The snapshot stores the write-ahead log LSN it covers, so only the log
+    tail written after it has to be replayed.
+
+    The monthly rollups are stored with the time zone their months were bucketed in. They are
+    loaded back when the zone still matches, so summaries need not decode the transaction section;
+    otherwise they are rebuilt from it on first use. Snapshots written before rollups were stored
+    (FAMSNAP1) still load.
+    """
+    MAGIC = b"FAMSNAP2"
+    HEADER = struct.Struct("<8sQQ6Q6Q")
+    LEGACY_MAGIC = b"FAMSNAP1"
+    LEGACY_HEADER = struct.Struct("<8sQ5Q5Q")
+    ACCOUNT = struct.Struct("<BIIdBQQ")
+    BUDGET = struct.Struct("<BIdd")
+    USER = struct.Struct("<BIIId")
+    ROLLUP = struct.Struct("<IBIQqqq")
+
+    bank_account_types = {
+        Chequing: BankAccountType.CHEQUING,
+        Saving: BankAccountType.SAVING
+    }
+
+    user_types = {
+        Rebel: UserType.REBEL,
+        Angel: UserType.ANGEL,
+        TroubleMaker: UserType.TROUBLEMAKER
+    }
+
+    @staticmethod
+    def write(path: str, fam, lsn: int = 0) -> None:
+        """
+        Writes a snapshot of the catalogues and users of a Fam. The file is replaced atomically.
+        :param path: a string
+        :param fam: a Fam
+        :param lsn: an int, the last write-ahead log LSN the snapshot covers
+        """
+        strings = {}
+
+        def string_id(value: str) -> int:
+            return strings.setdefault(value, len(strings))
+
+        transaction_catalogue = fam.transaction_catalogue
+        accounts = bytearray()
+        transactions = bytearray()
+        row = 0
+        for bank_account in fam.bank_account_catalogue.get_bank_accounts():
+            first = row
+            number_id = string_id(bank_account.bank_account_number)
+            for transaction in transaction_catalogue.iter_user_transactions_between(bank_account.bank_account_number):
+                transactions += SnapshotTransactionSection.RECORD.pack(
+                    transaction.timestamp, transaction.amount, transaction.budget_category,
+                    string_id(transaction.merchant), number_id)
+                row += 1
+            accounts += Snapshot.ACCOUNT.pack(
+                Snapshot.bank_account_types[type(bank_account)].value, number_id,
+                string_id(bank_account.bank_name), bank_account.bank_bal, bank_account.is_locked, first, row - first)
+
+        budgets = bytearray()
+        for budget in fam.budget_catalogue.get_budgets():
+            budgets += Snapshot.BUDGET.pack(BudgetCatalogue.budget_category_map[type(budget)].value,
+                                            string_id(budget.bank_account_number), budget.limit, budget.spent)
+
+        users = bytearray()
+        for user in fam.user_list:
+            users += Snapshot.USER.pack(Snapshot.user_types[type(user)].value, string_id(user.name),
+                                        string_id(user.dob.isoformat()), string_id(user.bank_account_number),
+                                        user.warning_threshold)
+
+        rollups = bytearray()
+        for number, category, month, rollup in transaction_catalogue.get_rollups().rows():
+            rollups += Snapshot.ROLLUP.pack(string_id(number), category.value, string_id(month), rollup.count,
+                                            rollup.total_cents, rollup.smallest_cents, rollup.largest_cents)
+        zone_id = string_id(Snapshot.time_zone())
+
+        encoded = [value.encode() for value in strings]
+        string_offsets = [0]
+        for value in encoded:
+            string_offsets.append(string_offsets[-1] + len(value))
+        string_table = struct.pack(f"<{len(string_offsets)}Q", *string_offsets) + b"".join(encoded)
+
+        sections = [string_table, bytes(accounts), bytes(budgets), bytes(users), bytes(transactions), bytes(rollups)]
+        counts = [len(encoded), len(accounts) // Snapshot.ACCOUNT.size, len(budgets) // Snapshot.BUDGET.size,
+                  len(users) // Snapshot.USER.size, row, len(rollups) // Snapshot.ROLLUP.size]
+        offsets = []
+        position = Snapshot.HEADER.size
+        for section in sections:
+            offsets.append(position)
+            position += len(section)
+
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(Snapshot.HEADER.pack(Snapshot.MAGIC, lsn, zone_id, *counts, *offsets))
+            for section in sections:
+                file.write(section)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def checkpoint(path: str, fam, write_ahead_log) -> int:
+        """
+        Writes a snapshot covering everything in the write-ahead log and then drops the records it
+        covers from the log. Changes are held off at the log's gate meanwhile, so none can be logged
+        after the snapshot is taken and then dropped with the records it covers.
+        :param path: a string
+        :param fam: a Fam
+        :param write_ahead_log: a WriteAheadLog
+        :return: the LSN covered by the snapshot
+        """
+        with write_ahead_log.gate.exclusive():
+            lsn = write_ahead_log.sync()
+            Snapshot.write(path, fam, lsn)
+            write_ahead_log.truncate(lsn)
+        return lsn
+
+    @staticmethod
+    def load(path: str, fam) -> int:
+        """
+        Loads a snapshot into the empty catalogues and user list of a Fam. The transaction section
+        is memory-mapped and handed to the TransactionCatalogue to be decoded lazily.
+        :param path: a string
+        :param fam: a Fam whose catalogues are not attached to a write-ahead log yet
+        :return: the write-ahead log LSN the snapshot covers
+        """
+        with open(path, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if buffer[:8] == Snapshot.LEGACY_MAGIC:
+            magic, lsn, *fields = Snapshot.LEGACY_HEADER.unpack_from(buffer, 0)
+            zone_id = None
+            num_strings, num_accounts, num_budgets, num_users, num_transactions = fields[:5]
+            string_offset, account_offset, budget_offset, user_offset, transaction_offset = fields[5:]
+            num_rollups = rollup_offset = 0
+        else:
+            magic, lsn, zone_id, *fields = Snapshot.HEADER.unpack_from(buffer, 0)
+            if magic != Snapshot.MAGIC:
+                raise ValueError(f"{path} is not a FAM snapshot.")
+            num_strings, num_accounts, num_budgets, num_users, num_transactions, num_rollups = fields[:6]
+            string_offset, account_offset, budget_offset, user_offset, transaction_offset, rollup_offset = fields[6:]
+
+        blob_start = string_offset + (num_strings + 1) * 8
+        string_cache = {}
+
+        def string(string_id: int) -> str:
+            value = string_cache.get(string_id)
+            if value is None:
+                start, end = struct.unpack_from("<2Q", buffer, string_offset + string_id * 8)
+                value = string_cache[string_id] = buffer[blob_start + start:blob_start + end].decode()
+            return value
+
+        account_types = {value: key for key, value in Snapshot.bank_account_types.items()}
+        account_ranges = {}
+        for index in range(num_accounts):
+            type_code, number_id, name_id, balance, is_locked, first, count = \
+                Snapshot.ACCOUNT.unpack_from(buffer, account_offset + index * Snapshot.ACCOUNT.size)
+            bank_account = account_types[BankAccountType(type_code)](string(number_id), string(name_id), balance)
+            bank_account.is_locked = bool(is_locked)
+            fam.bank_account_catalogue.add_bank_account(bank_account)
+            account_ranges[bank_account.bank_account_number] = (first, count)
+
+        for index in range(num_budgets):
+            category, account_id, limit, spent = \
+                Snapshot.BUDGET.unpack_from(buffer, budget_offset + index * Snapshot.BUDGET.size)
+            budget = BudgetCatalogue.budget_type_map[BudgetType(category).value](limit, string(account_id))
+            budget.add_spent(-spent)
+            fam.budget_catalogue.add_budget(budget)
+
+        user_types = {value: key for key, value in Snapshot.user_types.items()}
+        for index in range(num_users):
+            type_code, name_id, dob_id, account_id, warning_threshold = \
+                Snapshot.USER.unpack_from(buffer, user_offset + index * Snapshot.USER.size)
+            fam.user_list.append(user_types[UserType(type_code)](
+                string(name_id), datetime.fromisoformat(string(dob_id)), string(account_id), warning_threshold))
+
+        rollups = None
+        if zone_id is not None and string(zone_id) == Snapshot.time_zone():
+            rollups = []
+            for index in range(num_rollups):
+                account_id, category, month_id, count, total, smallest, largest = \
+                    Snapshot.ROLLUP.unpack_from(buffer, rollup_offset + index * Snapshot.ROLLUP.size)
+                rollups.append((string(account_id), BudgetType(category), string(month_id),
+                                MonthlyRollup(total, count, smallest, largest)))
+
+        section = SnapshotTransactionSection(buffer, transaction_offset, num_transactions, string, account_ranges)
+        fam.transaction_catalogue.attach_snapshot_section(section, rollups)
+        return lsn
+
+    @staticmethod
+    def time_zone() -> str:
+        """
+        Describes the local time zone that months are bucketed in.
+        :return: a string
+        """
+        return f"{time.timezone},{time.altzone},{time.daylight},{','.join(time.tzname)}"
+
@@ -0,0 +1,436 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from record_codec import RecordCodec
+
+
+class SQLiteStorage:
+    """
+    This class stores bank accounts, budgets, users and transactions in an SQLite database so the
+    catalogues can hold more data than fits in memory.
+
+    The database runs in WAL mode. One writer connection applies writes in batches, each batch in
+    a single SQL transaction, and a small pool of reader connections serves concurrent reads.
+    A caller always sees its own writes without a flush per read: counts add the matching pending
+    transactions to the database's count, and other reads flush only when a pending write touches
+    the account or time range they read. Writes still pending when the process dies are lost, so
+    call flush() or close() at safe points.
+
+    Streaming reads fetch one page at a time by key and hand their connection back between pages,
+    so an iterator left half consumed never holds a pooled connection.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS bank_accounts (
+            bank_acc_num TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            bank_name TEXT NOT NULL,
+            bank_bal REAL NOT NULL,
+            is_locked INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS budgets (
+            bank_account_number TEXT NOT NULL,
+            budget_category INTEGER NOT NULL,
+            spending_limit REAL NOT NULL,
+            spent REAL NOT NULL,
+            PRIMARY KEY (bank_account_number, budget_category)
+        );
+        CREATE TABLE IF NOT EXISTS users (
+            bank_account_number TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            name TEXT NOT NULL,
+            dob TEXT NOT NULL,
+            warning_threshold REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            bank_num TEXT NOT NULL,
+            budget_category INTEGER NOT NULL,
+            timestamp INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            merchant TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS transactions_by_account_category ON transactions (bank_num, budget_category);
+        CREATE INDEX IF NOT EXISTS transactions_by_account_time ON transactions (bank_num, timestamp);
+        CREATE INDEX IF NOT EXISTS transactions_by_time ON transactions (timestamp);
+    """
+
+    UPSERT_BANK_ACCOUNT = "INSERT INTO bank_accounts VALUES (:bank_acc_num, :type, :bank_name, :bank_bal, " \
+                          ":is_locked) ON CONFLICT (bank_acc_num) DO UPDATE SET bank_bal = excluded.bank_bal, " \
+                          "is_locked = excluded.is_locked"
+    DELETE_BANK_ACCOUNT = "DELETE FROM bank_accounts WHERE bank_acc_num = :bank_acc_num"
+    UPSERT_BUDGET = "INSERT INTO budgets VALUES (:bank_account_number, :budget_category, :limit, :spent) " \
+                    "ON CONFLICT (bank_account_number, budget_category) DO UPDATE SET spent = excluded.spent"
+    UPSERT_USER = "INSERT OR REPLACE INTO users VALUES (:bank_account_number, :type, :name, :dob, " \
+                  ":warning_threshold)"
+    INSERT_TRANSACTION = "INSERT INTO transactions (bank_num, budget_category, timestamp, amount, merchant) " \
+                         "VALUES (:bank_num, :budget_category, :timestamp, :amount, :merchant)"
+
+    TRANSACTION_COLUMNS = "timestamp, amount, budget_category, merchant, bank_num"
+
+    def __init__(self, path: str, pool_size: int = 4, batch_size: int = 1000):
+        """
+        Opens or creates the database.
+        :param path: a string
+        :param pool_size: an int, the number of reader connections
+        :param batch_size: an int, the number of writes applied together
+        """
+        self._path = path
+        self._batch_size = batch_size
+        self._pending = []
+        self._pending_keys = {}
+        self._pending_times = {}
+        self._generation = 0
+        self._write_lock = threading.RLock()
+        self._writer = self._connect()
+        self._writer.executescript(SQLiteStorage.SCHEMA)
+        self._readers = queue.Queue()
+        for _ in range(pool_size):
+            self._readers.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Opens a connection in WAL mode that may be shared between threads.
+        :return: a Connection
+        """
+        connection = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    @contextmanager
+    def _reader(self, table: str = None, key: str = None, start=None, end=None):
+        """
+        Borrows a reader connection from the pool, first flushing pending writes if any of them
+        touches what is about to be read.
+        :param table: a string, or None when the read may touch every table
+        :param key: a string, the bank account number read, or None for every account
+        :param start: a number, the start of the transaction time range read, or None
+        :param end: a number, the end of the transaction time range read, or None
+        :return: a context manager giving a Connection
+        """
+        if self._is_pending(table, key, start, end):
+            self.flush()
+        connection = self._readers.get()
+        try:
+            yield connection
+        finally:
+            self._readers.put(connection)
+
+    def _is_pending(self, table: str, key: str, start, end) -> bool:
+        """
+        Returns whether a pending write touches a table, account or transaction time range.
+        :param table: a string, or None for every table
+        :param key: a string, or None for every account
+        :param start: a number, or None for no lower bound
+        :param end: a number, or None for no upper bound
+        :return: a boolean
+        """
+        with self._write_lock:
+            if table is None:
+                return bool(self._pending)
+            if table == "transactions":
+                times = self._pending_times.values() if key is None else [self._pending_times.get(key, ())]
+                return any(self._in_range(timestamp, start, end) for timestamps in times for timestamp in timestamps)
+            keys = self._pending_keys.get(table)
+            return bool(keys) and (key is None or key in keys)
+
+    @staticmethod
+    def _in_range(timestamp, start, end) -> bool:
+        """
+        Returns whether start <= timestamp < end.
+        :param timestamp: a number
+        :param start: a number, or None for no lower bound
+        :param end: a number, or None for no upper bound
+        :return: a boolean
+        """
+        return (start is None or timestamp >= start) and (end is None or timestamp < end)
+
+    def _write(self, statement: str, parameters: dict, table: str, key: str) -> None:
+        """
+        Queues a write and applies the batch when it is full.
+        :param statement: a string
+        :param parameters: a dict
+        :param table: a string, the table written
+        :param key: a string, the bank account number written
+        """
+        with self._write_lock:
+            self._pending.append((statement, parameters))
+            if table == "transactions":
+                self._pending_times.setdefault(key, []).append(parameters["timestamp"])
+            else:
+                self._pending_keys.setdefault(table, set()).add(key)
+            if len(self._pending) >= self._batch_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Applies every pending write in one SQL transaction.
+        """
+        with self._write_lock:
+            if not self._pending:
+                return
+            # Counts that read the pending rows and the database separately retry when this moves.
+            self._generation += 1
+            pending, self._pending = self._pending, []
+            self._pending_keys = {}
+            self._pending_times = {}
+            self._writer.execute("BEGIN")
+            try:
+                for statement, parameters in pending:
+                    self._writer.execute(statement, parameters)
+            except sqlite3.Error:
+                self._writer.execute("ROLLBACK")
+                raise
+            self._writer.execute("COMMIT")
+
+    def close(self) -> None:
+        """
+        Flushes pending writes and closes every connection.
+        """
+        self.flush()
+        self._writer.close()
+        while not self._readers.empty():
+            self._readers.get().close()
+
+    def save_bank_account(self, bank_account) -> None:
+        """
+        Inserts or updates a bank account.
+        :param bank_account: a BankAccount
+        """
+        self._write(SQLiteStorage.UPSERT_BANK_ACCOUNT, RecordCodec.encode_bank_account(bank_account),
+                    "bank_accounts", bank_account.bank_account_number)
+
+    def delete_bank_account(self, bank_acc_num: str) -> None:
+        """
+        Deletes a bank account.
+        :param bank_acc_num: a string
+        """
+        self._write(SQLiteStorage.DELETE_BANK_ACCOUNT, {"bank_acc_num": bank_acc_num}, "bank_accounts", bank_acc_num)
+
+    def save_budget(self, budget) -> None:
+        """
+        Inserts or updates a budget.
+        :param budget: a Budget
+        """
+        self._write(SQLiteStorage.UPSERT_BUDGET, RecordCodec.encode_budget(budget), "budgets", budget.bank_account_number)
+
+    def save_user(self, user) -> None:
+        """
+        Inserts or updates a user.
+        :param user: a User
+        """
+        self._write(SQLiteStorage.UPSERT_USER, RecordCodec.encode_user(user), "users", user.bank_account_number)
+
+    def add_transaction(self, transaction) -> None:
+        """
+        Inserts a transaction.
+        :param transaction: a Transaction
+        """
+        self._write(SQLiteStorage.INSERT_TRANSACTION, RecordCodec.encode_transaction(transaction), "transactions",
+                    transaction.bank_num)
+
+    def load_bank_account(self, bank_acc_num: str):
+        """
+        Loads a bank account.
+        :param bank_acc_num: a string
+        :return: a BankAccount, or None if it is not stored
+        """
+        with self._reader("bank_accounts", bank_acc_num) as connection:
+            row = connection.execute("SELECT * FROM bank_accounts WHERE bank_acc_num = ?",
+                                     (bank_acc_num,)).fetchone()
+        return None if row is None else self._decode_bank_account(row)
+
+    def load_bank_accounts(self):
+        """
+        Iterates over every stored bank account in the order they were added.
+        :return: an iterator of BankAccounts
+        """
+        with self._reader("bank_accounts") as connection:
+            rows = connection.execute("SELECT * FROM bank_accounts ORDER BY rowid").fetchall()
+        for row in rows:
+            yield self._decode_bank_account(row)
+
+    def _decode_bank_account(self, row):
+        """
+        Builds a bank account from a row.
+        :param row: a Row
+        :return: a BankAccount
+        """
+        return RecordCodec.decode_bank_account(dict(row))
+
+    def load_budgets(self, bank_account_number: str = None) -> list:
+        """
+        Loads the budgets of one bank account, or every budget.
+        :param bank_account_number: a string, or None for every account
+        :return: a list of Budgets
+        """
+        query = "SELECT bank_account_number, budget_category, spending_limit AS \"limit\", spent FROM budgets"
+        with self._reader("budgets", bank_account_number) as connection:
+            if bank_account_number is None:
+                rows = connection.execute(query + " ORDER BY rowid").fetchall()
+            else:
+                rows = connection.execute(query + " WHERE bank_account_number = ? ORDER BY budget_category",
+                                          (bank_account_number,)).fetchall()
+        return [RecordCodec.decode_budget(dict(row)) for row in rows]
+
+    def load_users(self) -> list:
+        """
+        Loads every user in the order they were added.
+        :return: a list of Users
+        """
+        with self._reader("users") as connection:
+            rows = connection.execute("SELECT * FROM users ORDER BY rowid").fetchall()
+        return [RecordCodec.decode_user(dict(row)) for row in rows]
+
+    def load_transactions(self, bank_num: str = None, budget_category: int = None) -> list:
+        """
+        Loads the transactions of one bank account, optionally in one budget category, in the order
+        they were recorded.
+        :param bank_num: a string
+        :param budget_category: an int, or None for every category
+        :return: a list of Transactions
+        """
+        return list(self.iter_transactions(bank_num, budget_category))
+
+    def iter_transactions(self, bank_num: str = None, budget_category: int = None, batch_size: int = 10000):
+        """
+        Streams transactions in the order they were recorded, optionally for one bank account and
+        budget category. Rows are fetched a page of batch_size at a time, so memory use stays
+        bounded and the connection is handed back between pages.
+        :param bank_num: a string, or None for every account
+        :param budget_category: an int, or None for every category
+        :param batch_size: an int
+        :return: an iterator of Transactions
+        """
+        query = f"SELECT id, {SQLiteStorage.TRANSACTION_COLUMNS} FROM transactions WHERE id > ?"
+        parameters = []
+        if bank_num is not None:
+            query += " AND bank_num = ?"
+            parameters.append(bank_num)
+        if budget_category is not None:
+            query += " AND budget_category = ?"
+            parameters.append(budget_category)
+        query += " ORDER BY id LIMIT ?"
+
+        last_id = 0
+        while True:
+            with self._reader("transactions", bank_num) as connection:
+                rows = connection.execute(query, [last_id, *parameters, batch_size]).fetchall()
+            for row in rows:
+                yield RecordCodec.decode_transaction(dict(row))
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1]["id"]
+
+    def iter_transactions_between(self, bank_num: str, start=None, end=None, budget_category: int = None,
+                                  batch_size: int = 10000):
+        """
+        Streams the transactions of a bank account with start <= timestamp < end in timestamp
+        order, using the (bank_num, timestamp) index. Rows are fetched a page of batch_size at a
+        time, each page starting after the (timestamp, id) the last one ended on.
+        :param bank_num: a string
+        :param start: a number, or None for no lower bound
+        :param end: a number, or None for no upper bound
+        :param budget_category: an int, or None for every category
+        :param batch_size: an int
+        :return: an iterator of Transactions
+        """
+        query, parameters = self._range_query(f"SELECT id, {SQLiteStorage.TRANSACTION_COLUMNS}", bank_num, start, end)
+        if budget_category is not None:
+            query += " AND budget_category = ?"
+            parameters.append(budget_category)
+        first_page = query + " ORDER BY timestamp, id LIMIT ?"
+        next_page = query + " AND (timestamp, id) > (?, ?) ORDER BY timestamp, id LIMIT ?"
+
+        last = None
+        while True:
+            with self._reader("transactions", bank_num, start, end) as connection:
+                if last is None:
+                    rows = connection.execute(first_page, [*parameters, batch_size]).fetchall()
+                else:
+                    rows = connection.execute(next_page, [*parameters, *last, batch_size]).fetchall()
+            for row in rows:
+                yield RecordCodec.decode_transaction(dict(row))
+            if len(rows) < batch_size:
+                return
+            last = (rows[-1]["timestamp"], rows[-1]["id"])
+
+    def count_transactions_between(self, bank_num: str, start=None, end=None) -> int:
+        """
+        Returns the number of transactions of a bank account with start <= timestamp < end,
+        pending ones included, without flushing them.
+        :param bank_num: a string
+        :param start: a number, or None for no lower bound
+        :param end: a number, or None for no upper bound
+        :return: an int
+        """
+        query, parameters = self._range_query("SELECT COUNT(*)", bank_num, start, end)
+        return self._count(query, parameters, bank_num, start, end)
+
+    def _count(self, query: str, parameters: list, bank_num: str = None, start=None, end=None) -> int:
+        """
+        Runs a COUNT query over the transactions in the database and adds the pending transactions
+        it would match. A flush between the two would count its rows twice or not at all, so the
+        count is taken again when one happens.
+        :param query: a string
+        :param parameters: a list
+        :param bank_num: a string, or None for every account
+        :param start: a number, or None for no lower bound
+        :param end: a number, or None for no upper bound
+        :return: an int
+        """
+        while True:
+            with self._write_lock:
+                generation = self._generation
+                times = self._pending_times.values() if bank_num is None else [self._pending_times.get(bank_num, ())]
+                pending = sum(self._in_range(timestamp, start, end) for timestamps in times for timestamp in timestamps)
+            connection = self._readers.get()
+            try:
+                stored = connection.execute(query, parameters).fetchone()[0]
+            finally:
+                self._readers.put(connection)
+            if generation == self._generation:
+                return stored + pending
+
+    @staticmethod
+    def _range_query(select: str, bank_num: str, start, end) -> tuple:
+        """
+        Builds a query over the transactions of a bank account within a timestamp range.
+        :param select: a string, the SELECT clause
+        :param bank_num: a string
+        :param start: a number, or None for no lower bound
+        :param end: a number, or None for no upper bound
+        :return: a (query, parameters) tuple
+        """
+        query = f"{select} FROM transactions WHERE bank_num = ?"
+        parameters = [bank_num]
+        if start is not None:
+            query += " AND timestamp >= ?"
+            parameters.append(start)
+        if end is not None:
+            query += " AND timestamp < ?"
+            parameters.append(end)
+        return query, parameters
+
+    def monthly_rollups(self) -> list:
+        """
+        Totals the transactions of every bank account per budget category and calendar month
+        (local time) in one GROUP BY query, with the amounts in whole cents.
+        :return: a list of (bank_num, budget_category, "YYYY-MM", count, total, smallest, largest)
+                 tuples
+        """
+        query = "SELECT bank_num, budget_category, month, COUNT(*), SUM(cents), MIN(cents), MAX(cents) FROM " \
+                "(SELECT bank_num, budget_category, strftime('%Y-%m', timestamp, 'unixepoch', 'localtime') AS month, " \
+                "CAST(ROUND(amount * 100) AS INTEGER) AS cents FROM transactions) " \
+                "GROUP BY bank_num, budget_category, month"
+        with self._reader("transactions") as connection:
+            return [tuple(row) for row in connection.execute(query).fetchall()]
+
+    def count_transactions(self) -> int:
+        """
+        Returns the number of stored transactions, pending ones included.
+        :return: an int
+        """
+        return self._count("SELECT COUNT(*) FROM transactions", [])
@@ -0,0 +1,125 @@
+import sys
+
+
+class StatementCursor:
+    """
+    This class walks a stream of transactions one page at a time. Only the current page and one
+    transaction of lookahead are held, so opening a cursor on a long history costs nothing and
+    memory stays constant however far it is paged.
+    """
+
+    def __init__(self, transactions, page_size: int):
+        """
+        Initialize a cursor at the first transaction.
+        :param transactions: an iterable of Transactions in statement order
+        :param page_size: an int, the number of transactions per page
+        """
+        if page_size < 1:
+            raise ValueError("A page holds at least one transaction.")
+        self._transactions = iter(transactions)
+        self._page_size = page_size
+        self._position = 0
+        self._lookahead = next(self._transactions, None)
+
+    @property
+    def position(self) -> int:
+        """
+        Returns the number of transactions already paged.
+        :return: an int
+        """
+        return self._position
+
+    @property
+    def has_more(self) -> bool:
+        """
+        Returns whether another page is available.
+        :return: a boolean
+        """
+        return self._lookahead is not None
+
+    def next_page(self) -> list:
+        """
+        Returns the next page of transactions and moves past it.
+        :return: a list of Transactions, empty once the statement is exhausted
+        """
+        page = []
+        while self._lookahead is not None and len(page) < self._page_size:
+            page.append(self._lookahead)
+            self._lookahead = next(self._transactions, None)
+        self._position += len(page)
+        return page
+
+    def close(self) -> None:
+        """
+        Releases the underlying stream, such as a storage reader, before the statement is done.
+        """
+        close = getattr(self._transactions, "close", None)
+        if close is not None:
+            close()
+        self._lookahead = None
+
+
+class StatementRenderer:
+    """
+    This class renders transaction statements. Transactions are streamed from the catalogue and
+    formatted page by page, each page going to the output in a single write.
+    """
+    PAGE_SIZE = 20
+
+    def __init__(self, transaction_catalogue, page_size: int = PAGE_SIZE):
+        """
+        Initialize a renderer over a transaction catalogue.
+        :param transaction_catalogue: a TransactionCatalogue
+        :param page_size: an int, the number of transactions per page
+        """
+        self._transaction_catalogue = transaction_catalogue
+        self._page_size = page_size
+
+    def open(self, bank_account_number: str, budget_category: int = None, start=None, end=None) -> StatementCursor:
+        """
+        Opens a cursor on the transactions of a bank account in timestamp order, optionally under
+        one budget category and within start <= timestamp < end.
+        :param bank_account_number: a string
+        :param budget_category: an int, or None for every category
+        :param start: seconds since the epoch, or None for no lower bound
+        :param end: seconds since the epoch, or None for no upper bound
+        :return: a StatementCursor
+        """
+        return StatementCursor(self._transaction_catalogue.iter_user_transactions_between(
+            bank_account_number, start, end, budget_category), self._page_size)
+
+    @staticmethod
+    def format_page(page: list, first_number: int = None) -> str:
+        """
+        Formats a page of transactions the way the statements have always been printed.
+        :param page: a list of Transactions
+        :param first_number: an int, the number of the first transaction to head each one with
+                             "Transaction n", or None to leave them unnumbered
+        :return: a string
+        """
+        if first_number is None:
+            return "".join(f"{transaction}\n" for transaction in page)
+        return "".join(f"======== Transaction {number} ========\n{transaction}\n"
+                       for number, transaction in enumerate(page, first_number))
+
+    def write_page(self, cursor: StatementCursor, numbered: bool = True, stream=None) -> bool:
+        """
+        Writes the next page of a cursor.
+        :param cursor: a StatementCursor
+        :param numbered: a boolean, whether to number the transactions
+        :param stream: a text stream, sys.stdout by default
+        :return: True if more pages follow, otherwise False
+        """
+        first_number = cursor.position + 1 if numbered else None
+        (stream or sys.stdout).write(self.format_page(cursor.next_page(), first_number))
+        return cursor.has_more
+
+    def write_all(self, cursor: StatementCursor, numbered: bool = True, stream=None) -> None:
+        """
+        Writes every remaining page of a cursor.
+        :param cursor: a StatementCursor
+        :param numbered: a boolean, whether to number the transactions
+        :param stream: a text stream, sys.stdout by default
+        """
+        while self.write_page(cursor, numbered, stream):
+            pass
@@ -0,0 +1,57 @@
+import os
+import sys
+import pytest
+
+# The modules live at the top of the repository rather than in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank_account_catalogue import BankAccountCatalogue  # noqa: E402
+from budget_catalogue import BudgetCatalogue  # noqa: E402
+from transaction_catalogue import TransactionCatalogue  # noqa: E402
+
+LIMITS = {"games_entertainment": 1000.0, "clothing_accessories": 1000.0, "eating_out": 1000.0,
+          "miscellaneous": 1000.0}
+
+
+def register_request(number, user_type="rebel", bank_account_type="chequing", balance=1e6, limits=None) -> dict:
+    """
+    Returns a FamCommands request registering a user.
+    """
+    return {"action": "register", "name": f"User {number}", "dob": "2000-01-01", "user_type": user_type,
+            "bank_account_type": bank_account_type, "bank_account_number": str(number), "bank_name": "Bank",
+            "bank_balance": balance, "budget_limits": limits or LIMITS}
+
+
+def transaction_request(number, amount=1.0, category=1, merchant="Shop", timestamp=None) -> dict:
+    """
+    Returns a FamCommands request recording a transaction.
+    """
+    request = {"action": "record_transaction", "bank_account_number": str(number), "budget_category": category,
+               "amount": amount, "merchant": merchant}
+    if timestamp is not None:
+        request["timestamp"] = timestamp
+    return request
+
+
+def reset_catalogues() -> None:
+    """
+    Empties the catalogues and detaches them from any write-ahead log or storage, as if the
+    process had restarted.
+    """
+    for catalogue in (BankAccountCatalogue, BudgetCatalogue, TransactionCatalogue()):
+        catalogue.set_write_ahead_log(None)
+        catalogue.set_storage(None)
+    BankAccountCatalogue.clear()
+    BudgetCatalogue.clear()
+    TransactionCatalogue().clear()
+
+
+@pytest.fixture(autouse=True)
+def clean_catalogues():
+    """
+    The catalogues keep their state on the class, so every test starts and ends with them empty,
+    in memory and unlogged.
+    """
+    reset_catalogues()
+    yield
+    reset_catalogues()
@@ -0,0 +1,42 @@
+import random
+import pytest
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+from conftest import register_request
+from fam import Fam
+from fam_commands import FamCommands
+from transaction import Transaction
+from transaction_catalogue import TransactionCatalogue
+
+LIMITS = {"games_entertainment": 100.0, "clothing_accessories": 80.0, "eating_out": 60.0, "miscellaneous": 40.0}
+STEPS = 400
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_incremental_over_threshold_count_matches_a_full_recount(seed):
+    generator = random.Random(seed)
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue())
+    commands = FamCommands(fam)
+    for number, user_type in enumerate(("rebel", "angel", "troublemaker")):
+        assert commands.dispatch(register_request(number, user_type=user_type, balance=1e9, limits=LIMITS))["ok"]
+    catalogue = fam.transaction_catalogue
+    latest = 1e9
+
+    for _ in range(STEPS):
+        user = generator.choice(fam.user_list)
+        category = generator.randint(1, 4)
+        amount = round(generator.uniform(0.01, 30.0), 2)
+        if generator.random() < 0.5:
+            latest += generator.uniform(1, 100)
+            timestamp = latest
+        else:
+            # A backfill, dated before transactions already recorded.
+            timestamp = generator.uniform(1e9 - 1e6, latest)
+        if generator.random() < 0.7:
+            catalogue.record_transaction(user, category, amount, f"m{generator.randrange(20)}", timestamp)
+        else:
+            catalogue.replay_transaction(user, Transaction(timestamp, amount, category, "replayed",
+                                                           user.bank_account_number))
+        for user in fam.user_list:
+            assert BudgetCatalogue.count_budgets_over_threshold(user) == \
+                BudgetCatalogue.recount_budgets_over_threshold(user)
@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+from conftest import register_request, transaction_request
+from fam import Fam
+from fam_commands import FamCommands
+from transaction_catalogue import TransactionCatalogue
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_wrongly_typed_fields_are_answered_with_errors():
+    commands = FamCommands(Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue()))
+    for field, value in (("user_type", 1.5), ("bank_account_type", ["chequing"]), ("budget_limits", [1, 2])):
+        request = register_request(1)
+        request[field] = value
+        response = commands.dispatch(request)
+        assert not response["ok"] and response["error"]
+    assert commands.dispatch(register_request(1))["ok"]
+    assert not commands.dispatch(transaction_request(1, category={"name": "eating_out"}))["ok"]
+
+
+def test_headless_driver_survives_a_wrongly_typed_field():
+    lines = [dict(register_request(1), user_type=1.5), register_request(2), transaction_request(2)]
+    process = subprocess.run([sys.executable, "driver.py", "-"], cwd=REPOSITORY, capture_output=True, text=True,
+                             input="".join(json.dumps(line) + "\n" for line in lines), timeout=60)
+    assert "Traceback" not in process.stderr
+    assert process.returncode == 1
+    assert [json.loads(line)["ok"] for line in process.stdout.splitlines()] == [False, True, True]
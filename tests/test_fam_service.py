@@ -0,0 +1,89 @@
+import asyncio
+import io
+import json
+import threading
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+from conftest import register_request, transaction_request
+from driver import Driver
+from fam import Fam
+from fam_service import FamClient, FamService
+from transaction_catalogue import TransactionCatalogue
+
+NUM_CLIENTS = 50
+
+
+def _service():
+    return FamService(Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue()))
+
+
+async def _serve(service):
+    server = await service.serve("127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_clients_register_record_and_read_concurrently():
+    async def run():
+        server, port = await _serve(_service())
+        async with server:
+            async def client(number):
+                client = await FamClient.connect("127.0.0.1", port)
+                try:
+                    await client.request(**register_request(number))
+                    for _ in range(3):
+                        result = await client.request(**transaction_request(number, amount=2.0))
+                        assert result["status"] == "ACCEPTED"
+                    details = await client.request("account_details", bank_account_number=str(number))
+                    budgets = await client.request("view_budgets", bank_account_number=str(number))
+                    return len(details["transactions"]), budgets
+                finally:
+                    await client.close()
+
+            return await asyncio.gather(*(client(number) for number in range(NUM_CLIENTS)))
+
+    for transactions, budgets in asyncio.run(run()):
+        assert transactions == 3
+        assert len(budgets) == 4
+
+
+def test_bad_requests_are_answered_without_dropping_the_connection():
+    async def run():
+        service = _service()
+        assert not (await service.handle_request(["not", "an", "object"]))["ok"]
+        server, port = await _serve(service)
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            responses = []
+            for line in (b"[1, 2]\n", b"42\n", b"not json\n", b'{"action": "nope"}\n',
+                         json.dumps(register_request(1)).encode() + b"\n"):
+                writer.write(line)
+                await writer.drain()
+                responses.append(json.loads(await reader.readline()))
+            writer.close()
+            await writer.wait_closed()
+        return responses
+
+    responses = asyncio.run(run())
+    assert [response["ok"] for response in responses] == [False, False, False, False, True]
+
+
+def test_driver_sends_a_command_file_to_the_service():
+    loop = asyncio.new_event_loop()
+    server, port = loop.run_until_complete(_serve(_service()))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        lines = [json.dumps(register_request(7)), json.dumps(transaction_request(7, amount=5.0)),
+                 json.dumps({"action": "view_budgets", "bank_account_number": "7"}), "[]"]
+        output = io.StringIO()
+        failures = Driver.run_remote_commands("127.0.0.1", port, lines, output)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
+
+    responses = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert failures == 1
+    assert [response["ok"] for response in responses] == [True, True, True, False]
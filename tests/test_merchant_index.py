@@ -0,0 +1,70 @@
+import random
+import threading
+from collections import Counter
+import pytest
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+from conftest import register_request, transaction_request
+from fam import Fam
+from fam_commands import FamCommands
+from merchant_index import MerchantIndex
+from transaction import Transaction
+from transaction_catalogue import TransactionCatalogue
+
+NUM_ACCOUNTS = 8
+TRANSACTIONS_PER_ACCOUNT = 2000
+
+
+def _transactions(number):
+    generator = random.Random(number)
+    return [Transaction(timestamp, 1.0, generator.randint(1, 4), f"m{int(generator.paretovariate(1.2)) % 40}",
+                        str(number))
+            for timestamp in range(TRANSACTIONS_PER_ACCOUNT)]
+
+
+@pytest.mark.parametrize("keep_postings", (True, False))
+def test_concurrent_adds_on_different_accounts_are_all_counted(keep_postings):
+    index = MerchantIndex(account_capacity=64, ledger_capacity=64, keep_postings=keep_postings)
+    accounts = [_transactions(number) for number in range(NUM_ACCOUNTS)]
+    threads = [threading.Thread(target=lambda transactions=transactions: [index.add(t) for t in transactions])
+               for transactions in accounts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every sketch has more counters than there are merchants, so the counts are exact.
+    ledger = Counter(transaction.merchant for transactions in accounts for transaction in transactions)
+    assert {merchant: count for merchant, count, _ in index.top_merchants(k=64)} == ledger
+    for number, transactions in enumerate(accounts):
+        counts = Counter(transaction.merchant for transaction in transactions)
+        assert {merchant: count for merchant, count, _ in index.top_merchants(str(number), k=64)} == counts
+        if keep_postings:
+            assert len(index.get_transactions(str(number), "m1")) == counts["m1"]
+        else:
+            with pytest.raises(ValueError):
+                index.get_transactions(str(number), "m1")
+
+
+def test_amounts_are_summed_in_cents():
+    index = MerchantIndex()
+    for _ in range(6):
+        index.add(Transaction(0, 0.1, 1, "M1", "1"))
+    assert index.top_merchants("1", by="amount") == [("M1", 0.6, 0)]
+
+
+def test_turning_postings_back_on_rebuilds_them():
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue())
+    commands = FamCommands(fam)
+    assert commands.dispatch(register_request(1))["ok"]
+    catalogue = fam.transaction_catalogue
+    catalogue.set_merchant_postings(False)
+    try:
+        for merchant in ("a", "b", "a"):
+            assert commands.dispatch(transaction_request(1, merchant=merchant))["ok"]
+        assert len(catalogue.get_user_transactions_by_merchant("1", "a")) == 2
+        catalogue.set_merchant_postings(True)
+        assert len(catalogue.get_user_transactions_by_merchant("1", "a")) == 2
+        assert catalogue.get_merchant_index().account_merchants("1") == ["a", "b"]
+    finally:
+        catalogue.set_merchant_postings(True)
@@ -0,0 +1,93 @@
+import os
+import random
+import time
+import pytest
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+from conftest import register_request, reset_catalogues, transaction_request
+from fam import Fam
+from fam_commands import FamCommands
+from monthly_rollups import MonthlyRollups
+from snapshot import SnapshotTransactionSection
+from sqlite_storage import SQLiteStorage
+from transaction_catalogue import TransactionCatalogue
+
+NUM_ACCOUNTS = 3
+NUM_TRANSACTIONS = 300
+LIMITS = {"games_entertainment": 1e9, "clothing_accessories": 1e9, "eating_out": 1e9, "miscellaneous": 1e9}
+
+
+@pytest.fixture
+def vancouver_time():
+    """
+    Runs the test in a time zone away from UTC, so UTC and local months differ.
+    """
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = "America/Vancouver"
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+
+
+def _record(fam):
+    commands = FamCommands(fam)
+    generator = random.Random(1)
+    for number in range(NUM_ACCOUNTS):
+        assert commands.dispatch(register_request(number, balance=1e9, limits=LIMITS))["ok"]
+    for _ in range(NUM_TRANSACTIONS):
+        # 0.1 and 0.2 do not add up exactly in floats, but do in cents.
+        request = transaction_request(generator.randrange(NUM_ACCOUNTS), amount=generator.choice((0.1, 0.2, 19.99)),
+                                      category=generator.randint(1, 4),
+                                      timestamp=generator.randrange(1_600_000_000, 1_640_000_000))
+        assert commands.dispatch(request)["ok"]
+
+
+def _rollups(fam):
+    return {(number, category, month): (rollup.count, rollup.total_cents, rollup.smallest_cents, rollup.largest_cents)
+            for number, category, month, rollup in fam.transaction_catalogue.get_rollups().rows()}
+
+
+def _recount(fam):
+    rollups = MonthlyRollups()
+    rollups.rebuild(fam.transaction_catalogue.iter_transactions())
+    return {(number, category, month): (rollup.count, rollup.total_cents, rollup.smallest_cents, rollup.largest_cents)
+            for number, category, month, rollup in rollups.rows()}
+
+
+def test_months_are_local(vancouver_time):
+    # 2021-02-01 03:00 UTC is still January 31st in Vancouver.
+    assert MonthlyRollups.month_of(1612148400) == "2021-01"
+
+
+def test_snapshot_restores_rollups_without_decoding_transactions(tmp_path, monkeypatch, vancouver_time):
+    path = str(tmp_path / "fam.snapshot")
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue(), snapshot_path=path)
+    _record(fam)
+    expected = _rollups(fam)
+    assert expected == _recount(fam)
+    fam.checkpoint()
+    reset_catalogues()
+
+    def refuse(*_):
+        raise AssertionError("the transaction section was decoded")
+
+    monkeypatch.setattr(SnapshotTransactionSection, "iter_transactions", refuse)
+    monkeypatch.setattr(SnapshotTransactionSection, "iter_account_transactions", refuse)
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue(), snapshot_path=path)
+    assert _rollups(fam) == expected
+    assert fam.transaction_catalogue.spend_by_category_per_month()
+
+
+def test_storage_rebuilds_rollups_with_one_query(tmp_path, vancouver_time):
+    storage = SQLiteStorage(str(tmp_path / "fam.db"))
+    try:
+        fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue(), storage=storage)
+        _record(fam)
+        fam.transaction_catalogue.get_rollups().mark_stale()
+        assert _rollups(fam) == _recount(fam)
+    finally:
+        storage.close()
@@ -0,0 +1,55 @@
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+from budget_types import BudgetType
+from conftest import register_request
+from fam import Fam
+from fam_commands import FamCommands
+from policy_engine import PolicyEngine
+from transaction_catalogue import TransactionCatalogue
+from user_type import UserType
+
+
+def _fam(*user_types):
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue())
+    commands = FamCommands(fam)
+    for number, user_type in enumerate(user_types):
+        assert commands.dispatch(register_request(number, user_type=user_type))["ok"]
+    return fam
+
+
+def test_a_rebel_without_budgets_is_locked_like_the_rule_method():
+    engine = PolicyEngine()
+    evaluation = engine.evaluate([], [], [], [], [], 1, [UserType.REBEL.value])
+    assert evaluation.account_locked.tolist() == [True]
+    evaluation = engine.evaluate([], [], [], [], [], 1, [UserType.ANGEL.value])
+    assert evaluation.account_locked.tolist() == [False]
+
+
+def test_changes_are_reported_once_and_only_new_users_are_gathered(monkeypatch):
+    fam = _fam("rebel", "angel")
+    engine = PolicyEngine()
+    BudgetCatalogue.adjust_budget_details("0", BudgetType.GAMES_ENTERTAINMENT.value, 1000.0)
+    BudgetCatalogue.adjust_budget_details("0", BudgetType.EATING_OUT.value, 1000.0)
+    BudgetCatalogue.adjust_budget_details("1", BudgetType.EATING_OUT.value, 950.0)
+
+    changes = engine.find_changes(fam)
+    assert changes.accounts_to_lock == ["0"]
+    assert changes.locked_budgets == [("0", BudgetType.GAMES_ENTERTAINMENT), ("0", BudgetType.EATING_OUT)]
+    assert ("1", BudgetType.EATING_OUT) in changes.warned_budgets
+    PolicyEngine.apply_changes(fam, changes)
+
+    # Nothing has moved since, so nothing is reported again.
+    changes = engine.find_changes(fam)
+    assert (changes.accounts_to_lock, changes.locked_budgets, changes.warned_budgets) == ([], [], [])
+
+    gathered = []
+    real_get_budgets = BudgetCatalogue.get_budgets_by_account_num
+    monkeypatch.setattr(BudgetCatalogue, "get_budgets_by_account_num",
+                        staticmethod(lambda number: gathered.append(number) or real_get_budgets(number)))
+    assert FamCommands(fam).dispatch(register_request(2, user_type="troublemaker"))["ok"]
+    gathered.clear()
+    BudgetCatalogue.adjust_budget_details("0", BudgetType.EATING_OUT.value, -1000.0)
+    changes = engine.find_changes(fam)
+    assert gathered == ["2"]
+    assert changes.locked_budgets == []
+    assert changes.unlocked_budgets == [("0", BudgetType.EATING_OUT)]
@@ -0,0 +1,34 @@
+import pytest
+from conftest import register_request, transaction_request
+from sharded_ledger import ShardedLedger, _dispatch
+
+
+class _FailingCommands:
+    def dispatch(self, request):
+        raise RuntimeError("boom")
+
+
+def test_worker_answers_unexpected_errors():
+    assert _dispatch(_FailingCommands(), {"id": 7, "action": "list_users"}) == \
+        {"id": 7, "ok": False, "error": "RuntimeError: boom"}
+
+
+def test_bad_request_is_answered_and_shard_keeps_serving():
+    with ShardedLedger(2) as ledger:
+        assert ledger.request(register_request(1))["ok"]
+        response = ledger.request(transaction_request(1, amount="inf"))
+        assert not response["ok"]
+        assert ledger.request(transaction_request(1, amount=2.5))["result"]["status"] == "ACCEPTED"
+
+
+def test_requests_fail_instead_of_hanging_when_a_shard_exits():
+    with ShardedLedger(2) as ledger:
+        shard = ledger.shard_for("1")
+        ledger._processes[shard].kill()
+        ledger._processes[shard].join()
+        with pytest.raises(ConnectionError):
+            ledger.submit(transaction_request(1)).result(timeout=10)
+        with pytest.raises(ConnectionError):
+            ledger.request_many([transaction_request(1)])
+        with pytest.raises(ConnectionError):
+            ledger.request({"action": "list_users"})
@@ -0,0 +1,65 @@
+import threading
+import pytest
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+from conftest import register_request, reset_catalogues, transaction_request
+from fam import Fam
+from fam_commands import FamCommands
+from transaction_catalogue import TransactionCatalogue
+from write_ahead_log import WriteAheadLog
+
+NUM_ACCOUNTS = 4
+NUM_THREADS = 4
+TRANSACTIONS_PER_THREAD = 150
+
+
+def _open_fam(tmp_path):
+    write_ahead_log = WriteAheadLog(str(tmp_path / "fam.wal"), fsync_batch=32)
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue(), write_ahead_log,
+              str(tmp_path / "fam.snapshot"))
+    return fam, write_ahead_log
+
+
+def test_checkpoints_during_writes_lose_and_repeat_nothing(tmp_path):
+    fam, write_ahead_log = _open_fam(tmp_path)
+    commands = FamCommands(fam)
+    for number in range(NUM_ACCOUNTS):
+        assert commands.dispatch(register_request(number))["ok"]
+
+    acknowledged = []
+    done = threading.Event()
+
+    def write(thread):
+        for count in range(TRANSACTIONS_PER_THREAD):
+            merchant = f"t{thread}-{count}"
+            response = commands.dispatch(transaction_request(thread % NUM_ACCOUNTS, amount=0.01, merchant=merchant))
+            if response["ok"] and response["result"]["status"] == "ACCEPTED":
+                acknowledged.append(merchant)
+
+    def checkpoint():
+        while not done.is_set():
+            fam.checkpoint()
+
+    writers = [threading.Thread(target=write, args=(thread,)) for thread in range(NUM_THREADS)]
+    checkpointer = threading.Thread(target=checkpoint)
+    checkpointer.start()
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    done.set()
+    checkpointer.join()
+    write_ahead_log.close()
+    reset_catalogues()
+
+    fam, write_ahead_log = _open_fam(tmp_path)
+    merchants = [transaction.merchant for transaction in fam.transaction_catalogue.iter_transactions()]
+    write_ahead_log.close()
+    assert len(acknowledged) == NUM_THREADS * TRANSACTIONS_PER_THREAD
+    assert sorted(merchants) == sorted(acknowledged)
+
+
+def test_checkpoint_without_a_snapshot_path_is_refused():
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue())
+    with pytest.raises(ValueError):
+        fam.checkpoint()
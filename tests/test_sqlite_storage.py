@@ -0,0 +1,71 @@
+import threading
+import pytest
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+from conftest import register_request, transaction_request
+from fam import Fam
+from fam_commands import FamCommands
+from sqlite_storage import SQLiteStorage
+from transaction import Transaction
+from transaction_catalogue import TransactionCatalogue
+
+NUM_ACCOUNTS = 50
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fam.db"), pool_size=4, batch_size=1000)
+    yield storage
+    storage.close()
+
+
+def test_saving_limit_counts_pending_transactions_without_flushing(storage, monkeypatch):
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue(), storage=storage)
+    commands = FamCommands(fam)
+    flushes = []
+    real_flush = storage.flush
+    monkeypatch.setattr(storage, "flush", lambda: flushes.append(len(storage._pending)) or real_flush())
+
+    statuses = []
+    for number in range(NUM_ACCOUNTS):
+        assert commands.dispatch(register_request(number, bank_account_type="saving"))["ok"]
+        for _ in range(3):
+            statuses.append(commands.dispatch(transaction_request(number))["result"]["status"])
+
+    # A Saving account allows two transactions a month, so the third is refused.
+    assert statuses == ["ACCEPTED", "ACCEPTED", "ACCOUNT_LOCKED"] * NUM_ACCOUNTS
+    assert [flush for flush in flushes if flush] == []
+    assert storage.count_transactions() == 2 * NUM_ACCOUNTS
+
+
+def test_reads_see_pending_writes_in_their_range(storage):
+    storage.add_transaction(Transaction(100, 1.0, 1, "Shop", "1"))
+    storage.flush()
+    storage.add_transaction(Transaction(200, 2.0, 1, "Shop", "1"))
+    assert storage.count_transactions_between("1", 150) == 1
+    assert storage._pending
+    assert [transaction.timestamp for transaction in storage.iter_transactions_between("1", 0, 150)] == [100]
+    assert storage._pending
+    assert [transaction.timestamp for transaction in storage.iter_transactions_between("1", 150)] == [200]
+    assert not storage._pending
+
+
+def test_half_read_iterators_do_not_hold_pooled_connections(storage):
+    for timestamp in range(100):
+        storage.add_transaction(Transaction(timestamp, 1.0, 1, "Shop", "1"))
+    storage.flush()
+    results = []
+
+    def read():
+        # Twice as many open iterators as the pool has connections.
+        iterators = [storage.iter_transactions_between("1", batch_size=10) for _ in range(8)]
+        iterators += [storage.iter_transactions("1", batch_size=10) for _ in range(8)]
+        for iterator in iterators:
+            next(iterator)
+        results.extend(1 + sum(1 for _ in iterator) for iterator in iterators)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    reader.join(timeout=10)
+    assert not reader.is_alive()
+    assert results == [100] * 16
@@ -0,0 +1,158 @@
+import random
+import threading
+import time
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+from conftest import register_request, reset_catalogues, transaction_request
+from fam import Fam
+from fam_commands import FamCommands
+from transaction_catalogue import TransactionCatalogue
+from transaction_partition import TransactionPartition
+
+NUM_ACCOUNTS = 3
+NUM_THREADS = 16
+TRANSACTIONS_PER_THREAD = 200
+BALANCE = 1000
+LIMITS = {"games_entertainment": 1e9, "clothing_accessories": 1e9, "eating_out": 1e9, "miscellaneous": 1e9}
+
+
+def test_many_threads_never_overdraw_an_account_or_tear_a_range():
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue())
+    commands = FamCommands(fam)
+    for number in range(NUM_ACCOUNTS):
+        assert commands.dispatch(register_request(number, balance=BALANCE, limits=LIMITS))["ok"]
+
+    accepted = [0] * NUM_ACCOUNTS
+    counter_lock = threading.Lock()
+    torn_ranges = []
+    done = threading.Event()
+
+    def write(thread):
+        generator = random.Random(thread)
+        for _ in range(TRANSACTIONS_PER_THREAD):
+            number = generator.randrange(NUM_ACCOUNTS)
+            # Backfilled timestamps make every recording an insert into the middle of the range.
+            request = transaction_request(number, amount=1.0, category=generator.randint(1, 4),
+                                          timestamp=generator.uniform(0, 1e6))
+            response = commands.dispatch(request)
+            assert response["ok"]
+            if response["result"]["status"] == "ACCEPTED":
+                with counter_lock:
+                    accepted[number] += 1
+
+    def read():
+        catalogue = fam.transaction_catalogue
+        while not done.is_set():
+            for number in range(NUM_ACCOUNTS):
+                transactions = []
+                for transaction in catalogue.iter_user_transactions_between(str(number), 1e5, 9e5):
+                    # Yields to the writers mid-iteration, as a slow consumer would.
+                    time.sleep(0)
+                    transactions.append(transaction)
+                timestamps = [transaction.timestamp for transaction in transactions]
+                if timestamps != sorted(timestamps) or len(set(map(id, transactions))) != len(transactions):
+                    torn_ranges.append(number)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    writers = [threading.Thread(target=write, args=(thread,)) for thread in range(NUM_THREADS)]
+    for thread in readers + writers:
+        thread.start()
+    for writer in writers:
+        writer.join()
+    done.set()
+    for reader in readers:
+        reader.join()
+
+    assert not torn_ranges
+    assert sum(accepted) <= NUM_THREADS * TRANSACTIONS_PER_THREAD
+    for number in range(NUM_ACCOUNTS):
+        bank_account = BankAccountCatalogue.get_user_bank_account(str(number))
+        transactions = list(fam.transaction_catalogue.iter_user_transactions(str(number)))
+        assert bank_account.bank_bal_cents >= 0
+        assert len(transactions) == accepted[number]
+        assert bank_account.bank_bal_cents == (BALANCE - accepted[number]) * 100
+        spent = sum(budget.spent_cents for budget in BudgetCatalogue.get_budgets_by_account_num(str(number)))
+        assert -spent == accepted[number] * 100
+
+
+def test_readers_creating_snapshot_partitions_do_not_drop_recorded_transactions(tmp_path, monkeypatch):
+    path = str(tmp_path / "fam.snapshot")
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue(), snapshot_path=path)
+    commands = FamCommands(fam)
+    for number in range(NUM_ACCOUNTS * 10):
+        assert commands.dispatch(register_request(number, limits=LIMITS))["ok"]
+        assert commands.dispatch(transaction_request(number))["ok"]
+    fam.checkpoint()
+    reset_catalogues()
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue(), snapshot_path=path)
+    commands = FamCommands(fam)
+    catalogue = fam.transaction_catalogue
+
+    # Widens the window between a partition being created and it being filed.
+    real_init = TransactionPartition.__init__
+
+    def slow_init(partition, *args):
+        real_init(partition, *args)
+        time.sleep(0.001)
+
+    monkeypatch.setattr(TransactionPartition, "__init__", slow_init)
+    readers = [lambda number: catalogue.get_user_transactions(number),
+               lambda number: list(catalogue.iter_user_transactions_between(number)),
+               lambda number: catalogue.count_user_transactions_between(number)]
+    threads = []
+    for number in range(NUM_ACCOUNTS * 10):
+        threads.append(threading.Thread(target=commands.dispatch, args=(transaction_request(number),)))
+        threads += [threading.Thread(target=read, args=(str(number),)) for read in readers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for number in range(NUM_ACCOUNTS * 10):
+        assert len(catalogue.get_user_transactions(str(number))) == 2
+
+
+def test_ranges_are_copied_a_page_at_a_time(monkeypatch):
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue())
+    commands = FamCommands(fam)
+    assert commands.dispatch(register_request(0, balance=1e9, limits=LIMITS))["ok"]
+    catalogue = fam.transaction_catalogue
+    for timestamp in range(1000):
+        catalogue.record_transaction(fam.get_user("0"), 1, 1.0, "Shop", timestamp // 3)
+
+    pages = []
+    real_page_between = TransactionPartition.page_between
+
+    def page_between(*args):
+        page, cursor = real_page_between(*args)
+        pages.append(len(page))
+        return page, cursor
+
+    monkeypatch.setattr(TransactionPartition, "page_between", page_between)
+    transactions = catalogue.iter_user_transactions_between("0", batch_size=100)
+    seen = [next(transactions)]
+    assert pages == [100]
+    # Back-fills between pages, some sharing a timestamp with the page boundary.
+    for timestamp in (10, 33, 33, 500):
+        catalogue.record_transaction(fam.get_user("0"), 1, 1.0, "Late", timestamp)
+    seen += transactions
+    timestamps = [transaction.timestamp for transaction in seen]
+    assert timestamps == sorted(timestamps)
+    assert len(set(map(id, seen))) == len(seen)
+    assert sum(transaction.merchant == "Shop" for transaction in seen) == 1000
+    assert [transaction.timestamp for transaction in seen if transaction.merchant == "Late"] == [33, 33, 500]
+
+
+def test_interactive_entry_reports_a_locked_account_before_asking_for_the_merchant(monkeypatch, capsys):
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue())
+    assert FamCommands(fam).dispatch(register_request(0, limits=LIMITS))["ok"]
+    BankAccountCatalogue.get_user_bank_account("0").lock_account()
+    prompts = []
+    answers = iter(["1", "5"])
+    monkeypatch.setattr("builtins.input", lambda prompt: prompts.append(prompt) or next(answers))
+
+    fam.transaction_catalogue.add_transaction(fam.get_user("0"))
+
+    assert "Enter merchant: " not in prompts
+    assert "Your account is locked" in capsys.readouterr().out
+    assert not list(fam.transaction_catalogue.iter_user_transactions("0"))
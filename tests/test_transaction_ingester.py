@@ -0,0 +1,25 @@
+import json
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+from conftest import register_request
+from fam import Fam
+from fam_commands import FamCommands
+from transaction_catalogue import TransactionCatalogue
+from transaction_ingester import TransactionIngester
+
+
+def test_bad_jsonl_lines_are_reported_and_skipped(tmp_path):
+    fam = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue())
+    FamCommands(fam).dispatch(register_request(1))
+    row = {"bank_account_number": "1", "budget_category": 1, "amount": 2.5, "merchant": "Shop",
+           "timestamp": 1700000000}
+    lines = [json.dumps(row), "{not json", json.dumps({**row, "amount": "inf"}), "[1, 2]",
+             json.dumps({**row, "timestamp": 1e400}), json.dumps(row)]
+    path = tmp_path / "rows.jsonl"
+    path.write_text("\n".join(lines) + "\n")
+
+    report = TransactionIngester(fam.transaction_catalogue, fam.user_list).ingest(str(path))
+
+    assert (report.rows, report.accepted, report.errors) == (6, 2, 4)
+    assert [row_number for row_number, _ in report.error_details] == [2, 3, 4, 5]
+    assert len(fam.transaction_catalogue.get_user_transactions("1")) == 2
@@ -0,0 +1,189 @@
+import os
+import threading
+import pytest
+import write_ahead_log as write_ahead_log_module
+from bank_account_catalogue import BankAccountCatalogue
+from budget_catalogue import BudgetCatalogue
+from conftest import register_request, reset_catalogues, transaction_request
+from fam import Fam
+from fam_commands import FamCommands
+from transaction_catalogue import TransactionCatalogue
+from write_ahead_log import WriteAheadLog
+
+NUM_ACCOUNTS = 4
+NUM_THREADS = 8
+
+
+def _open_fam(path, fsync_batch=1):
+    write_ahead_log = WriteAheadLog(str(path), fsync_batch=fsync_batch)
+    return Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue(), write_ahead_log), write_ahead_log
+
+
+def _merchants(fam):
+    return {transaction.merchant for transaction in fam.transaction_catalogue.iter_transactions()}
+
+
+@pytest.fixture
+def synced_sizes(monkeypatch):
+    """
+    Records how much of each file had been written when it was last fsynced. Everything past
+    that point is what a power failure may lose.
+    """
+    sizes = {}
+    real_fsync = os.fsync
+
+    def fsync(descriptor):
+        status = os.fstat(descriptor)
+        real_fsync(descriptor)
+        sizes[status.st_ino] = max(sizes.get(status.st_ino, 0), status.st_size)
+
+    monkeypatch.setattr(write_ahead_log_module.os, "fsync", fsync)
+    return sizes
+
+
+def _crash(path, write_ahead_log, synced_size):
+    """
+    Simulates a power failure: unsynced bytes are lost and a torn record is left at the end.
+    """
+    write_ahead_log._file.close()
+    with open(path, "r+b") as file:
+        file.truncate(synced_size)
+        file.seek(synced_size)
+        file.write(b'{"lsn":999999,"op":"add_tra')
+    reset_catalogues()
+
+
+def test_no_acknowledged_transaction_is_lost_after_a_crash(tmp_path, synced_sizes):
+    path = tmp_path / "fam.wal"
+    fam, write_ahead_log = _open_fam(path, fsync_batch=64)
+    commands = FamCommands(fam)
+    for number in range(NUM_ACCOUNTS):
+        assert commands.dispatch(register_request(number))["ok"]
+
+    acknowledged = []
+    stop = threading.Event()
+
+    def record(thread):
+        count = 0
+        while not stop.is_set() and count < 400:
+            merchant = f"t{thread}-{count}"
+            response = commands.dispatch(transaction_request(count % NUM_ACCOUNTS, amount=0.01, merchant=merchant))
+            if response["ok"] and response["result"]["status"] == "ACCEPTED":
+                acknowledged.append(merchant)
+            count += 1
+
+    threads = [threading.Thread(target=record, args=(thread,)) for thread in range(NUM_THREADS)]
+    for thread in threads:
+        thread.start()
+    while len(acknowledged) < 500 and any(thread.is_alive() for thread in threads):
+        threading.Event().wait(0.001)
+    # Whatever was acknowledged before the crash must have been synced before it, too.
+    acknowledged_before_crash = list(acknowledged)
+    synced_size = synced_sizes[os.stat(path).st_ino]
+    stop.set()
+    for thread in threads:
+        thread.join()
+    _crash(path, write_ahead_log, synced_size)
+
+    recovered, _ = _open_fam(path)
+    assert len(recovered.user_list) == NUM_ACCOUNTS
+    assert set(acknowledged_before_crash) <= _merchants(recovered)
+
+
+def test_unacknowledged_records_can_be_lost_but_acknowledged_cannot(tmp_path, synced_sizes):
+    path = tmp_path / "fam.wal"
+    fam, write_ahead_log = _open_fam(path, fsync_batch=1000)
+    FamCommands(fam).dispatch(register_request(1))
+    lsns = [fam.transaction_catalogue.record_transaction(fam.get_user("1"), 1, 1.0, f"m{count}",
+                                                         wait_durable=False).lsn for count in range(10)]
+    write_ahead_log.wait_durable(lsns[4])
+    assert write_ahead_log.durable_lsn >= lsns[4]
+    _crash(path, write_ahead_log, synced_sizes[os.stat(path).st_ino])
+
+    recovered, _ = _open_fam(path)
+    assert {f"m{count}" for count in range(5)} <= _merchants(recovered)
+
+
+def test_truncate_keeps_the_old_log_if_it_crashes_before_the_rename(tmp_path, monkeypatch):
+    path = tmp_path / "fam.wal"
+    fam, write_ahead_log = _open_fam(path)
+    FamCommands(fam).dispatch(register_request(1))
+    for count in range(5):
+        fam.transaction_catalogue.record_transaction(fam.get_user("1"), 1, 1.0, f"m{count}")
+
+    def crash(source, destination):
+        raise OSError("crashed before the rename")
+
+    monkeypatch.setattr(write_ahead_log_module.os, "replace", crash)
+    with pytest.raises(OSError):
+        write_ahead_log.truncate()
+    reset_catalogues()
+
+    recovered, _ = _open_fam(path)
+    assert _merchants(recovered) == {f"m{count}" for count in range(5)}
+
+
+def test_truncate_keeps_later_records_and_lsns_keep_counting(tmp_path):
+    path = tmp_path / "fam.wal"
+    fam, write_ahead_log = _open_fam(path)
+    FamCommands(fam).dispatch(register_request(1))
+    through_lsn = fam.transaction_catalogue.record_transaction(fam.get_user("1"), 1, 1.0, "before").lsn
+    fam.transaction_catalogue.record_transaction(fam.get_user("1"), 1, 1.0, "after")
+    last_lsn = write_ahead_log.last_lsn
+    write_ahead_log.truncate(through_lsn)
+    write_ahead_log.close()
+
+    reopened = WriteAheadLog(str(path))
+    assert reopened.last_lsn == last_lsn
+    assert [data["merchant"] for _, operation, data in reopened.read(through_lsn)
+            if operation == WriteAheadLog.ADD_TRANSACTION] == ["after"]
+    assert reopened.log(WriteAheadLog.CHECKPOINT, {}) == last_lsn + 1
+    reopened.close()
+
+
+def test_recovery_skips_transactions_on_unknown_accounts(tmp_path):
+    path = tmp_path / "fam.wal"
+    write_ahead_log = WriteAheadLog(str(path))
+    write_ahead_log.log(WriteAheadLog.ADD_TRANSACTION, {"timestamp": 1700000000, "amount": 1.0, "budget_category": 1,
+                                                        "merchant": "Shop", "bank_num": "404"})
+    write_ahead_log.close()
+
+    recovered, reopened = _open_fam(path)
+    assert reopened.skipped and reopened.skipped[0][0] == 1
+    assert not _merchants(recovered)
+
+
+def test_a_corrupt_record_before_the_end_is_not_cut_off(tmp_path):
+    path = tmp_path / "fam.wal"
+    fam, write_ahead_log = _open_fam(path)
+    FamCommands(fam).dispatch(register_request(1))
+    for count in range(3):
+        fam.transaction_catalogue.record_transaction(fam.get_user("1"), 1, 1.0, f"m{count}")
+    write_ahead_log.close()
+    lines = path.read_bytes().splitlines(keepends=True)
+    lines[-2] = b"{not json}\n"
+    path.write_bytes(b"".join(lines))
+    reset_catalogues()
+
+    with pytest.raises(ValueError):
+        WriteAheadLog(str(path))
+    assert path.read_bytes() == b"".join(lines)
+
+
+def test_recovery_does_not_count_checkpoint_markers(tmp_path):
+    path = tmp_path / "fam.wal"
+    write_ahead_log = WriteAheadLog(str(path))
+    write_ahead_log.log(WriteAheadLog.CHECKPOINT, {"lsn": 0})
+    write_ahead_log.close()
+    fam, write_ahead_log = _open_fam(path)
+    FamCommands(fam).dispatch(register_request(1))
+    write_ahead_log.close()
+    reset_catalogues()
+
+    reopened = WriteAheadLog(str(path))
+    operations = [operation for _, operation, _ in reopened.read()]
+    assert operations[0] == WriteAheadLog.CHECKPOINT
+    recovered = Fam(BankAccountCatalogue(), BudgetCatalogue(), TransactionCatalogue())
+    assert reopened.recover(recovered) == len(operations) - 1
+    assert len(recovered.user_list) == 1
+    reopened.close()
@@ -1,26 +1,70 @@
 from budget_types import BudgetType
+from money import Money
+import sys
 import time
 
 
 class Transaction:
     """
-    This class represents a transaction.
+    This class represents a transaction. The time of a transaction is kept as whole seconds since
+    the epoch and is only formatted when the transaction is displayed, and its amount as whole
+    cents. Transactions are slotted and share interned copies of their account numbers and
+    merchants, since a ledger holds millions of them.
     """
+    __slots__ = ("timestamp", "amount_cents", "budget_category", "merchant", "bank_num")
+    TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-    def __init__(self, timestamp: time, amount: float, budget_category: int, merchant: str, bank_num: str):
+    def __init__(self, timestamp: int, amount: float, budget_category: int, merchant: str, bank_num: str):
         """
         Constructor for Transaction class.
-        :param timestamp: time when transaction was recorded
+        :param timestamp: seconds since the epoch when transaction was recorded, or a legacy
+                          time string in TIME_FORMAT
         :param amount: amount of transaction
         :param budget_category: budget category of transaction
         :param merchant: merchant of transaction
         :param bank_num: bank number of user
         """
-        self.time = timestamp
-        self.amount = amount
+        self.timestamp = Transaction.to_epoch(timestamp)
+        self.amount_cents = Money.to_cents(amount)
         self.budget_category = budget_category
-        self.merchant = merchant
-        self.bank_num = bank_num
+        self.merchant = sys.intern(merchant)
+        self.bank_num = sys.intern(bank_num)
+
+    @staticmethod
+    def to_epoch(timestamp) -> int:
+        """
+        Converts a timestamp to whole seconds since the epoch. Strings in TIME_FORMAT, as stored
+        by earlier versions, are read as local time.
+        :param timestamp: an int, a float or a string
+        :return: an int
+        """
+        if isinstance(timestamp, str):
+            return int(time.mktime(time.strptime(timestamp, Transaction.TIME_FORMAT)))
+        return int(timestamp)
+
+    @property
+    def amount(self) -> float:
+        """
+        Returns the amount of the transaction in dollars.
+        :return: a float
+        """
+        return self.amount_cents / Money.CENTS_PER_DOLLAR
+
+    @amount.setter
+    def amount(self, updated: float) -> None:
+        """
+        Sets the amount of the transaction.
+        :param updated: a float, in dollars
+        """
+        self.amount_cents = Money.to_cents(updated)
+
+    @property
+    def time(self) -> str:
+        """
+        Returns the time of the transaction formatted in local time.
+        :return: a string
+        """
+        return time.strftime(Transaction.TIME_FORMAT, time.localtime(self.timestamp))
 
     def __str__(self):
         """
@@ -1,125 +1,603 @@
+from account_locks import AccountLockRegistry, WriterGate
 from transaction import Transaction
+from transaction_partition import TransactionPartition
+from transaction_result import TransactionResult
+from statement_renderer import StatementRenderer
+from monthly_rollups import MonthlyRollup, MonthlyRollups
+from merchant_index import MerchantIndex
+from money import Money
+from transaction_status import TransactionStatus
+from transaction_warning import TransactionWarning
 from budget_types import BudgetType
 from budget_catalogue import BudgetCatalogue
 from bank_account_catalogue import BankAccountCatalogue
+from itertools import chain
 import time
 
 
 class TransactionCatalogue:
     """
-    This class houses a list of all transactions.
+    This class houses all transactions. Every transaction is kept in a global chronological
+    list for auditing and in an append-only partition for its bank account. A columnar store can
+    be enabled on top of these for ledger-wide analytics.
+
+    Transactions loaded from a snapshot stay in the memory-mapped snapshot section and are only
+    decoded into an account's partition the first time that account is used. When a storage
+    backend is set, transactions are written to it and read back from it instead of being kept
+    in memory.
+
+    Each partition also keeps its transactions in timestamp order, so the transactions of an
+    account within a time range are found by bisection. A MerchantIndex finds an account's
+    transactions at a merchant and tracks the top merchants of every account and of the ledger.
+
+    The catalogue is safe to use from many threads. Each bank account has its own lock, so
+    transactions on one account are serialized while different accounts proceed in parallel.
     """
 
     _transactions = []
+    _partitions = {}
+    _columnar_store = None
+    _rollups = MonthlyRollups()
+    _merchant_index = MerchantIndex()
+    _write_ahead_log = None
+    _snapshot_section = None
+    _storage = None
+    _account_locks = AccountLockRegistry()
 
     def get_transactions(self):
         """
-        Getter for transaction list.
+        Getter for transaction list. Transactions still held in a snapshot section are not included;
+        use iter_transactions to see every transaction.
         :return: transaction list
         """
         return self._transactions
 
     def add_transaction(self, user):
         """
-        Adds a transaction to the transaction list.
+        Prompts the user for a transaction, records it and prints the resulting notifications.
+        :param user: a User
         """
         user_bank_account = BankAccountCatalogue.get_user_bank_account(user.bank_account_number)
 
-        while True:
-            # Get current timestamp
-            current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        # Get budget type
+        for budget_type in list(BudgetType):
+            print(budget_type.value, "\b.", budget_type.name)
+        budget_category = int(input("Select a budget category: "))
+
+        target_budget = \
+            BudgetCatalogue.filter_budget_by_bank_account_and_category(user.bank_account_number, budget_category)
+
+        # Exits to the main menu if the budget is locked out.
+        if user.is_over_lockout_threshold(target_budget.limit_cents, target_budget.spent_cents):
+            user.lockout_msg()
+            if user.is_lockout_action_required():
+                return
+        elif target_budget.is_budget_exceeded():
+            print(f"Notification: You have exceeded your budget limit of ${target_budget.limit:.2f}")
+
+        # Get transaction amount
+        amount = float(input("Enter amount: $"))
+        status = self._check_transaction(user, user_bank_account, target_budget, amount)
+        if status is not None:
+            self._print_status(user, user_bank_account, status)
+            return
 
-            # Get budget type
-            for budget_type in list(BudgetType):
-                print(budget_type.value, "\b.", budget_type.name)
-            budget_category = int(input("Select a budget category: "))
+        # Get merchant
+        merchant = input("Enter merchant: ")
 
+        result = self.record_transaction(user, budget_category, amount, merchant)
+        if result.status != TransactionStatus.ACCEPTED:
+            # Another transaction on the account may have changed it while the user was typing.
+            self._print_status(user, user_bank_account, result.status)
+            return
+        self._print_warnings(user, result)
+
+    @staticmethod
+    def _print_status(user, user_bank_account, status: TransactionStatus) -> None:
+        """
+        Prints why a transaction was not recorded.
+        :param user: a User
+        :param user_bank_account: a BankAccount
+        :param status: a TransactionStatus other than ACCEPTED
+        """
+        if status == TransactionStatus.ACCOUNT_LOCKED:
+            print("Notification: Your account is locked.")
+        elif status == TransactionStatus.BUDGET_LOCKED:
+            user.lockout_msg()
+        elif status == TransactionStatus.INVALID_AMOUNT:
+            print("Please enter a positive, non-zero number.")
+        elif status == TransactionStatus.INSUFFICIENT_FUNDS:
+            print("Notification: You have insufficient funds.")
+            print(f"Current bank account balance: ${user_bank_account.bank_bal}")
+
+    def record_transaction(self, user, budget_category, amount: float, merchant: str,
+                           timestamp: int = None, wait_durable: bool = True) -> TransactionResult:
+        """
+        Records a transaction without any prompts or output, applying the same budget and lockout
+        rules as add_transaction. The user supplies both the bank account and its user type rules.
+
+        With a write-ahead log, an accepted transaction is only returned once its log record is on
+        disk. Callers recording many transactions at once can pass wait_durable=False and call
+        wait_durable with the largest LSN of the batch before acknowledging any of them.
+        :param user: a User
+        :param budget_category: an int or a BudgetType
+        :param amount: a float
+        :param merchant: a string
+        :param timestamp: seconds since the epoch, or None for the current time
+        :param wait_durable: a boolean, whether to wait for the log record to be synced
+        :return: a TransactionResult
+        :raise ValueError: if the user has no bank account or no budget in the category
+        """
+        # The checks and the updates must not interleave with another transaction on the account,
+        # nor with a checkpoint.
+        with WriterGate.writer_for(TransactionCatalogue._write_ahead_log), self.account_lock(user.bank_account_number):
+            user_bank_account = BankAccountCatalogue.get_user_bank_account(user.bank_account_number)
             target_budget = \
                 BudgetCatalogue.filter_budget_by_bank_account_and_category(user.bank_account_number, budget_category)
+            if user_bank_account is None or target_budget is None:
+                raise ValueError(f"Bank account {user.bank_account_number} has no "
+                                 f"{BudgetType(budget_category).name} budget.")
 
-            # Exits to the main menu if the budget is locked out.
-            if user.is_over_lockout_threshold(target_budget.limit, target_budget.spent):
-                user.lockout_msg()
-                if user.is_lockout_action_required():
-                    return
-            elif target_budget.is_budget_exceeded():
-                print(f"Notification: You have exceeded your budget limit of ${target_budget.limit:.2f}")
+            status = self._check_transaction(user, user_bank_account, target_budget, amount)
+            if status is not None:
+                return TransactionResult(status)
 
-            # Get transaction amount
-            amount = float(input("Enter amount: $"))
-            if amount <= 0:
-                print("Please enter a positive, non-zero number.")
-                break
+            transaction = Transaction(time.time() if timestamp is None else timestamp, amount,
+                                      BudgetType(budget_category).value, merchant, user.bank_account_number)
+            lsn = None
+            if TransactionCatalogue._write_ahead_log is not None:
+                lsn = TransactionCatalogue._write_ahead_log.log_add_transaction(transaction)
+            warnings = self._apply_transaction(user, user_bank_account, target_budget, transaction)
 
-            # Stop transaction from being recorded if the user doesn't have sufficient funds
-            if amount > user_bank_account.bank_bal:
-                print("Notification: You have insufficient funds.")
-                print(f"Current bank account balance: ${user_bank_account.bank_bal}")
-                break
+        # The account is released first, so transactions waiting on other threads share the sync.
+        if wait_durable and lsn is not None:
+            self.wait_durable(lsn)
+        return TransactionResult(TransactionStatus.ACCEPTED, transaction, warnings, lsn)
 
-            # Adjust a Budget object
-            BudgetCatalogue.adjust_budget_details(user.bank_account_number, budget_category, amount)
+    def wait_durable(self, lsn: int = None) -> None:
+        """
+        Blocks until the write-ahead log is synced up to an LSN. Does nothing without a log.
+        :param lsn: an int, or None for everything logged so far
+        """
+        write_ahead_log = TransactionCatalogue._write_ahead_log
+        if write_ahead_log is not None:
+            write_ahead_log.wait_durable(write_ahead_log.last_lsn if lsn is None else lsn)
 
-            # Get merchant
-            merchant = input("Enter merchant: ")
+    def account_lock(self, bank_account_number: str):
+        """
+        Returns the lock that serializes transactions on a bank account.
+        :param bank_account_number: a string
+        :return: an RLock
+        """
+        return TransactionCatalogue._account_locks.lock_for(bank_account_number)
 
-            # Create a Transaction
-            transaction = Transaction(current_time, amount, budget_category, merchant, user.bank_account_number)
+    def replay_transaction(self, user, transaction: Transaction) -> list[TransactionWarning]:
+        """
+        Applies a previously accepted transaction again, for instance while recovering from a log.
+        The transaction is not checked against the budget and lockout rules a second time.
+        :param user: a User
+        :param transaction: a Transaction
+        :return: a list of TransactionWarnings raised by the transaction
+        :raise ValueError: if the bank account or the budget of the transaction does not exist
+        """
+        with self.account_lock(transaction.bank_num):
+            user_bank_account = BankAccountCatalogue.get_user_bank_account(transaction.bank_num)
+            target_budget = BudgetCatalogue.filter_budget_by_bank_account_and_category(
+                transaction.bank_num, transaction.budget_category)
+            if user_bank_account is None or target_budget is None:
+                raise ValueError(f"Bank account {transaction.bank_num} has no "
+                                 f"{BudgetType(transaction.budget_category).name} budget.")
+            return self._apply_transaction(user, user_bank_account, target_budget, transaction)
 
-            # Add the Transaction to the transaction list
-            self._transactions.append(transaction)
+    def set_write_ahead_log(self, write_ahead_log):
+        """
+        Logs every later accepted transaction to a write-ahead log before it is applied.
+        :param write_ahead_log: a WriteAheadLog, or None to stop logging
+        """
+        TransactionCatalogue._write_ahead_log = write_ahead_log
 
-            # check if the budget is locked out after this transaction
-            target_budget = \
-                BudgetCatalogue.filter_budget_by_bank_account_and_category(user.bank_account_number, budget_category)
+    @staticmethod
+    def _check_transaction(user, user_bank_account, target_budget, amount: float) -> TransactionStatus or None:
+        """
+        Returns why a transaction cannot be recorded.
+        :param user: a User
+        :param user_bank_account: a BankAccount
+        :param target_budget: a Budget
+        :param amount: a float
+        :return: a TransactionStatus, or None if the transaction can be recorded
+        """
+        if user_bank_account.is_locked:
+            return TransactionStatus.ACCOUNT_LOCKED
+        if user.is_over_lockout_threshold(target_budget.limit_cents, target_budget.spent_cents) \
+                and user.is_lockout_action_required():
+            return TransactionStatus.BUDGET_LOCKED
+        # Amounts are compared in whole cents, so an amount that rounds to nothing is not valid.
+        amount_cents = Money.to_cents(amount)
+        if amount_cents <= 0:
+            return TransactionStatus.INVALID_AMOUNT
+        if amount_cents > user_bank_account.bank_bal_cents:
+            return TransactionStatus.INSUFFICIENT_FUNDS
+        return None
+
+    def _apply_transaction(self, user, user_bank_account, target_budget, transaction) -> list[TransactionWarning]:
+        """
+        Stores a transaction, updates the budget and the bank balance, and applies the lockout rules.
+        :param user: a User
+        :param user_bank_account: a BankAccount
+        :param target_budget: a Budget
+        :param transaction: a Transaction
+        :return: a list of TransactionWarnings raised by the transaction
+        """
+        warnings = []
+
+        # Adjust the Budget and store the Transaction
+        was_over_threshold = user.is_over_lockout_threshold(target_budget.limit_cents, target_budget.spent_cents)
+        target_budget.add_spent_cents(transaction.amount_cents)
+        is_over_threshold = user.is_over_lockout_threshold(target_budget.limit_cents, target_budget.spent_cents)
+        BudgetCatalogue.update_budget_over_threshold(user, was_over_threshold, is_over_threshold)
+        self._store_transaction(transaction)
+
+        # Adjust a bank account balance
+        if user_bank_account.withdraw_cents(transaction.amount_cents):
+            warnings.append(TransactionWarning.LOW_BALANCE)
 
-            has_warning_or_lockout = False
+        if is_over_threshold:
+            warnings.append(TransactionWarning.BUDGET_LOCKED)
+        elif target_budget.is_budget_exceeded():
+            warnings.append(TransactionWarning.BUDGET_EXCEEDED)
+        elif user.is_exceed_warning_threshold(target_budget.limit_cents, target_budget.spent_cents):
+            warnings.append(TransactionWarning.WARNING_THRESHOLD)
 
-            # Adjust a bank account balance
-            user_bank_account.bank_bal -= amount
+        # Lock the user's account if the user type's lockout rule is met
+        if self._is_account_lockout_threshold_over(user, user_bank_account):
+            warnings.append(TransactionWarning.ACCOUNT_LOCKED)
 
-            if user.is_over_lockout_threshold(target_budget.limit, target_budget.spent):
+        # Lock the user's account if the bank account type's lockout rule is met
+        if user_bank_account.is_balance_negative():
+            warnings.append(TransactionWarning.BALANCE_DEPLETED)
+        if user_bank_account.is_over_limit(self):
+            warnings.append(TransactionWarning.TRANSACTION_LIMIT_REACHED)
+
+        BankAccountCatalogue.save_bank_account(user_bank_account)
+        BudgetCatalogue.save_budget(target_budget)
+        return warnings
+
+    def _print_warnings(self, user, result: TransactionResult) -> None:
+        """
+        Prints the notifications for a recorded transaction.
+        :param user: a User
+        :param result: a TransactionResult
+        """
+        transaction = result.transaction
+        for warning in result.warnings:
+            if warning == TransactionWarning.LOW_BALANCE:
+                print("Notification: Your bank account balance is less than $5.")
+            elif warning == TransactionWarning.BUDGET_LOCKED:
                 user.lockout_msg()
-                has_warning_or_lockout = True
-            elif target_budget.is_budget_exceeded():
+            elif warning == TransactionWarning.BUDGET_EXCEEDED:
+                target_budget = BudgetCatalogue.filter_budget_by_bank_account_and_category(
+                    transaction.bank_num, transaction.budget_category)
                 print(f"Notification: You have exceeded your budget limit of ${target_budget.limit:.2f}")
-                has_warning_or_lockout = True
-            elif user.is_exceed_warning_threshold(target_budget.limit, target_budget.spent):
+            elif warning == TransactionWarning.WARNING_THRESHOLD:
                 user.warning_msg()
-                has_warning_or_lockout = True
+            elif warning == TransactionWarning.ACCOUNT_LOCKED:
+                print('Notification: Your account is locked.')
+            elif warning == TransactionWarning.BALANCE_DEPLETED:
+                print("Locked: Your account is locked since the bank balance reached zero.")
+            elif warning == TransactionWarning.TRANSACTION_LIMIT_REACHED:
+                print("Locked: Your account is locked.")
 
             # Prints the transactions if the budget has any warning or notification
-            if has_warning_or_lockout:
-                self._print_filtered_transactions_by_budget(user.bank_account_number, budget_category)
+            if warning in (TransactionWarning.BUDGET_LOCKED, TransactionWarning.BUDGET_EXCEEDED,
+                           TransactionWarning.WARNING_THRESHOLD):
+                self._print_filtered_transactions_by_budget(transaction.bank_num, transaction.budget_category)
+
+    def clear(self):
+        """
+        Removes every transaction from the catalogue.
+        """
+        self._transactions.clear()
+        self._partitions.clear()
+        TransactionCatalogue._snapshot_section = None
+        TransactionCatalogue._rollups.clear()
+        TransactionCatalogue._merchant_index.clear()
+        if TransactionCatalogue._columnar_store is not None:
+            TransactionCatalogue._columnar_store = type(TransactionCatalogue._columnar_store)()
+
+    def enable_columnar_store(self):
+        """
+        Mirrors every transaction, including those already recorded, into a NumPy-backed columnar
+        store. NumPy is only imported when this is called.
+        :return: a ColumnarTransactionStore
+        """
+        if TransactionCatalogue._columnar_store is None:
+            from columnar_transaction_store import ColumnarTransactionStore
+            store = ColumnarTransactionStore()
+            store.extend(self.iter_transactions())
+            TransactionCatalogue._columnar_store = store
+        return TransactionCatalogue._columnar_store
+
+    def spend_by_category_per_month(self, bank_account_numbers=None) -> dict:
+        """
+        Totals the amount spent per calendar month (local time) and budget category. The columnar store is
+        used when it is enabled; otherwise the totals come from the monthly rollups.
+        :param bank_account_numbers: an iterable of strings, or None for every account
+        :return: a dict mapping ("YYYY-MM", BudgetType) to the total amount
+        """
+        if TransactionCatalogue._columnar_store is not None:
+            return TransactionCatalogue._columnar_store.spend_by_category_per_month(bank_account_numbers)
+        return self.get_rollups().spend_by_category_per_month(bank_account_numbers)
+
+    def get_rollups(self) -> MonthlyRollups:
+        """
+        Returns the monthly rollups of every account, first rebuilding them from the ledger if
+        transactions were loaded without going through record_transaction.
+        :return: a MonthlyRollups
+        """
+        rollups = TransactionCatalogue._rollups
+        if rollups.is_stale:
+            self.rebuild_rollups()
+        return rollups
+
+    def rebuild_rollups(self) -> None:
+        """
+        Recomputes the monthly rollups. With a storage backend the database totals them in one
+        GROUP BY query; otherwise every transaction in the ledger is read. Transactions recorded
+        while it runs may be counted twice, so call it when the ledger is quiet.
+        """
+        if TransactionCatalogue._storage is not None:
+            TransactionCatalogue._rollups.load(
+                (number, BudgetType(category), month, MonthlyRollup(total, count, smallest, largest))
+                for number, category, month, count, total, smallest, largest
+                in TransactionCatalogue._storage.monthly_rollups())
+        else:
+            TransactionCatalogue._rollups.rebuild(self.iter_transactions())
+
+    def get_merchant_index(self) -> MerchantIndex:
+        """
+        Returns the merchant index, first rebuilding it from the ledger if transactions were loaded
+        without going through record_transaction.
+        :return: a MerchantIndex
+        """
+        merchant_index = TransactionCatalogue._merchant_index
+        if merchant_index.is_stale:
+            merchant_index.rebuild(self.iter_transactions())
+        return merchant_index
+
+    def get_user_transactions_by_merchant(self, bank_account_number, merchant: str) -> list[Transaction]:
+        """
+        Retrieves the transactions of a bank account at one merchant.
+        :param bank_account_number: a string
+        :param merchant: a string
+        :return: a list of Transactions in the order they were recorded
+        """
+        merchant_index = self.get_merchant_index()
+        if merchant_index.keep_postings:
+            return merchant_index.get_transactions(bank_account_number, merchant)
+        return [transaction for transaction in self.iter_user_transactions(bank_account_number)
+                if transaction.merchant == merchant]
+
+    def set_merchant_postings(self, enabled: bool) -> None:
+        """
+        Turns the merchant index's inverted index on or off. It is on by default; turning it off
+        keeps only the top-merchant sketches in memory, and lookups by merchant then scan the
+        account's transactions. Turning it back on rebuilds it from the ledger on the next read.
+        :param enabled: a boolean
+        """
+        TransactionCatalogue._merchant_index.set_keep_postings(enabled)
+
+    def top_merchants(self, bank_account_number=None, budget_category: int = None, k: int = 10,
+                      by: str = "count") -> list:
+        """
+        Returns the estimated top merchants of a bank account, or of every account, by number of
+        transactions or by amount spent.
+        :param bank_account_number: a string, or None for every account
+        :param budget_category: an int, or None for every category
+        :param k: an int
+        :param by: "count" or "amount"
+        :return: a list of (merchant, estimate, error) tuples, heaviest first
+        """
+        category = None if budget_category is None else BudgetType(budget_category)
+        return self.get_merchant_index().top_merchants(bank_account_number, category, k, by)
+
+    def iter_transactions(self):
+        """
+        Iterates over the transactions of every account in the order they were recorded.
+        :return: an iterator of Transactions
+        """
+        if TransactionCatalogue._storage is not None:
+            return TransactionCatalogue._storage.iter_transactions()
+        if TransactionCatalogue._snapshot_section is None:
+            return iter(self._transactions)
+        return chain(TransactionCatalogue._snapshot_section.iter_transactions(), self._transactions)
+
+    def iter_user_transactions(self, bank_account_number, budget_category: int = None):
+        """
+        Iterates over the transactions of a bank account without loading them into its partition.
+        :param bank_account_number: a string
+        :param budget_category: an int, or None for every category
+        :return: an iterator of Transactions
+        """
+        if TransactionCatalogue._storage is not None:
+            return TransactionCatalogue._storage.iter_transactions(bank_account_number, budget_category)
+        partition = self._partitions.get(bank_account_number)
+        if partition is not None:
+            transactions = iter(partition)
+        elif TransactionCatalogue._snapshot_section is not None:
+            transactions = TransactionCatalogue._snapshot_section.iter_account_transactions(bank_account_number)
+        else:
+            return iter(())
+        if budget_category is None:
+            return transactions
+        return (transaction for transaction in transactions if transaction.budget_category == budget_category)
+
+    def iter_user_transactions_between(self, bank_account_number, start=None, end=None,
+                                       budget_category: int = None, batch_size: int = 1000):
+        """
+        Iterates over the transactions of a bank account with start <= timestamp < end, in
+        timestamp order. The range is found by bisection, so the cost is O(log n + k) for k
+        transactions in range. Transactions are copied a page of batch_size at a time under the
+        account lock, so transactions recorded while the caller iterates cannot shift the range,
+        and memory stays constant however long the range is.
+        :param bank_account_number: a string
+        :param start: seconds since the epoch, or None for no lower bound
+        :param end: seconds since the epoch, or None for no upper bound
+        :param budget_category: an int, or None for every category
+        :param batch_size: an int
+        :return: an iterator of Transactions
+        """
+        if TransactionCatalogue._storage is not None:
+            return TransactionCatalogue._storage.iter_transactions_between(bank_account_number, start, end,
+                                                                           budget_category, batch_size)
+        transactions = self._iter_partition_pages(bank_account_number, start, end, batch_size)
+        if budget_category is None:
+            return transactions
+        return (transaction for transaction in transactions if transaction.budget_category == budget_category)
+
+    def _iter_partition_pages(self, bank_account_number, start, end, batch_size: int):
+        """
+        Yields the transactions of a bank account's partition in a time range, copying one page at
+        a time under the account lock and resuming each page from the cursor of the one before.
+        :param bank_account_number: a string
+        :param start: seconds since the epoch, or None for no lower bound
+        :param end: seconds since the epoch, or None for no upper bound
+        :param batch_size: an int
+        :return: an iterator of Transactions
+        """
+        cursor = None
+        while True:
+            with self.account_lock(bank_account_number):
+                partition = self._get_partition(bank_account_number)
+                if partition is None:
+                    return
+                page, cursor = partition.page_between(start, end, cursor, batch_size)
+            yield from page
+            if len(page) < batch_size:
+                return
+
+    def get_user_transactions_between(self, bank_account_number, start=None, end=None) -> list[Transaction]:
+        """
+        Retrieves the transactions of a bank account with start <= timestamp < end, in timestamp
+        order.
+        :param bank_account_number: a string
+        :param start: seconds since the epoch, or None for no lower bound
+        :param end: seconds since the epoch, or None for no upper bound
+        :return: a list of Transactions
+        """
+        if TransactionCatalogue._storage is not None:
+            return list(TransactionCatalogue._storage.iter_transactions_between(bank_account_number, start, end))
+        with self.account_lock(bank_account_number):
+            partition = self._get_partition(bank_account_number)
+            return partition.get_transactions_between(start, end) if partition is not None else []
 
-            # Lock the user's account if the user type's lockout rule is met
-            self._is_account_lockout_threshold_over(user, user_bank_account)
+    def count_user_transactions_between(self, bank_account_number, start=None, end=None) -> int:
+        """
+        Returns the number of transactions of a bank account with start <= timestamp < end.
+        :param bank_account_number: a string
+        :param start: seconds since the epoch, or None for no lower bound
+        :param end: seconds since the epoch, or None for no upper bound
+        :return: an int
+        """
+        if TransactionCatalogue._storage is not None:
+            return TransactionCatalogue._storage.count_transactions_between(bank_account_number, start, end)
+        with self.account_lock(bank_account_number):
+            partition = self._get_partition(bank_account_number)
+            return partition.count_transactions_between(start, end) if partition is not None else 0
+
+    def set_storage(self, storage):
+        """
+        Keeps transactions in a storage backend instead of memory.
+        :param storage: an SQLiteStorage, or None for memory only
+        """
+        TransactionCatalogue._storage = storage
+        TransactionCatalogue._rollups.mark_stale()
+        TransactionCatalogue._merchant_index.mark_stale()
 
-            # Lock the user's account if the bank account type's lockout rule is met
-            user_bank_account.is_balance_negative()
-            return user_bank_account.is_over_limit(self)
+    def attach_snapshot_section(self, section, rollups=None):
+        """
+        Makes the transactions of a loaded snapshot available through the catalogue.
+        :param section: a SnapshotTransactionSection
+        :param rollups: the monthly rollups stored in the snapshot, in the form MonthlyRollups.load
+                        takes, or None to rebuild them from the transactions when they are needed
+        """
+        TransactionCatalogue._snapshot_section = section
+        if rollups is None:
+            TransactionCatalogue._rollups.mark_stale()
+        else:
+            TransactionCatalogue._rollups.load(rollups)
+        TransactionCatalogue._merchant_index.mark_stale()
+
+    def _get_partition(self, bank_account_number, create: bool = False) -> TransactionPartition or None:
+        """
+        Returns the partition of a bank account, starting it from its snapshot rows if needed. The
+        caller holds the account lock, so a reader cannot replace a partition a writer just created.
+        :param bank_account_number: a string
+        :param create: a boolean, whether to create an empty partition for a new account
+        :return: a TransactionPartition, or None
+        """
+        partition = self._partitions.get(bank_account_number)
+        if partition is not None:
+            return partition
+
+        section = TransactionCatalogue._snapshot_section
+        if section is not None and bank_account_number in section:
+            partition = TransactionPartition(bank_account_number, section)
+        elif create:
+            partition = TransactionPartition(bank_account_number)
+        else:
+            return None
+        self._partitions[bank_account_number] = partition
+        return partition
+
+    def _store_transaction(self, transaction: Transaction) -> None:
+        """
+        Appends a transaction to the global list and to its account's partition, or writes it to the
+        storage backend.
+        :param transaction: a Transaction
+        """
+        if TransactionCatalogue._storage is not None:
+            TransactionCatalogue._storage.add_transaction(transaction)
+        else:
+            self._transactions.append(transaction)
+            self._get_partition(transaction.bank_num, create=True).append(transaction)
+        if TransactionCatalogue._columnar_store is not None:
+            TransactionCatalogue._columnar_store.append(transaction)
+        TransactionCatalogue._rollups.add(transaction)
+        TransactionCatalogue._merchant_index.add(transaction)
 
     def get_user_transactions(self, bank_account_number) -> list[Transaction]:
         """
-        Retrieves all transactions for a bank account number and displays them.
+        Retrieves all transactions for a bank account number.
         :param bank_account_number: a string
         :return: a list of users' transactions
         """
-        user_transactions = []
-        for transaction in self.get_transactions():
-            if transaction.bank_num == bank_account_number:
-                user_transactions.append(transaction)
-        return user_transactions
+        if TransactionCatalogue._storage is not None:
+            return TransactionCatalogue._storage.load_transactions(bank_account_number)
+        with self.account_lock(bank_account_number):
+            partition = self._get_partition(bank_account_number)
+            return partition.get_transactions() if partition is not None else []
+
+    def get_user_transactions_by_category(self, bank_account_number, budget_category) -> list[Transaction]:
+        """
+        Retrieves the transactions of a bank account under one budget category.
+        :param bank_account_number: a string
+        :param budget_category: an int
+        :return: a list of users' transactions
+        """
+        if TransactionCatalogue._storage is not None:
+            return TransactionCatalogue._storage.load_transactions(bank_account_number, budget_category)
+        with self.account_lock(bank_account_number):
+            partition = self._get_partition(bank_account_number)
+            return partition.get_transactions_by_category(budget_category) if partition is not None else []
 
     def print_user_transactions(self, bank_account_number) -> None:
         """
-        Print out all transactions belong to the user.
+        Print out all transactions belong to the user. The transactions are streamed a page at a
+        time, so the whole history is never held in memory.
         :param bank_account_number: a string
         """
-        trans_list = self.get_user_transactions(bank_account_number)
-        for transaction in trans_list:
-            print(f"======== Transaction {trans_list.index(transaction) + 1} ========")
-            print(transaction)
+        renderer = StatementRenderer(self)
+        renderer.write_all(renderer.open(bank_account_number))
 
     def _print_filtered_transactions_by_budget(self, bank_account_number, budget_category):
         """
@@ -127,24 +605,22 @@ class TransactionCatalogue:
         :param bank_account_number: a string
         :param budget_category: an int
         """
-        user_transactions = self.get_user_transactions(bank_account_number)
-        filtered_transactions = \
-            [transaction for transaction in user_transactions if transaction.budget_category == budget_category]
         print(f"======== Transactions under {BudgetType(budget_category).name} ========")
-        for transaction in filtered_transactions:
-            print(transaction)
+        renderer = StatementRenderer(self)
+        renderer.write_all(renderer.open(bank_account_number, budget_category), numbered=False)
 
     @staticmethod
-    def _is_account_lockout_threshold_over(user, user_bank_account):
+    def _is_account_lockout_threshold_over(user, user_bank_account) -> bool:
         """
-        Locks the user's account if the user type's account lock out rule is met.
+        Locks the user's account if the user type's account lock out rule is met. The number of
+        locked budgets is kept up to date by BudgetCatalogue, so this does not walk the budgets.
 
         :param user: a User
         :param user_bank_account: a BankAccount
+        :return: True if the account was locked, otherwise False
         """
-        budgets = BudgetCatalogue.get_budgets_by_account_num(user.bank_account_number)
-        num_budgets = len(budgets)
-        locked_budget = [user.is_over_lockout_threshold(budget.limit, budget.spent) for budget in budgets]
-        if user.is_over_account_lockout_threshold(sum(locked_budget), num_budgets):
-            print('Notification: Your account is locked.')
+        num_budgets = BudgetCatalogue.count_budgets(user.bank_account_number)
+        if user.is_over_account_lockout_threshold(BudgetCatalogue.count_budgets_over_threshold(user), num_budgets):
             user_bank_account.lock_account()
+            return True
+        return False
@@ -0,0 +1,316 @@
+import csv
+import gzip
+import io
+import json
+import struct
+import sys
+import threading
+from array import array
+from concurrent.futures import Future
+from itertools import islice
+from budget_catalogue import BudgetCatalogue
+from money import Money
+from budget_types import BudgetType
+
+
+class TransactionExporter:
+    """
+    This class streams transactions and budget states out of the catalogues to CSV, JSON-lines or
+    a compact binary format, optionally gzip-compressed. Rows are pulled from the catalogues in
+    chunks and each chunk is formatted in one pass and handed to a large write buffer, so memory
+    stays bounded and the per-row cost is a tuple, not a formatted object.
+
+    Transaction exports use the same columns as TransactionIngester reads, so they can be ingested
+    again. The binary format is a header followed by blocks; each block lists the strings it
+    introduces and then holds one little-endian array per column, with strings stored as ids into
+    the table built up by the blocks so far.
+    """
+    FORMATS = ("csv", "jsonl", "binary")
+    CHUNK_SIZE = 10000
+    BUFFER_SIZE = 1 << 20
+    COMPRESS_LEVEL = 1
+
+    MAGIC = b"FAMEXP01"
+    TRANSACTIONS = 1
+    BUDGETS = 2
+    BLOCK_HEADER = struct.Struct("<II")
+    STRING_LENGTH = struct.Struct("<I")
+
+    # Column name and array type code for every kind of export; "s" marks a string column.
+    columns = {
+        TRANSACTIONS: (("timestamp", "q"), ("bank_account_number", "s"), ("budget_category", "B"),
+                       ("amount", "d"), ("merchant", "s")),
+        BUDGETS: (("bank_account_number", "s"), ("budget_category", "B"), ("limit", "d"), ("spent", "d"),
+                  ("is_locked", "b"))
+    }
+
+    def __init__(self, transaction_catalogue, budget_catalogue=BudgetCatalogue, users=(),
+                 chunk_size: int = CHUNK_SIZE):
+        """
+        Initialize the exporter.
+        :param transaction_catalogue: a TransactionCatalogue
+        :param budget_catalogue: a BudgetCatalogue
+        :param users: an iterable of Users, used to report whether their budgets are locked
+        :param chunk_size: an int, the number of rows formatted and written together
+        """
+        self._transaction_catalogue = transaction_catalogue
+        self._budget_catalogue = budget_catalogue
+        self._users = {user.bank_account_number: user for user in users}
+        self._chunk_size = chunk_size
+        self._category_names = {budget_type.value: budget_type.name for budget_type in BudgetType}
+
+    def export_transactions(self, path: str, file_format: str = None, bank_account_number: str = None,
+                            compress: bool = None) -> int:
+        """
+        Writes the transactions of one bank account, or of every account, to a file.
+        :param path: a string
+        :param file_format: "csv", "jsonl" or "binary", or None to use the file extension
+        :param bank_account_number: a string, or None for every account
+        :param compress: a boolean, or None to compress when the path ends in .gz
+        :return: the number of transactions written
+        """
+        if bank_account_number is None:
+            transactions = self._transaction_catalogue.iter_transactions()
+        else:
+            transactions = self._transaction_catalogue.iter_user_transactions(bank_account_number)
+        rows = ((transaction.timestamp, transaction.bank_num, transaction.budget_category, transaction.amount,
+                 transaction.merchant) for transaction in transactions)
+        return self._export(path, file_format, compress, TransactionExporter.TRANSACTIONS, rows)
+
+    def export_budgets(self, path: str, file_format: str = None, bank_account_number: str = None,
+                       compress: bool = None) -> int:
+        """
+        Writes the budgets of one bank account, or of every account, to a file. Spent is written as
+        a positive amount, and is_locked is left empty for budgets whose user is unknown.
+        :param path: a string
+        :param file_format: "csv", "jsonl" or "binary", or None to use the file extension
+        :param bank_account_number: a string, or None for every account
+        :param compress: a boolean, or None to compress when the path ends in .gz
+        :return: the number of budgets written
+        """
+        if bank_account_number is None:
+            budgets = self._budget_catalogue.get_budgets()
+        else:
+            budgets = self._budget_catalogue.get_budgets_by_account_num(bank_account_number)
+        rows = ((budget.bank_account_number, BudgetCatalogue.budget_category_map[type(budget)].value, budget.limit,
+                 Money.to_dollars(-budget.spent_cents), self._is_locked(budget)) for budget in list(budgets))
+        return self._export(path, file_format, compress, TransactionExporter.BUDGETS, rows)
+
+    @staticmethod
+    def in_background(export, *args, **kwargs) -> Future:
+        """
+        Runs an export on its own thread so recording can carry on meanwhile. Transactions recorded
+        while the export runs may or may not be included.
+        :param export: a bound export method, such as exporter.export_transactions
+        :param args: the positional arguments of the export
+        :param kwargs: the keyword arguments of the export
+        :return: a Future resolving to the number of rows written
+        """
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(export(*args, **kwargs))
+            except BaseException as error:
+                future.set_exception(error)
+
+        threading.Thread(target=run, name="fam-export", daemon=True).start()
+        return future
+
+    def _is_locked(self, budget) -> int:
+        """
+        Returns whether a budget is locked for its user.
+        :param budget: a Budget
+        :return: 1 or 0, or -1 if the user is unknown
+        """
+        user = self._users.get(budget.bank_account_number)
+        if user is None:
+            return -1
+        return int(user.is_over_lockout_threshold(budget.limit_cents, budget.spent_cents) and user.is_lockout_action_required())
+
+    def _export(self, path: str, file_format: str, compress: bool, kind: int, rows) -> int:
+        """
+        Opens the output file and writes every row in the requested format.
+        :param path: a string
+        :param file_format: a string, or None to use the file extension
+        :param compress: a boolean, or None to use the file extension
+        :param kind: TRANSACTIONS or BUDGETS
+        :param rows: an iterable of tuples in the order of the kind's columns
+        :return: the number of rows written
+        """
+        name = path.lower()
+        if compress is None:
+            compress = name.endswith(".gz")
+        if file_format is None:
+            name = name[:-3] if name.endswith(".gz") else name
+            file_format = "csv" if name.endswith(".csv") else "binary" if name.endswith(".bin") else "jsonl"
+        if file_format not in TransactionExporter.FORMATS:
+            raise ValueError(f"Unsupported file format: {file_format}")
+
+        with open(path, "wb", buffering=TransactionExporter.BUFFER_SIZE) as raw:
+            stream = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=TransactionExporter.COMPRESS_LEVEL) \
+                if compress else raw
+            try:
+                if file_format == "binary":
+                    return self._write_binary(stream, kind, rows)
+                text = io.TextIOWrapper(stream, encoding="utf-8", newline="", write_through=False)
+                try:
+                    if file_format == "csv":
+                        return self._write_csv(text, kind, rows)
+                    return self._write_jsonl(text, kind, rows)
+                finally:
+                    text.flush()
+                    text.detach()
+            finally:
+                if compress:
+                    stream.close()
+
+    def _chunks(self, rows):
+        """
+        Splits rows into lists of chunk_size.
+        :param rows: an iterable
+        :return: an iterator of lists
+        """
+        rows = iter(rows)
+        while chunk := list(islice(rows, self._chunk_size)):
+            yield chunk
+
+    def _write_csv(self, text, kind: int, rows) -> int:
+        """
+        Writes rows as CSV with a header line, budget categories by name.
+        :param text: a text stream
+        :param kind: TRANSACTIONS or BUDGETS
+        :param rows: an iterable of tuples
+        :return: the number of rows written
+        """
+        names = self._category_names
+        writer = csv.writer(text)
+        writer.writerow([name for name, _ in TransactionExporter.columns[kind]])
+        count = 0
+        for chunk in self._chunks(rows):
+            if kind == TransactionExporter.TRANSACTIONS:
+                writer.writerows((timestamp, account, names[category], amount, merchant)
+                                 for timestamp, account, category, amount, merchant in chunk)
+            else:
+                writer.writerows((account, names[category], limit, spent, "" if locked < 0 else bool(locked))
+                                 for account, category, limit, spent, locked in chunk)
+            count += len(chunk)
+        return count
+
+    def _write_jsonl(self, text, kind: int, rows) -> int:
+        """
+        Writes rows as one JSON object per line, budget categories by name. Each distinct string is
+        escaped once and the lines are filled in from a template.
+        :param text: a text stream
+        :param kind: TRANSACTIONS or BUDGETS
+        :param rows: an iterable of tuples
+        :return: the number of rows written
+        """
+        columns = TransactionExporter.columns[kind]
+        fields = {"q": "%d", "d": "%r", "b": "%s", "B": "%s", "s": "%s"}
+        template = "{" + ", ".join(f'"{name}": {fields[code]}' for name, code in columns) + "}\n"
+        strings = {}
+
+        def quote(value: str) -> str:
+            quoted = strings.get(value)
+            if quoted is None:
+                quoted = strings[value] = json.dumps(value)
+            return quoted
+
+        for number, name in self._category_names.items():
+            strings[number] = json.dumps(name)
+        count = 0
+        for chunk in self._chunks(rows):
+            if kind == TransactionExporter.TRANSACTIONS:
+                lines = [template % (timestamp, quote(account), strings[category], amount, quote(merchant))
+                         for timestamp, account, category, amount, merchant in chunk]
+            else:
+                lines = [template % (quote(account), strings[category], limit, spent,
+                                     "null" if locked < 0 else "true" if locked else "false")
+                         for account, category, limit, spent, locked in chunk]
+            text.write("".join(lines))
+            count += len(chunk)
+        return count
+
+    def _write_binary(self, stream, kind: int, rows) -> int:
+        """
+        Writes rows in the binary block format.
+        :param stream: a binary stream
+        :param kind: TRANSACTIONS or BUDGETS
+        :param rows: an iterable of tuples
+        :return: the number of rows written
+        """
+        columns = TransactionExporter.columns[kind]
+        stream.write(TransactionExporter.MAGIC + bytes([kind]))
+        string_ids = {}
+        count = 0
+        for chunk in self._chunks(rows):
+            new_strings = []
+            arrays = []
+            for index, (_, code) in enumerate(columns):
+                values = [row[index] for row in chunk]
+                if code == "s":
+                    ids = array("I")
+                    for value in values:
+                        string_id = string_ids.get(value)
+                        if string_id is None:
+                            string_id = string_ids[value] = len(string_ids)
+                            new_strings.append(value)
+                        ids.append(string_id)
+                    arrays.append(ids)
+                else:
+                    arrays.append(array(code, values))
+
+            parts = [TransactionExporter.BLOCK_HEADER.pack(len(chunk), len(new_strings))]
+            for value in new_strings:
+                encoded = value.encode()
+                parts.append(TransactionExporter.STRING_LENGTH.pack(len(encoded)))
+                parts.append(encoded)
+            for column in arrays:
+                if sys.byteorder == "big":
+                    column.byteswap()
+                parts.append(column.tobytes())
+            stream.write(b"".join(parts))
+            count += len(chunk)
+        return count
+
+    @staticmethod
+    def read_binary(path: str):
+        """
+        Streams the rows of a binary export as dicts with the same keys as the CSV and JSON-lines
+        exports, so a transaction export can be passed straight to TransactionIngester.ingest_rows.
+        :param path: a string, compressed when it ends in .gz
+        :return: an iterator of dicts
+        """
+        opener = gzip.open if path.lower().endswith(".gz") else open
+        with opener(path, "rb") as stream:
+            header = stream.read(len(TransactionExporter.MAGIC) + 1)
+            if header[:-1] != TransactionExporter.MAGIC:
+                raise ValueError(f"{path} is not a binary export.")
+            columns = TransactionExporter.columns[header[-1]]
+            category_names = {budget_type.value: budget_type.name for budget_type in BudgetType}
+            strings = []
+            while block := stream.read(TransactionExporter.BLOCK_HEADER.size):
+                num_rows, num_strings = TransactionExporter.BLOCK_HEADER.unpack(block)
+                for _ in range(num_strings):
+                    (length,) = TransactionExporter.STRING_LENGTH.unpack(stream.read(TransactionExporter.STRING_LENGTH.size))
+                    strings.append(stream.read(length).decode())
+                values = []
+                for name, code in columns:
+                    column = array("I" if code == "s" else code)
+                    column.frombytes(stream.read(column.itemsize * num_rows))
+                    if sys.byteorder == "big":
+                        column.byteswap()
+                    if code == "s":
+                        values.append([strings[string_id] for string_id in column])
+                    elif name == "budget_category":
+                        values.append([category_names[category] for category in column])
+                    elif name == "is_locked":
+                        values.append([None if locked < 0 else bool(locked) for locked in column])
+                    else:
+                        values.append(column.tolist())
+                names = [name for name, _ in columns]
+                for row in zip(*values):
+                    yield dict(zip(names, row))
@@ -0,0 +1,191 @@
+import csv
+import json
+import time
+from itertools import islice
+from budget_types import BudgetType
+from transaction_catalogue import TransactionCatalogue
+from transaction_status import TransactionStatus
+
+
+class IngestReport:
+    """
+    This class keeps the running totals of a bulk ingest. The first MAX_ERROR_DETAILS rows that
+    could not be read are kept as (row number, error) pairs.
+    """
+    MAX_ERROR_DETAILS = 100
+
+    def __init__(self):
+        self.rows = 0
+        self.errors = 0
+        self.error_details = []
+        self.status_counts = {status: 0 for status in TransactionStatus}
+        self.warning_counts = {}
+        self._started = time.perf_counter()
+        self._finished = None
+
+    @property
+    def accepted(self) -> int:
+        """
+        Returns the number of transactions that were recorded.
+        :return: an int
+        """
+        return self.status_counts[TransactionStatus.ACCEPTED]
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Returns the seconds spent ingesting so far.
+        :return: a float
+        """
+        end = self._finished if self._finished is not None else time.perf_counter()
+        return end - self._started
+
+    @property
+    def rows_per_second(self) -> float:
+        """
+        Returns the ingest throughput.
+        :return: a float
+        """
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def add_error(self, error: Exception) -> None:
+        """
+        Counts a row that could not be read.
+        :param error: the exception it raised
+        """
+        self.errors += 1
+        if len(self.error_details) < IngestReport.MAX_ERROR_DETAILS:
+            self.error_details.append((self.rows, f"{type(error).__name__}: {error}"))
+
+    def finish(self) -> None:
+        """
+        Stops the clock.
+        """
+        self._finished = time.perf_counter()
+
+    def __str__(self):
+        rejected = ", ".join(f"{status.name}: {count}" for status, count in self.status_counts.items()
+                             if count and status != TransactionStatus.ACCEPTED)
+        return (f"Rows: {self.rows}\n"
+                f"Accepted: {self.accepted}\n"
+                f"Rejected: {rejected or 0}\n"
+                f"Errors: {self.errors}\n"
+                f"Throughput: {self.rows_per_second:.0f} rows/s")
+
+
+class TransactionIngester:
+    """
+    This class streams transactions from CSV or JSON-lines files into a TransactionCatalogue. Rows
+    are read lazily and handled in fixed-size chunks, so memory use does not grow with the file.
+
+    Every row needs a bank_account_number, budget_category (number or name), amount and merchant;
+    timestamp is optional and may be epoch seconds or a '%Y-%m-%d %H:%M:%S' string. Rows that
+    cannot be read, including JSON lines that do not parse, are counted in the report and skipped.
+
+    With a write-ahead log, the log is synced once per chunk rather than once per row, and a
+    chunk is only counted in the report once its rows are on disk.
+    """
+    CHUNK_SIZE = 10000
+
+    def __init__(self, transaction_catalogue: TransactionCatalogue, users, chunk_size: int = CHUNK_SIZE):
+        """
+        Initialize the ingester.
+        :param transaction_catalogue: a TransactionCatalogue
+        :param users: an iterable of Users whose accounts may appear in the files
+        :param chunk_size: an int, the number of rows handled between progress reports
+        """
+        self._transaction_catalogue = transaction_catalogue
+        self._users = {user.bank_account_number: user for user in users}
+        self._chunk_size = chunk_size
+
+    def ingest(self, path: str, file_format: str = None, progress=None) -> IngestReport:
+        """
+        Records every row of a file.
+        :param path: a string, the path of a .csv or .jsonl file
+        :param file_format: "csv" or "jsonl", or None to use the file extension
+        :param progress: a callable taking the IngestReport, called after every chunk
+        :return: an IngestReport
+        """
+        if file_format is None:
+            file_format = "csv" if path.lower().endswith(".csv") else "jsonl"
+
+        with open(path, newline="", encoding="utf-8") as file:
+            if file_format == "csv":
+                rows = csv.DictReader(file)
+            elif file_format == "jsonl":
+                # Lines are decoded one at a time in _ingest_row, so a bad line only skips itself.
+                rows = (line for line in file if line.strip())
+            else:
+                raise ValueError(f"Unsupported file format: {file_format}")
+            return self.ingest_rows(rows, progress)
+
+    def ingest_rows(self, rows, progress=None) -> IngestReport:
+        """
+        Records every row of an iterable of dicts or JSON-encoded lines.
+        :param rows: an iterable of dicts or strings
+        :param progress: a callable taking the IngestReport, called after every chunk
+        :return: an IngestReport
+        """
+        report = IngestReport()
+        rows = iter(rows)
+        while chunk := list(islice(rows, self._chunk_size)):
+            for row in chunk:
+                self._ingest_row(row, report)
+            self._transaction_catalogue.wait_durable()
+            if progress is not None:
+                progress(report)
+        report.finish()
+        return report
+
+    def _ingest_row(self, row: dict, report: IngestReport) -> None:
+        """
+        Records one row and adds its outcome to the report.
+        :param row: a dict, or a string holding one JSON object
+        :param report: an IngestReport
+        """
+        report.rows += 1
+        try:
+            if isinstance(row, str):
+                row = json.loads(row)
+            if not isinstance(row, dict):
+                raise TypeError("Row is not an object.")
+            user = self._users[str(row["bank_account_number"])]
+            timestamp = self._parse_timestamp(row.get("timestamp"))
+            result = self._transaction_catalogue.record_transaction(
+                user, self._parse_category(row["budget_category"]), float(row["amount"]), row["merchant"], timestamp,
+                wait_durable=False)
+        except (KeyError, ValueError, TypeError, OverflowError) as error:
+            report.add_error(error)
+            return
+
+        report.status_counts[result.status] += 1
+        for warning in result.warnings:
+            report.warning_counts[warning] = report.warning_counts.get(warning, 0) + 1
+
+    @staticmethod
+    def _parse_timestamp(value):
+        """
+        Reads an optional timestamp given as epoch seconds or a legacy time string.
+        :param value: a number, a string or None
+        :return: a number, a string, or None for the current time
+        """
+        if value in (None, ""):
+            return None
+        if isinstance(value, str):
+            try:
+                return float(value)
+            except ValueError:
+                return value
+        return value
+
+    @staticmethod
+    def _parse_category(value) -> BudgetType:
+        """
+        Reads a budget category given as a number or a name.
+        :param value: an int or a string
+        :return: a BudgetType
+        """
+        if isinstance(value, str) and not value.strip().isdigit():
+            return BudgetType[value.strip().upper()]
+        return BudgetType(int(value))
@@ -0,0 +1,228 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from itertools import chain, islice
+from operator import attrgetter
+from transaction import Transaction
+
+
+class TransactionPartition:
+    """
+    This class houses the transactions of a single bank account. Transactions are only ever
+    appended, and each one is also filed under its budget category.
+
+    The partition also keeps the transactions in timestamp order for range queries. Transactions
+    arriving in order are appended to that index directly. Back-filled ones that are older than
+    the newest indexed transaction wait in a buffer and are merged in before the next range query,
+    so a bulk import of old transactions pays for one merge instead of one insert each.
+
+    A partition can start from the account's rows in a snapshot section. Those rows are only
+    decoded the first time the partition is read, so appending to it stays cheap.
+    """
+    # Buffered back-fills are inserted one by one below this count and merged with a sort above it.
+    # Each insert shifts the end of the index, so a few of them cost about as much as one merge.
+    MERGE_THRESHOLD = 64
+
+    def __init__(self, bank_account_number: str, snapshot_section=None):
+        """
+        Initialize a partition for a bank account.
+        :param bank_account_number: a string
+        :param snapshot_section: a SnapshotTransactionSection holding the account's earlier
+                                 transactions, or None to start empty
+        """
+        self._bank_account_number = bank_account_number
+        self._transactions = []
+        self._by_category = {}
+        self._by_time = []
+        self._times = []
+        self._backfilled = []
+        self._snapshot_section = snapshot_section
+
+    @property
+    def bank_account_number(self) -> str:
+        """
+        Returns the bank account number the partition belongs to.
+        :return: a string
+        """
+        return self._bank_account_number
+
+    def append(self, transaction: Transaction) -> None:
+        """
+        Adds a transaction to the partition, to its category index and to the time index.
+        :param transaction: a Transaction
+        """
+        self._transactions.append(transaction)
+        self._by_category.setdefault(transaction.budget_category, []).append(transaction)
+        if self._backfilled or (self._times and transaction.timestamp < self._times[-1]):
+            self._backfilled.append(transaction)
+        else:
+            self._times.append(transaction.timestamp)
+            self._by_time.append(transaction)
+
+    def _merge_backfilled(self) -> None:
+        """
+        Moves buffered back-filled transactions into the time index. Transactions with equal
+        timestamps stay in the order they were appended.
+
+        A few back-fills are inserted one at a time, each an O(n) list insert for an index of n
+        transactions; below MERGE_THRESHOLD these shifts are cheaper than re-sorting. A larger
+        buffer is sorted on its own and merged with the index in O(n + k log k) for k back-fills.
+        """
+        if not self._backfilled:
+            return
+        backfilled, self._backfilled = self._backfilled, []
+        if len(backfilled) < TransactionPartition.MERGE_THRESHOLD:
+            for transaction in backfilled:
+                position = bisect_right(self._times, transaction.timestamp)
+                self._times.insert(position, transaction.timestamp)
+                self._by_time.insert(position, transaction)
+        else:
+            # Once the buffer is sorted, the index and the buffer are two runs, which the sort
+            # merges in linear time.
+            backfilled.sort(key=attrgetter("timestamp"))
+            self._by_time.extend(backfilled)
+            self._by_time.sort(key=attrgetter("timestamp"))
+            self._times = [transaction.timestamp for transaction in self._by_time]
+
+    def _load_snapshot_rows(self) -> None:
+        """
+        Decodes the snapshot rows of the account ahead of the transactions appended since.
+        """
+        if self._snapshot_section is None:
+            return
+        section, self._snapshot_section = self._snapshot_section, None
+        appended = self._transactions
+        self._transactions = []
+        self._by_category = {}
+        self._by_time = []
+        self._times = []
+        self._backfilled = []
+        for transaction in chain(section.iter_account_transactions(self._bank_account_number), appended):
+            self.append(transaction)
+
+    def _index_bounds(self, start, end) -> tuple:
+        """
+        Returns the positions in the time index of a timestamp range.
+        :param start: a number, the earliest timestamp included, or None for no bound
+        :param end: a number, the timestamp the range stops before, or None for no bound
+        :return: a (first, stop) tuple
+        """
+        self._merge_backfilled()
+        first = 0 if start is None else bisect_left(self._times, start)
+        stop = len(self._times) if end is None else bisect_left(self._times, end)
+        return first, max(first, stop)
+
+    def _iter_index(self, first: int, stop: int):
+        """
+        Iterates over a stretch of the time index.
+        :param first: an int
+        :param stop: an int
+        :return: an iterator of Transactions
+        """
+        by_time = self._by_time
+        for position in range(first, stop):
+            yield by_time[position]
+
+    def get_transactions(self) -> list[Transaction]:
+        """
+        Returns every transaction of the account in the order they were recorded.
+        :return: a list of Transactions
+        """
+        self._load_snapshot_rows()
+        return list(self._transactions)
+
+    def get_transactions_by_category(self, budget_category: int) -> list[Transaction]:
+        """
+        Returns the transactions of the account under one budget category.
+        :param budget_category: an int
+        :return: a list of Transactions
+        """
+        self._load_snapshot_rows()
+        return list(self._by_category.get(budget_category, ()))
+
+    def get_transactions_between(self, start=None, end=None) -> list[Transaction]:
+        """
+        Returns the transactions with start <= timestamp < end, in timestamp order.
+        :param start: a number, or None for no lower bound
+        :param end: a number, or None for no upper bound
+        :return: a list of Transactions
+        """
+        if self._snapshot_section is not None:
+            return list(self.iter_transactions_between(start, end))
+        first, stop = self._index_bounds(start, end)
+        return self._by_time[first:stop]
+
+    def iter_transactions_between(self, start=None, end=None):
+        """
+        Iterates over the transactions with start <= timestamp < end, in timestamp order. Rows
+        still in a time-ordered snapshot section are found by bisecting the section itself, so the
+        partition does not have to be decoded first.
+        :param start: a number, or None for no lower bound
+        :param end: a number, or None for no upper bound
+        :return: an iterator of Transactions
+        """
+        section = self._snapshot_section
+        if section is not None and not section.is_time_ordered(self._bank_account_number):
+            self._load_snapshot_rows()
+            section = None
+        first, stop = self._index_bounds(start, end)
+        if section is None:
+            return self._iter_index(first, stop)
+        rows = section.account_rows_between(self._bank_account_number, start, end)
+        return heapq.merge((section.transaction(row) for row in rows), self._iter_index(first, stop),
+                           key=attrgetter("timestamp"))
+
+    def page_between(self, start=None, end=None, after=None, limit: int = 1000) -> tuple:
+        """
+        Returns the next page of transactions with start <= timestamp < end, in timestamp order.
+        A page resumes from the cursor the previous one returned: the timestamp of its last
+        transaction and how many transactions with that timestamp have been returned. Back-fills
+        with an equal timestamp are placed after the transactions already there, so the cursor
+        stays valid when transactions are added between pages.
+        :param start: a number, or None for no lower bound
+        :param end: a number, or None for no upper bound
+        :param after: a (timestamp, count) cursor, or None to start at the beginning of the range
+        :param limit: an int, the most transactions to return
+        :return: a (list of Transactions, cursor) tuple; the list is shorter than limit only at the
+                 end of the range
+        """
+        skip = 0
+        if after is not None:
+            start, skip = after
+        page = list(islice(self.iter_transactions_between(start, end), skip, skip + limit))
+        if not page:
+            return page, after
+        last = page[-1].timestamp
+        count = 0
+        for transaction in reversed(page):
+            if transaction.timestamp != last:
+                break
+            count += 1
+        if after is not None and last == after[0]:
+            count += skip
+        return page, (last, count)
+
+    def count_transactions_between(self, start=None, end=None) -> int:
+        """
+        Returns the number of transactions with start <= timestamp < end.
+        :param start: a number, or None for no lower bound
+        :param end: a number, or None for no upper bound
+        :return: an int
+        """
+        section = self._snapshot_section
+        if section is not None and not section.is_time_ordered(self._bank_account_number):
+            self._load_snapshot_rows()
+            section = None
+        first, stop = self._index_bounds(start, end)
+        if section is None:
+            return stop - first
+        return len(section.account_rows_between(self._bank_account_number, start, end)) + stop - first
+
+    def __len__(self):
+        if self._snapshot_section is None:
+            return len(self._transactions)
+        return len(self._snapshot_section.account_rows(self._bank_account_number)) + len(self._transactions)
+
+    def __iter__(self):
+        if self._snapshot_section is None:
+            return iter(self._transactions)
+        return chain(self._snapshot_section.iter_account_transactions(self._bank_account_number), self._transactions)
@@ -0,0 +1,69 @@
+from transaction import Transaction
+from transaction_status import TransactionStatus
+from transaction_warning import TransactionWarning
+
+
+class TransactionResult:
+    """
+    This class represents the outcome of recording a transaction: its status, the Transaction
+    that was stored if it was accepted, any warnings the transaction raised and the LSN of its
+    write-ahead log record.
+    """
+
+    def __init__(self, status: TransactionStatus, transaction: Transaction = None,
+                 warnings: list[TransactionWarning] = None, lsn: int = None):
+        """
+        Initialize the TransactionResult.
+        :param status: a TransactionStatus
+        :param transaction: the recorded Transaction, or None if it was rejected
+        :param warnings: a list of TransactionWarnings
+        :param lsn: an int, the LSN of the log record, or None without a write-ahead log
+        """
+        self._status = status
+        self._transaction = transaction
+        self._warnings = warnings or []
+        self._lsn = lsn
+
+    @property
+    def status(self) -> TransactionStatus:
+        """
+        Returns the status of the transaction.
+        :return: a TransactionStatus
+        """
+        return self._status
+
+    @property
+    def transaction(self) -> Transaction:
+        """
+        Returns the recorded transaction.
+        :return: a Transaction, or None if it was rejected
+        """
+        return self._transaction
+
+    @property
+    def warnings(self) -> list[TransactionWarning]:
+        """
+        Returns the warnings raised by the transaction, in the order they were raised.
+        :return: a list of TransactionWarnings
+        """
+        return self._warnings
+
+    @property
+    def lsn(self) -> int or None:
+        """
+        Returns the LSN of the write-ahead log record of the transaction.
+        :return: an int, or None if it was rejected or nothing is logged
+        """
+        return self._lsn
+
+    @property
+    def is_accepted(self) -> bool:
+        """
+        Returns if the transaction was recorded.
+        :return: a boolean
+        """
+        return self._status == TransactionStatus.ACCEPTED
+
+    def __repr__(self):
+        return (f"TransactionResult(status={self._status.name}, "
+                f"warnings={[warning.name for warning in self._warnings]})")
@@ -0,0 +1,12 @@
+from enum import Enum
+
+
+class TransactionStatus(Enum):
+    """
+    Outcomes of recording a transaction.
+    """
+    ACCEPTED = 1
+    INSUFFICIENT_FUNDS = 2
+    BUDGET_LOCKED = 3
+    ACCOUNT_LOCKED = 4
+    INVALID_AMOUNT = 5
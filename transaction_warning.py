@@ -0,0 +1,14 @@
+from enum import Enum
+
+
+class TransactionWarning(Enum):
+    """
+    Notifications raised by an accepted transaction.
+    """
+    LOW_BALANCE = 1
+    BUDGET_LOCKED = 2
+    BUDGET_EXCEEDED = 3
+    WARNING_THRESHOLD = 4
+    ACCOUNT_LOCKED = 5
+    BALANCE_DEPLETED = 6
+    TRANSACTION_LIMIT_REACHED = 7
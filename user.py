@@ -1,15 +1,20 @@
 from abc import ABC, abstractmethod
+import sys
 from datetime import datetime
 
 
 class User(ABC):
     """
-    This class represents a single user (AKA a single child).
+    This class represents a single user (AKA a single child). The budget rules compare a limit
+    with the (negative) amount spent, both in the same unit; the catalogues pass whole cents.
+    Users are slotted and share an interned copy of their bank account number.
     """
+    __slots__ = ("_name", "_dob", "_bank_account_number", "_warning_threshold")
+
     def __init__(self, name: str, dob: datetime, bank_account_number: str, warning_threshold):
         self._name = name
         self._dob = dob
-        self._bank_account_number = bank_account_number
+        self._bank_account_number = sys.intern(bank_account_number)
         self._warning_threshold = warning_threshold
 
     @property
@@ -36,6 +41,14 @@ class User(ABC):
         """
         return self._bank_account_number
 
+    @property
+    def warning_threshold(self) -> float:
+        """
+        Return the fraction of a budget after which the User is warned.
+        :return: a float
+        """
+        return self._warning_threshold
+
     @abstractmethod
     def is_over_account_lockout_threshold(self, number_of_locked_budget, num_budget_types):
         """ Overrides to set the lock-out rule according to the user type. """
@@ -77,6 +90,8 @@ class Angel(User):
     """
     An Angel class.
     """
+    __slots__ = ()
+
     def __init__(self, name: str, dob: datetime, bank_account_number: str, warning_threshold: float):
         super().__init__(name, dob, bank_account_number, warning_threshold)
 
@@ -127,6 +142,8 @@ class Rebel(User):
     """
     A Rebel class.
     """
+    __slots__ = ()
+
     def __init__(self, name: str, dob: datetime, bank_account_number: str, warning_threshold: float):
         super().__init__(name, dob, bank_account_number, warning_threshold)
 
@@ -177,6 +194,8 @@ class TroubleMaker(User):
     """
     A TroubleMaker class.
     """
+    __slots__ = ()
+
     def __init__(self, name: str, dob: datetime, bank_account_number: str, warning_threshold: float):
         super().__init__(name, dob, bank_account_number, warning_threshold)
 
@@ -0,0 +1,345 @@
+import json
+import os
+import threading
+import time
+from account_locks import WriterGate
+from record_codec import RecordCodec
+
+
+class WriteAheadLog:
+    """
+    This class is an append-only log of every mutation made to the catalogues. Each record is one
+    JSON line carrying a log sequence number (LSN), an operation name and the record data.
+
+    Records are written as soon as they are logged, but fsync is batched: the file is synced once
+    every fsync_batch records, or when a record is written more than fsync_interval seconds after
+    the last sync, whichever comes first. A record survives a crash once its LSN is at or below
+    durable_lsn. Nothing may be acknowledged before that: wait_durable blocks until a record is
+    synced, and threads waiting at the same time share one fsync (group commit).
+
+    Truncating the log writes its replacement to a temporary file, syncs it and renames it over
+    the log, so a crash leaves either the old log or the new one.
+
+    Every change is logged and applied as a writer of gate; a checkpoint holds the gate
+    exclusively, so its snapshot covers exactly the records up to the LSN it truncates through.
+    """
+    ADD_BANK_ACCOUNT = "add_bank_account"
+    REMOVE_BANK_ACCOUNT = "remove_bank_account"
+    ADD_BUDGET = "add_budget"
+    ADD_USER = "add_user"
+    ADD_TRANSACTION = "add_transaction"
+    CHECKPOINT = "checkpoint"
+
+    def __init__(self, path: str, fsync_batch: int = 1, fsync_interval: float = None):
+        """
+        Opens the log at the given path, creating it if needed. A torn record left at the end of
+        the file by a crash, a final line without its newline, is cut off.
+        :param path: a string
+        :param fsync_batch: an int, the number of records written between syncs
+        :param fsync_interval: a float, the seconds after which a new record forces a sync, or None
+        :raise ValueError: if a complete record cannot be read, since cutting the log there would
+                           drop the acknowledged records after it
+        """
+        self._path = path
+        self._fsync_batch = max(1, fsync_batch)
+        self._fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._gate = WriterGate()
+        self._skipped = []
+        self._last_lsn, valid_length = self._scan()
+        self._durable_lsn = self._last_lsn
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._file = open(path, "ab")
+        if self._file.tell() != valid_length:
+            self._file.truncate(valid_length)
+            self._file.seek(valid_length)
+
+    @property
+    def path(self) -> str:
+        """
+        Returns the path of the log file.
+        :return: a string
+        """
+        return self._path
+
+    @property
+    def last_lsn(self) -> int:
+        """
+        Returns the LSN of the last record written.
+        :return: an int
+        """
+        return self._last_lsn
+
+    @property
+    def gate(self) -> WriterGate:
+        """
+        Returns the gate changes pass through while they are logged and applied.
+        :return: a WriterGate
+        """
+        return self._gate
+
+    @property
+    def durable_lsn(self) -> int:
+        """
+        Returns the LSN up to which every record has been synced to disk.
+        :return: an int
+        """
+        return self._durable_lsn
+
+    @property
+    def skipped(self) -> list:
+        """
+        Returns the records the last recovery could not replay.
+        :return: a list of (LSN, reason) tuples
+        """
+        return self._skipped
+
+    def _scan(self) -> tuple[int, int]:
+        """
+        Reads the existing log to find the last LSN and where the last complete record ends.
+        :return: a tuple of the last LSN and the length of the valid part of the file
+        """
+        last_lsn = 0
+        valid_length = 0
+        for lsn, _, _, end in self._read_records():
+            last_lsn = lsn
+            valid_length = end
+        return last_lsn, valid_length
+
+    @staticmethod
+    def _encode(lsn: int, operation: str, data: dict) -> bytes:
+        """
+        Encodes a record as one JSON line.
+        :param lsn: an int
+        :param operation: a string
+        :param data: a dict
+        :return: bytes
+        """
+        return json.dumps({"lsn": lsn, "op": operation, "data": data}, separators=(",", ":")).encode() + b"\n"
+
+    def _read_records(self):
+        """
+        Yields every complete record with the file offset where it ends. Only the last line can
+        be torn by a crash, and it is recognised by its missing newline; any other line that does
+        not parse is corruption.
+        :return: an iterator of (lsn, operation, data, end offset) tuples
+        :raise ValueError: if a complete line is not a valid record
+        """
+        if not os.path.exists(self._path):
+            return
+        with open(self._path, "rb") as file:
+            offset = 0
+            for line in file:
+                if not line.endswith(b"\n"):
+                    return
+                try:
+                    entry = json.loads(line)
+                    record = entry["lsn"], entry["op"], entry["data"]
+                except (ValueError, KeyError, TypeError):
+                    raise ValueError(f"Corrupt write-ahead log record at byte {offset} of {self._path}.")
+                offset += len(line)
+                yield (*record, offset)
+
+    def read(self, after_lsn: int = 0):
+        """
+        Yields the records of the log in order.
+        :param after_lsn: an int, records at or below this LSN are skipped
+        :return: an iterator of (lsn, operation, data) tuples
+        """
+        for lsn, operation, data, _ in self._read_records():
+            if lsn > after_lsn:
+                yield lsn, operation, data
+
+    def log(self, operation: str, data: dict) -> int:
+        """
+        Writes a record and syncs the log if the batch is full or the interval has passed.
+        :param operation: a string
+        :param data: a dict
+        :return: the LSN of the record
+        """
+        with self._lock:
+            self._last_lsn += 1
+            lsn = self._last_lsn
+            self._file.write(self._encode(lsn, operation, data))
+            self._unsynced += 1
+            if self._unsynced >= self._fsync_batch or (self._fsync_interval is not None and
+                                                       time.monotonic() - self._last_sync >= self._fsync_interval):
+                self._sync_locked()
+            else:
+                self._file.flush()
+        return lsn
+
+    def log_add_bank_account(self, bank_account) -> int:
+        """
+        Logs a new bank account.
+        :param bank_account: a BankAccount
+        :return: the LSN of the record
+        """
+        return self.log(WriteAheadLog.ADD_BANK_ACCOUNT, RecordCodec.encode_bank_account(bank_account))
+
+    def log_remove_bank_account(self, bank_acc_num: str) -> int:
+        """
+        Logs the removal of a bank account.
+        :param bank_acc_num: a string
+        :return: the LSN of the record
+        """
+        return self.log(WriteAheadLog.REMOVE_BANK_ACCOUNT, {"bank_acc_num": bank_acc_num})
+
+    def log_add_budget(self, budget) -> int:
+        """
+        Logs a new budget.
+        :param budget: a Budget
+        :return: the LSN of the record
+        """
+        return self.log(WriteAheadLog.ADD_BUDGET, RecordCodec.encode_budget(budget))
+
+    def log_add_user(self, user) -> int:
+        """
+        Logs a new user.
+        :param user: a User
+        :return: the LSN of the record
+        """
+        return self.log(WriteAheadLog.ADD_USER, RecordCodec.encode_user(user))
+
+    def log_add_transaction(self, transaction) -> int:
+        """
+        Logs an accepted transaction.
+        :param transaction: a Transaction
+        :return: the LSN of the record
+        """
+        return self.log(WriteAheadLog.ADD_TRANSACTION, RecordCodec.encode_transaction(transaction))
+
+    def sync(self) -> int:
+        """
+        Syncs every written record to disk.
+        :return: the durable LSN
+        """
+        with self._lock:
+            self._sync_locked()
+        return self._durable_lsn
+
+    def wait_durable(self, lsn: int) -> int:
+        """
+        Blocks until the record with the given LSN is synced to disk. The fsync runs outside the
+        write lock, so records keep being written meanwhile, and every thread that was waiting
+        for one of them is released by the same sync.
+        :param lsn: an int
+        :return: the durable LSN
+        """
+        if self._durable_lsn >= lsn:
+            return self._durable_lsn
+        with self._sync_lock:
+            if self._durable_lsn >= lsn:
+                return self._durable_lsn
+            with self._lock:
+                self._file.flush()
+                last_lsn = self._last_lsn
+                descriptor = self._file.fileno()
+            os.fsync(descriptor)
+            with self._lock:
+                if last_lsn > self._durable_lsn:
+                    self._durable_lsn = last_lsn
+                    self._unsynced = self._last_lsn - last_lsn
+                    self._last_sync = time.monotonic()
+        return self._durable_lsn
+
+    def _sync_locked(self) -> None:
+        """
+        Flushes and fsyncs the log. The caller must hold the lock.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._durable_lsn = self._last_lsn
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def truncate(self, through_lsn: int = None) -> None:
+        """
+        Drops the records a snapshot covers. The records after through_lsn are kept behind a
+        checkpoint record, so LSNs keep counting up after a restart. The new log is written to a
+        temporary file, synced and renamed over the old one.
+        :param through_lsn: an int, the last LSN to drop, or None to drop every record
+        """
+        with self._sync_lock, self._lock:
+            self._sync_locked()
+            through_lsn = self._last_lsn if through_lsn is None else min(through_lsn, self._last_lsn)
+            keep_from = 0
+            for lsn, _, _, end in self._read_records():
+                if lsn > through_lsn:
+                    break
+                keep_from = end
+            temporary_path = self._path + ".tmp"
+            with open(self._path, "rb") as old, open(temporary_path, "wb") as new:
+                new.write(self._encode(through_lsn, WriteAheadLog.CHECKPOINT, {"lsn": through_lsn}))
+                old.seek(keep_from)
+                while chunk := old.read(1 << 20):
+                    new.write(chunk)
+                new.flush()
+                os.fsync(new.fileno())
+            self._file.close()
+            os.replace(temporary_path, self._path)
+            self._sync_directory()
+            self._file = open(self._path, "ab")
+
+    def _sync_directory(self) -> None:
+        """
+        Syncs the directory of the log, so a rename of the log survives a crash.
+        """
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        descriptor = os.open(os.path.dirname(os.path.abspath(self._path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def close(self) -> None:
+        """
+        Syncs and closes the log.
+        """
+        with self._sync_lock, self._lock:
+            if not self._file.closed:
+                self._sync_locked()
+                self._file.close()
+
+    def recover(self, fam, after_lsn: int = 0) -> int:
+        """
+        Rebuilds the catalogues and the user list of a Fam by replaying the log. Transactions on
+        accounts that no user, bank account or budget is known for are not replayed; they are
+        listed in skipped instead.
+        :param fam: a Fam whose catalogues are not attached to this log yet
+        :param after_lsn: an int, records at or below this LSN are skipped
+        :return: the number of records replayed, not counting checkpoint markers
+        """
+        users = {user.bank_account_number: user for user in fam.user_list}
+        self._skipped = []
+        replayed = 0
+        for lsn, operation, data in self.read(after_lsn):
+            if operation == WriteAheadLog.CHECKPOINT:
+                # Marks where a truncated log resumes; there is nothing to replay.
+                continue
+            if operation == WriteAheadLog.ADD_BANK_ACCOUNT:
+                fam.bank_account_catalogue.add_bank_account(RecordCodec.decode_bank_account(data))
+            elif operation == WriteAheadLog.REMOVE_BANK_ACCOUNT:
+                fam.bank_account_catalogue.remove_bank_account(data["bank_acc_num"])
+            elif operation == WriteAheadLog.ADD_BUDGET:
+                fam.budget_catalogue.add_budget(RecordCodec.decode_budget(data))
+            elif operation == WriteAheadLog.ADD_USER:
+                user = RecordCodec.decode_user(data)
+                users[user.bank_account_number] = user
+                fam.user_list.append(user)
+            elif operation == WriteAheadLog.ADD_TRANSACTION:
+                transaction = RecordCodec.decode_transaction(data)
+                user = users.get(transaction.bank_num)
+                if user is None:
+                    self._skipped.append((lsn, f"No user owns bank account {transaction.bank_num}."))
+                    continue
+                try:
+                    fam.transaction_catalogue.replay_transaction(user, transaction)
+                except ValueError as error:
+                    self._skipped.append((lsn, str(error)))
+                    continue
+            replayed += 1
+        return replayed